@@ -0,0 +1,351 @@
+"""BDD-Selenium - async_runtime.py
+This file contains the asyncio counterpart of SeleniumRuntime and the adapter running synchronous steps on it
+Async steps (coroutine staticmethods) await the runtime methods, synchronous steps run in a helper thread where
+every runtime call is submitted to the event loop and waited for
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException, \
+    WebDriverException
+from selenium.webdriver.common.by import By
+
+from async_webdriver import AsyncElement, AsyncWebDriver
+from browser_profiles import BrowserProfile
+from selenium_runtime import SessionSnapshot, FILL_FORM_SCRIPT, FILL_SELECTS_SCRIPT, CLEAR_STORAGE_SCRIPT, \
+    DUMP_STORAGE_SCRIPT, RESTORE_STORAGE_SCRIPT, DOM_QUIET_SCRIPT, NETWORK_IDLE_SCRIPT, ANIMATIONS_SCRIPT
+from utils import *
+
+
+class AsyncSession:
+    """
+    This class owns the lifecycle of a single AsyncWebDriver session, launched the first time it is requested
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        pool: AsyncHTTPPool shared by every session
+        profile: BrowserProfile new sessions are started with
+        driver_instance: live AsyncWebDriver, None until the first request
+    """
+
+    def __init__(self, pool, profile=None):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.pool = pool
+        self.profile = BrowserProfile() if profile is None else profile
+        self.driver_instance = None
+
+    @property
+    def command_ns(self):
+        return 0 if self.driver_instance is None else self.driver_instance.command_ns
+
+    async def driver(self):
+        """AsyncWebDriver of this session, started on first access"""
+        if self.driver_instance is None:
+            profile = self.profile
+            driver = AsyncWebDriver(self.pool, profile.capabilities())
+            await driver.start()
+            if profile.browser == 'chrome' and len(profile.blocked_urls):
+                await driver.execute_cdp('Network.enable', {})
+                await driver.execute_cdp('Network.setBlockedURLs', {'urls': profile.blocked_urls})
+            if profile.window_size is not None:
+                await driver.set_window_size(*profile.window_size)
+            self.driver_instance = driver
+        return self.driver_instance
+
+    async def use_profile(self, profile):
+        if profile is not self.profile:
+            await self.quit()
+            self.profile = profile
+
+    async def reset(self):
+        """Brings the session back to a clean state: storage, cookies and an empty page
+
+        :return: void
+        """
+        if self.driver_instance is None:
+            return
+        try:
+            await self.driver_instance.execute_script(CLEAR_STORAGE_SCRIPT)
+            await self.driver_instance.delete_all_cookies()
+            await self.driver_instance.get('about:blank')
+        except (WebDriverException, ConnectionError):
+            self.logger.warning("Browser session is not responding. Restarting...")
+            await self.quit()
+
+    async def quit(self):
+        if self.driver_instance is not None:
+            driver, self.driver_instance = self.driver_instance, None
+            await driver.quit()
+
+
+class AsyncSeleniumRuntime:
+    """
+    This class offers the operations of SeleniumRuntime as coroutines, over an AsyncSession
+    Elements are returned as AsyncElement, their methods are coroutines as well
+    There is no element cache: every lookup is sent to the browser and no cache counters are reported
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        session: AsyncSession owning the browser of this runtime
+        scope: name of the feature the session was last prepared for
+        wait_timings: list of tuples (wait name, elapsed seconds) recorded by wait_until
+        wait_ns: nanoseconds spent inside wait_until
+        wait_command_ns: part of the command time spent inside wait_until
+    """
+
+    def __init__(self, session):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.session = session
+        self.scope = None
+        self.wait_timings = []
+        self.wait_ns = 0
+        self.wait_command_ns = 0
+
+    async def browser(self):
+        return await self.session.driver()
+
+    async def prepare(self, scope, profile=None):
+        if profile is not None:
+            await self.session.use_profile(profile)
+        if self.scope != scope:
+            await self.session.reset()
+            self.scope = scope
+
+    async def quit(self):
+        await self.session.quit()
+
+    def cache_report(self):
+        # No element cache, thus async runs are left out of the element cache summary
+        return {}
+
+    def phase_counters(self):
+        return self.wait_ns, self.session.command_ns - self.wait_command_ns
+
+    def wait_report(self):
+        return summarize_timings(self.wait_timings)
+
+    async def capture_snapshot(self):
+        browser = await self.browser()
+        local_storage, session_storage = await browser.execute_script(DUMP_STORAGE_SCRIPT)
+        return SessionSnapshot(await browser.current_url(), await browser.get_cookies(), local_storage,
+                               session_storage)
+
+    async def restore_snapshot(self, snapshot):
+        browser = await self.browser()
+        if SessionSnapshot.origin_of(await browser.current_url()) != snapshot.origin:
+            await browser.get(snapshot.url)
+        landed = await browser.current_url() == snapshot.url
+
+        await browser.delete_all_cookies()
+        for cookie in snapshot.cookies:
+            await browser.add_cookie(cookie)
+        await browser.execute_script(RESTORE_STORAGE_SCRIPT, snapshot.local_storage, snapshot.session_storage)
+        if landed:
+            await browser.refresh()
+        else:
+            await browser.get(snapshot.url)
+        return await browser.current_url() == snapshot.url
+
+    async def go_to_page(self, url):
+        await (await self.browser()).get(url)
+
+    async def submit_form(self):
+        form = await (await self.browser()).find_element(By.TAG_NAME, 'form')
+        await form.submit()
+
+    async def fill_form(self, table, batched=False, keystroke_fields=()):
+        browser = await self.browser()
+        if batched:
+            scripted_fields = {field: value for field, value in table.items() if field not in keystroke_fields}
+            missing_fields = await browser.execute_script(FILL_FORM_SCRIPT, scripted_fields)
+            if len(missing_fields):
+                raise NoSuchElementException("Form fields not found: %s" % ', '.join(missing_fields))
+            table = {field: value for field, value in table.items() if field in keystroke_fields}
+
+        for field, value in table.items():
+            element = await browser.find_element(By.ID, field)
+            await element.clear()
+            await element.send_keys(value)
+
+    async def fill_selects(self, table, batched=False, timeout=DEFAULT_WAIT_TIMEOUT):
+        if not batched:
+            for field_name, field_value in table.items():
+                await (await self.wait_for_element(field_value, By.XPATH, timeout)).click()
+            return
+
+        pending_options = list(table.values())
+
+        async def pick_available_options(browser):
+            picked = await browser.execute_script(FILL_SELECTS_SCRIPT, pending_options)
+            del pending_options[:picked]
+            return len(pending_options) == 0
+
+        await self.wait_until('selects', pick_available_options, timeout)
+
+    async def click(self, value, by=By.ID):
+        await (await self.get_element(value, by)).click()
+
+    async def get_element(self, value, by=By.ID):
+        return await (await self.browser()).find_element(by, value)
+
+    async def get_elements(self, value, by=By.ID):
+        return await (await self.browser()).find_elements(by, value)
+
+    async def assert_presence(self, value, by=By.ID):
+        try:
+            await self.get_element(value, by)
+            return True
+        except NoSuchElementException:
+            return False
+
+    async def back(self):
+        await (await self.browser()).back()
+
+    async def forward(self):
+        await (await self.browser()).forward()
+
+    async def refresh(self):
+        await (await self.browser()).refresh()
+
+    async def current_title(self):
+        return await (await self.browser()).title()
+
+    async def current_url(self):
+        return await (await self.browser()).current_url()
+
+    async def wait_until(self, name, condition, timeout=DEFAULT_WAIT_TIMEOUT, poll_frequency=DEFAULT_POLL_FREQUENCY):
+        """Polls condition until it returns a truthy value, yielding to other sessions between polls
+        NoSuchElementException is ignored while polling, like WebDriverWait does
+
+        :param name: name of the wait, used as key in wait_timings
+        :param condition: coroutine function receiving the AsyncWebDriver
+        :param timeout: maximum amount of seconds to wait
+        :param poll_frequency: seconds between two polls
+        :raise TimeoutException: condition did not hold within timeout
+        :return: last value returned by condition
+        """
+        browser = await self.browser()
+        wait_start = time.perf_counter_ns()
+        command_start = self.session.command_ns
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    value = await condition(browser)
+                    if value:
+                        return value
+                except NoSuchElementException:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutException("Wait %s did not hold within %s seconds" % (name, timeout))
+                await asyncio.sleep(poll_frequency)
+        finally:
+            elapsed = time.perf_counter_ns() - wait_start
+            self.wait_ns += elapsed
+            self.wait_command_ns += self.session.command_ns - command_start
+            self.wait_timings.append((name, elapsed / 1e9))
+
+    async def wait_for_element(self, value, by=By.ID, timeout=DEFAULT_WAIT_TIMEOUT):
+        return await self.wait_until('element', lambda browser: browser.find_element(by, value), timeout)
+
+    async def wait_for_redirect(self, target_url, timeout=DEFAULT_WAIT_TIMEOUT):
+        async def url_is_target(browser):
+            return await browser.current_url() == target_url
+        return await self.wait_until('redirect', url_is_target, timeout)
+
+    async def wait_for_url_change(self, current_url, timeout=DEFAULT_WAIT_TIMEOUT):
+        async def url_changed(browser):
+            return await browser.current_url() != current_url
+        return await self.wait_until('url_change', url_changed, timeout)
+
+    async def wait_for_dom_quiet(self, quiet_time=0.3, timeout=DEFAULT_WAIT_TIMEOUT):
+        return await self.wait_until('dom_quiet', lambda browser: browser.execute_script(DOM_QUIET_SCRIPT,
+                                                                                          quiet_time * 1000), timeout)
+
+    async def wait_for_network_idle(self, timeout=DEFAULT_WAIT_TIMEOUT):
+        return await self.wait_until('network_idle', lambda browser: browser.execute_script(NETWORK_IDLE_SCRIPT),
+                                     timeout)
+
+    async def wait_for_animations(self, timeout=DEFAULT_WAIT_TIMEOUT):
+        return await self.wait_until('animations', lambda browser: browser.execute_script(ANIMATIONS_SCRIPT), timeout)
+
+    async def wait_for_clickable(self, value, by=By.ID, stable_time=0.1, timeout=DEFAULT_WAIT_TIMEOUT):
+        """Waits until an element is displayed, enabled and did not move or resize for stable_time seconds
+
+        :param value: locator value
+        :param by: locator strategy
+        :param stable_time: seconds the element position and size must stay the same
+        :param timeout: maximum amount of seconds to wait
+        :return: AsyncElement
+        """
+        last_seen = {'rect': None, 'since': 0.0}
+
+        async def stable_and_clickable(browser):
+            element = await browser.find_element(by, value)
+            try:
+                if not (await element.is_displayed() and await element.is_enabled()):
+                    return False
+                rect = await element.rect()
+            except StaleElementReferenceException:
+                return False
+            now = time.perf_counter()
+            if rect != last_seen['rect']:
+                last_seen['rect'] = rect
+                last_seen['since'] = now
+                return False
+            return element if now - last_seen['since'] >= stable_time else False
+
+        return await self.wait_until('clickable', stable_and_clickable, timeout)
+
+    @staticmethod
+    async def assert_class(element, class_name):
+        class_attr = await element.get_attribute('class')
+        return class_attr.find(class_name) >= 0
+
+    @staticmethod
+    async def assert_attribute(element, attribute_name, attribute_value):
+        attr_value = await element.get_attribute(attribute_name)
+        return attr_value.find(attribute_value) >= 0
+
+
+class SyncAdapter:
+    """
+    This class exposes the coroutines of an async object (AsyncSeleniumRuntime, AsyncSession or AsyncElement)
+    as blocking calls, so synchronous steps and factories run unchanged from a helper thread
+    Each call is submitted to the event loop and the helper thread waits for its result
+
+    Attributes:
+        target: adapted object
+        loop: event loop running the coroutines (never the loop of the calling thread)
+    """
+    adapted_types = (AsyncSeleniumRuntime, AsyncSession, AsyncElement)
+
+    def __init__(self, target, loop):
+        self.target = target
+        self.loop = loop
+
+    def run(self, coroutine):
+        return self.adapt(asyncio.run_coroutine_threadsafe(coroutine, self.loop).result())
+
+    def adapt(self, value):
+        if isinstance(value, SyncAdapter.adapted_types):
+            return SyncAdapter(value, self.loop)
+        if isinstance(value, list):
+            return [self.adapt(item) for item in value]
+        return value
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if isinstance(self.target, AsyncElement) and name in AsyncElement.properties:
+            # Properties of selenium WebElement (e.g. element.text)
+            return self.run(attribute())
+        if inspect.iscoroutinefunction(attribute):
+            return lambda *args, **kwargs: self.run(attribute(*(self.unwrap(arg) for arg in args), **kwargs))
+        return self.adapt(attribute)
+
+    @staticmethod
+    def unwrap(value):
+        return value.target if isinstance(value, SyncAdapter) else value
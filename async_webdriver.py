@@ -0,0 +1,334 @@
+"""BDD-Selenium - async_webdriver.py
+This file contains an asyncio client of the W3C WebDriver protocol
+Every session shares a pool of keep-alive HTTP connections, so a single thread drives many browsers at once
+Protocol errors are raised as the equivalent selenium exceptions, thus steps handle them the same way
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException, \
+    WebDriverException
+from utils import *
+
+""" Key identifying a web element inside W3C WebDriver payloads """
+ELEMENT_KEY = 'element-6066-11e4-a52f-4ca4d3c7f4d8'
+
+""" Maps each W3C error code into the selenium exception raised for it """
+PROTOCOL_ERRORS = {
+    'no such element': NoSuchElementException,
+    'stale element reference': StaleElementReferenceException,
+    'timeout': TimeoutException,
+    'script timeout': TimeoutException
+}
+
+
+class AsyncHTTPPool:
+    """
+    This class sends HTTP/1.1 requests over a bounded pool of keep-alive connections to a single server
+
+    Attributes:
+        host: server host
+        port: server port
+        base_path: path prefix of every request (e.g. /wd/hub)
+        idle: list of (reader, writer) connections ready to be reused
+        slots: semaphore bounding the amount of simultaneous connections
+        opened: amount of connections opened since the pool was created
+    """
+
+    def __init__(self, url, max_connections=8):
+        split_url = urlsplit(url)
+        self.host = split_url.hostname
+        self.port = split_url.port or 80
+        self.base_path = split_url.path.rstrip('/')
+        self.idle = []
+        self.slots = asyncio.Semaphore(max_connections)
+        self.opened = 0
+
+    async def request(self, method, path, payload=None):
+        """Sends a request, reusing an idle connection when available
+
+        :param method: HTTP method
+        :param path: path after base_path
+        :param payload: JSON serializable body, None sends no body
+        :return: tuple (status code, decoded JSON body or None)
+        """
+        body = b'' if payload is None else json.dumps(payload).encode('utf8')
+        head = ('{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: keep-alive\r\n'
+                'Content-Type: application/json;charset=utf-8\r\nContent-Length: {length}\r\n\r\n').format(
+            method=method, path=self.base_path + path, host=self.host, port=self.port, length=len(body))
+
+        async with self.slots:
+            while True:
+                reused = len(self.idle) > 0
+                reader, writer = self.idle.pop() if reused else await self.connect()
+                try:
+                    writer.write(head.encode('latin-1') + body)
+                    await writer.drain()
+                    status, keep_alive, content = await AsyncHTTPPool.read_response(reader)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    # The server may close idle connections at any time, only fresh ones are reported
+                    if not reused:
+                        raise
+                except BaseException:
+                    # Cancelled (e.g. by a wait timeout) or malformed exchange, the connection state is unknown
+                    writer.close()
+                    raise
+            if keep_alive:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+        return status, json.loads(content) if len(content) else None
+
+    async def connect(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    @staticmethod
+    async def read_response(reader):
+        """Reads a response with either Content-Length or chunked body
+
+        :param reader: asyncio.StreamReader of the connection
+        :return: tuple (status code, True if the connection can be reused, body bytes)
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b''.join(chunks)
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        else:
+            content = await reader.read()
+            headers['connection'] = 'close'
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version != b'HTTP/1.0'
+        return int(status), keep_alive, content
+
+    async def close(self):
+        while len(self.idle):
+            reader, writer = self.idle.pop()
+            writer.close()
+
+
+class AsyncElement:
+    """
+    This class references a web element of an AsyncWebDriver session
+
+    Attributes:
+        driver: AsyncWebDriver owning the element
+        element_id: W3C web element reference
+    """
+    properties = ('text', 'rect', 'tag_name')
+
+    def __init__(self, driver, element_id):
+        self.driver = driver
+        self.element_id = element_id
+
+    def command(self, method, command, payload=None):
+        return self.driver.command(method, '/element/{id}{command}'.format(id=self.element_id, command=command),
+                                   payload)
+
+    async def click(self):
+        await self.command('POST', '/click', {})
+
+    async def clear(self):
+        await self.command('POST', '/clear', {})
+
+    async def send_keys(self, value):
+        await self.command('POST', '/value', {'text': str(value)})
+
+    async def text(self):
+        return await self.command('GET', '/text')
+
+    async def rect(self):
+        return await self.command('GET', '/rect')
+
+    async def tag_name(self):
+        return await self.command('GET', '/name')
+
+    async def get_attribute(self, name):
+        return await self.command('GET', '/attribute/' + name)
+
+    async def is_displayed(self):
+        return await self.command('GET', '/displayed')
+
+    async def is_enabled(self):
+        return await self.command('GET', '/enabled')
+
+    async def submit(self):
+        await self.driver.execute_script("arguments[0].submit ? arguments[0].submit() : arguments[0].form.submit();",
+                                         self)
+
+    def to_json(self):
+        return {ELEMENT_KEY: self.element_id}
+
+
+class AsyncWebDriver:
+    """
+    This class drives a single browser session through the W3C WebDriver protocol
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        pool: AsyncHTTPPool connected to the WebDriver server
+        capabilities: dictionary of alwaysMatch capabilities requested when the session starts
+        session_id: identifier of the session, None until started
+        command_ns: nanoseconds spent waiting for command responses
+    """
+
+    def __init__(self, pool, capabilities):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.pool = pool
+        self.capabilities = capabilities
+        self.session_id = None
+        self.command_ns = 0
+
+    async def start(self):
+        status, response = await self.pool.request('POST', '/session',
+                                                   {'capabilities': {'alwaysMatch': self.capabilities}})
+        value = AsyncWebDriver.check(status, response)
+        self.session_id = value['sessionId']
+        self.logger.info("Started WebDriver session %s" % self.session_id)
+
+    async def quit(self):
+        if self.session_id is None:
+            return
+        try:
+            await self.pool.request('DELETE', '/session/' + self.session_id)
+        except (ConnectionError, OSError):
+            self.logger.warning("Browser session was already closed")
+        finally:
+            self.session_id = None
+
+    async def command(self, method, command, payload=None):
+        """Sends a command to the session
+
+        :param method: HTTP method
+        :param command: path after /session/{id}
+        :param payload: JSON serializable body (AsyncElement are converted to web element references)
+        :raise WebDriverException: (or subclass) the command failed
+        :return: value of the response, web element references are converted to AsyncElement
+        """
+        command_start = time.perf_counter_ns()
+        try:
+            status, response = await self.pool.request(
+                method, '/session/{id}{command}'.format(id=self.session_id, command=command),
+                None if payload is None else json.loads(json.dumps(payload, default=AsyncWebDriver.encode)))
+        finally:
+            self.command_ns += time.perf_counter_ns() - command_start
+        return self.decode(AsyncWebDriver.check(status, response))
+
+    @staticmethod
+    def encode(value):
+        if isinstance(value, AsyncElement):
+            return value.to_json()
+        raise TypeError("%s is not JSON serializable" % type(value).__name__)
+
+    def decode(self, value):
+        if isinstance(value, dict):
+            if ELEMENT_KEY in value:
+                return AsyncElement(self, value[ELEMENT_KEY])
+            return {key: self.decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        return value
+
+    @staticmethod
+    def check(status, response):
+        """Extracts the value of a response, raising the selenium exception of protocol errors
+
+        :param status: HTTP status code
+        :param response: decoded JSON body
+        :return: value of the response
+        """
+        value = None if response is None else response.get('value')
+        if status >= 400 or (isinstance(value, dict) and 'error' in value):
+            error = value.get('error', 'unknown error') if isinstance(value, dict) else 'unknown error'
+            message = value.get('message', '') if isinstance(value, dict) else ''
+            raise PROTOCOL_ERRORS.get(error, WebDriverException)('{error}: {message}'.format(error=error,
+                                                                                             message=message))
+        return value
+
+    async def get(self, url):
+        await self.command('POST', '/url', {'url': url})
+
+    async def current_url(self):
+        return await self.command('GET', '/url')
+
+    async def title(self):
+        return await self.command('GET', '/title')
+
+    async def back(self):
+        await self.command('POST', '/back', {})
+
+    async def forward(self):
+        await self.command('POST', '/forward', {})
+
+    async def refresh(self):
+        await self.command('POST', '/refresh', {})
+
+    async def find_element(self, by, value):
+        return await self.command('POST', '/element', AsyncWebDriver.locator(by, value))
+
+    async def find_elements(self, by, value):
+        return await self.command('POST', '/elements', AsyncWebDriver.locator(by, value))
+
+    async def execute_script(self, script, *args):
+        return await self.command('POST', '/execute/sync', {'script': script, 'args': list(args)})
+
+    async def set_window_size(self, width, height):
+        await self.command('POST', '/window/rect', {'width': width, 'height': height})
+
+    async def execute_cdp(self, cmd, params):
+        """Sends a Chrome DevTools Protocol command (chromedriver only)"""
+        return await self.command('POST', '/goog/cdp/execute', {'cmd': cmd, 'params': params})
+
+    async def get_cookies(self):
+        return await self.command('GET', '/cookie')
+
+    async def add_cookie(self, cookie):
+        await self.command('POST', '/cookie', {'cookie': cookie})
+
+    async def delete_all_cookies(self):
+        await self.command('DELETE', '/cookie')
+
+    @staticmethod
+    def locator(by, value):
+        """Translates the selenium locator strategies missing in W3C into CSS selectors, like selenium does
+
+        :param by: selenium By value
+        :param value: locator value
+        :return: dictionary with using and value
+        """
+        if by == 'id':
+            return {'using': 'css selector', 'value': '[id="%s"]' % value}
+        if by == 'name':
+            return {'using': 'css selector', 'value': '[name="%s"]' % value}
+        if by == 'class name':
+            return {'using': 'css selector', 'value': '.' + value}
+        if by == 'tag name':
+            return {'using': 'css selector', 'value': value}
+        return {'using': by, 'value': value}
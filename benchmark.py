@@ -0,0 +1,330 @@
+"""BDD-Selenium - benchmark.py
+This file measures the overhead of the framework itself on synthetic trees written by generate_benchmark
+Steps run against an in-process fake WebDriver, so the timings exclude any browser. Each measurement runs in a
+fresh process (imports are part of it) and the results are written as JSON, to be diffed across versions
+
+Usage: python benchmark.py [-s 10 100 1000 10000] [-r 3] [-l 0] [-o benchmark.json]
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import logging
+import platform
+import tempfile
+import time
+
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.webelement import WebElement
+
+from execution_service import ExecutionService
+from feature import Feature
+from generators import generate_benchmark
+from registry import StepRegistry
+from selenium_runtime import selenium_runtime, FILL_FORM_SCRIPT, FILL_SELECTS_SCRIPT, DUMP_STORAGE_SCRIPT, \
+    DOM_QUIET_SCRIPT, NETWORK_IDLE_SCRIPT, ANIMATIONS_SCRIPT
+from utils import *
+
+""" Scenario amounts measured when none is given """
+DEFAULT_SCENARIO_COUNTS = (10, 100, 1000, 10000)
+
+""" Measurements of each tree, the fastest one is reported """
+DEFAULT_REPEAT = 3
+
+""" Phases timed by measure, in execution order """
+BENCHMARK_PHASES = ('discovery', 'pre_process', 'process_file', 'import', 'resolve', 'execute', 'display')
+
+""" Values returned by the fake WebDriver for the scripts of SeleniumRuntime (None for the other scripts) """
+FAKE_SCRIPT_RESULTS = {
+    FILL_FORM_SCRIPT: [],
+    DUMP_STORAGE_SCRIPT: [{}, {}],
+    DOM_QUIET_SCRIPT: True,
+    NETWORK_IDLE_SCRIPT: True,
+    ANIMATIONS_SCRIPT: True
+}
+
+
+class FakeElement(WebElement):
+    """
+    This class mimics a selenium WebElement, every operation is a command of its FakeWebDriver
+
+    Attributes:
+        driver: FakeWebDriver owning the element
+        locator: tuple (by, value) the element was found with
+    """
+
+    def __init__(self, driver, locator):
+        super().__init__(driver, '{by}={value}'.format(by=locator[0], value=locator[1]), w3c=True)
+        self.driver = driver
+        self.locator = locator
+
+    def _execute(self, command, params=None):
+        params = {} if params is None else dict(params)
+        params['locator'] = self.locator
+        return self.driver.execute(command, params)
+
+    def click(self):
+        self.driver.execute(Command.CLICK_ELEMENT)
+
+    def clear(self):
+        self.driver.execute(Command.CLEAR_ELEMENT)
+
+    def send_keys(self, *value):
+        self.driver.execute(Command.SEND_KEYS_TO_ELEMENT, {'text': ''.join(str(item) for item in value)})
+
+    def submit(self):
+        self.driver.execute(Command.SUBMIT_ELEMENT)
+
+    def get_attribute(self, name):
+        return self.driver.execute(Command.GET_ELEMENT_ATTRIBUTE, {'name': name})['value']
+
+    def is_displayed(self):
+        return self.driver.execute(Command.IS_ELEMENT_DISPLAYED)['value']
+
+    def is_enabled(self):
+        return self.driver.execute(Command.IS_ELEMENT_ENABLED)['value']
+
+    @property
+    def text(self):
+        return self.driver.execute(Command.GET_ELEMENT_TEXT, {'locator': self.locator})['value']
+
+    @property
+    def rect(self):
+        return self.driver.execute(Command.GET_ELEMENT_RECT)['value']
+
+    @property
+    def tag_name(self):
+        return self.driver.execute(Command.GET_ELEMENT_TAG_NAME)['value']
+
+
+class FakeWebDriver:
+    """
+    This class mimics a selenium WebDriver whose every element exists and every script succeeds
+    All the operations go through execute, like the remote WebDriver, so SessionManager times them as commands
+
+    Attributes:
+        latency: seconds each command takes, emulating the round trip to a browser
+        commands: amount of commands executed
+        current_url: address of the current page
+        cookies: list of cookies of the session
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.commands = 0
+        self.current_url = 'about:blank'
+        self.cookies = []
+
+    def execute(self, driver_command, params=None):
+        """Answers a command, sleeping latency seconds first
+
+        :param driver_command: selenium Command name
+        :param params: dictionary of command parameters
+        :return: dictionary with the value of the command, like the remote WebDriver
+        """
+        self.commands += 1
+        if self.latency:
+            time.sleep(self.latency)
+        params = {} if params is None else params
+
+        if driver_command == Command.GET:
+            self.current_url = params['url']
+            return {'value': None}
+        if driver_command in (Command.FIND_ELEMENT, Command.FIND_CHILD_ELEMENT):
+            return {'value': FakeElement(self, (params['using'], params['value']))}
+        if driver_command in (Command.FIND_ELEMENTS, Command.FIND_CHILD_ELEMENTS):
+            return {'value': [FakeElement(self, (params['using'], params['value']))]}
+        if driver_command == Command.W3C_EXECUTE_SCRIPT:
+            script = params['script']
+            if script == FILL_SELECTS_SCRIPT:
+                return {'value': len(params['args'][0])}
+            return {'value': FAKE_SCRIPT_RESULTS.get(script)}
+        if driver_command == Command.GET_ELEMENT_TEXT:
+            return {'value': 'Benchmark %s' % params['locator'][1]}
+        if driver_command == Command.GET_ELEMENT_RECT:
+            return {'value': {'x': 0, 'y': 0, 'width': 100, 'height': 20}}
+        if driver_command in (Command.IS_ELEMENT_DISPLAYED, Command.IS_ELEMENT_ENABLED):
+            return {'value': True}
+        if driver_command == Command.GET_ALL_COOKIES:
+            return {'value': list(self.cookies)}
+        if driver_command == Command.ADD_COOKIE:
+            self.cookies.append(params['cookie'])
+        elif driver_command == Command.DELETE_ALL_COOKIES:
+            self.cookies = []
+        return {'value': None}
+
+    def get(self, url):
+        self.execute(Command.GET, {'url': url})
+
+    @property
+    def title(self):
+        self.execute(Command.GET_TITLE)
+        return 'Benchmark'
+
+    def find_element(self, by='id', value=None):
+        return self.execute(Command.FIND_ELEMENT, {'using': by, 'value': value})['value']
+
+    def find_elements(self, by='id', value=None):
+        return self.execute(Command.FIND_ELEMENTS, {'using': by, 'value': value})['value']
+
+    def find_element_by_id(self, value):
+        return self.find_element('id', value)
+
+    def find_element_by_tag_name(self, value):
+        return self.find_element('tag name', value)
+
+    def execute_script(self, script, *args):
+        return self.execute(Command.W3C_EXECUTE_SCRIPT, {'script': script, 'args': list(args)})['value']
+
+    def get_cookies(self):
+        return self.execute(Command.GET_ALL_COOKIES)['value']
+
+    def add_cookie(self, cookie):
+        self.execute(Command.ADD_COOKIE, {'cookie': cookie})
+
+    def delete_all_cookies(self):
+        self.execute(Command.DELETE_ALL_COOKIES)
+
+    def back(self):
+        self.execute(Command.GO_BACK)
+
+    def forward(self):
+        self.execute(Command.GO_FORWARD)
+
+    def refresh(self):
+        self.execute(Command.REFRESH)
+
+    def quit(self):
+        self.execute(Command.QUIT)
+
+
+@contextlib.contextmanager
+def timed(timings, phase):
+    """Stores the seconds spent inside the block into timings[phase]"""
+    phase_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - phase_start
+
+
+def measure(tree_path, latency=0.0):
+    """Times each phase of a run over a tree written by generate_benchmark (meant to run in a fresh process)
+
+    :param tree_path: directory of the synthetic tree
+    :param latency: seconds each fake WebDriver command takes
+    :return: dictionary with the timings (seconds) of BENCHMARK_PHASES and the amounts of entities
+    """
+    logging.getLogger(LOGGER_INSTANCE).setLevel(logging.WARNING)
+    service = ExecutionService(os.path.join(tree_path, 'environment.json'))
+    timings = {}
+
+    with timed(timings, 'discovery'):
+        service.filenames = service.find_files()
+    with timed(timings, 'pre_process'):
+        file_contents = [pre_process_file(file_path) for file_path in service.filenames['features']]
+    with timed(timings, 'process_file'):
+        for file_path, file_content in zip(service.filenames['features'], file_contents):
+            Feature.merge_features(Feature(file_path, service.environment, service.locale, file_content).features,
+                                   service.runtime)
+    with timed(timings, 'import'):
+        service.load_modules()
+    with timed(timings, 'resolve'):
+        service.registry = StepRegistry(service.loaded_steps, service.loaded_factories)
+        Feature.solve_references(service.runtime, service.registry)
+
+    runtime = selenium_runtime.current()
+    driver = FakeWebDriver(latency)
+    runtime.session.driver_instance = driver
+    runtime.session.time_commands(driver)
+    with timed(timings, 'execute'):
+        for feature, feature_obj in service.runtime.items():
+            feature_obj['status'] = ExecutionStatus.RUNNING
+            selenium_runtime.prepare(feature)
+            for scenario, scenario_obj in feature_obj['scenarios'].items():
+                service.run_scenario(feature, scenario, scenario_obj)
+            service.finish_feature(feature, feature_obj)
+        service.gather_runtime_stats(runtime)
+    with timed(timings, 'display'), contextlib.redirect_stdout(io.StringIO()):
+        service.display_results(list(service.runtime))
+
+    scenarios = [scenario_obj for feature_obj in service.runtime.values()
+                 for scenario_obj in feature_obj['scenarios'].values()]
+    steps = [step for scenario_obj in scenarios for step in scenario_obj['steps']]
+    return {
+        'timings': timings,
+        'features': len(service.runtime),
+        'scenarios': len(scenarios),
+        'steps': len(steps),
+        'failed_steps': sum(1 for step in steps if step['status'] != ExecutionStatus.PASSED),
+        'webdriver_commands': driver.commands
+    }
+
+
+def run_suite(scenario_counts, repeat=DEFAULT_REPEAT, latency=0.0):
+    """Generates a tree for each scenario amount and measures it repeat times, each time in a new process
+
+    :param scenario_counts: iterable of scenario amounts
+    :param repeat: measurements of each tree, the fastest time of each phase is kept
+    :param latency: seconds each fake WebDriver command takes
+    :return: dictionary ready to be dumped as JSON
+    """
+    logger = logging.getLogger(LOGGER_INSTANCE)
+    results = []
+    for scenario_count in scenario_counts:
+        with tempfile.TemporaryDirectory(prefix='bdd_bench_') as tree_path:
+            generate_benchmark(tree_path, scenario_count)
+            measurements = []
+            for _ in range(repeat):
+                with concurrent.futures.ProcessPoolExecutor(1) as executor:
+                    measurements.append(executor.submit(measure, tree_path, latency).result())
+
+        result = {key: value for key, value in measurements[0].items() if key != 'timings'}
+        result['timings'] = {phase: min(measurement['timings'][phase] for measurement in measurements)
+                             for phase in BENCHMARK_PHASES}
+        result['per_scenario_us'] = {phase: elapsed / result['scenarios'] * 1e6
+                                     for phase, elapsed in result['timings'].items()}
+        # Execution time not spent inside the emulated browser round trips
+        result['execute_overhead_per_step_us'] = \
+            (result['timings']['execute'] - latency * result['webdriver_commands']) / result['steps'] * 1e6
+        if result['failed_steps']:
+            logger.warning("%d synthetic steps failed, the execution timings are not comparable"
+                           % result['failed_steps'])
+        logger.info("%d scenarios: %s" % (scenario_count, ', '.join('%s %.3f s' % item
+                                                                    for item in result['timings'].items())))
+        results.append(result)
+
+    return {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'latency': latency,
+        'results': results
+    }
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format="%(asctime)s :: %(levelname)s - %(message)s")
+    logging.getLogger(LOGGER_INSTANCE).setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Benchmark of the BDD Tester with Selenium v.{version} overhead'
+                                     .format(version=VERSION))
+    parser.add_argument('-s', '--scenarios', nargs='+', type=int, default=list(DEFAULT_SCENARIO_COUNTS),
+                        help='Sizes of the synthetic trees, in scenarios')
+    parser.add_argument('-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='Measurements of each tree, the fastest time of each phase is reported')
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help='Milliseconds each fake WebDriver command takes')
+    parser.add_argument('-o', '--output', type=str, default='benchmark.json',
+                        help='Path of the JSON results')
+    args = parser.parse_args()
+
+    report = run_suite(args.scenarios, args.repeat, args.latency / 1e3)
+    verify_directory(args.output, True)
+    with open(args.output, 'w', encoding='utf8') as fp:
+        json.dump(report, fp, indent=2)
+    logging.getLogger(LOGGER_INSTANCE).info("Benchmark results written to %s" % args.output)
@@ -0,0 +1,172 @@
+"""BDD-Selenium - browser_profiles.py
+This file contains the browser launch profiles declared in environment.json (browser_profiles)
+A profile sets the browser, headless mode, window size, page load strategy, blocked URLs and disk cache directory
+"""
+
+import base64
+import json
+import logging
+import os
+
+from selenium.webdriver import ChromeOptions, FirefoxOptions
+from utils import *
+
+""" Page load strategies accepted by WebDriver """
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+
+""" Proxy auto-config template sending the blocked URLs to an unreachable proxy (Firefox) """
+BLOCKING_PAC_TEMPLATE = (
+    "function FindProxyForURL(url, host) {"
+    "  var patterns = %s;"
+    "  for (var i = 0; i < patterns.length; i++) {"
+    "    if (shExpMatch(url, patterns[i])) { return 'PROXY 127.0.0.1:9'; }"
+    "  }"
+    "  return 'DIRECT';"
+    "}"
+)
+
+
+class BrowserProfile:
+    """
+    Browser Profile
+    This class holds the launch settings of a browser session, translated into WebDriver options and capabilities
+
+    Attributes:
+        name: name of the profile in environment.json
+        browser: chrome, firefox or edge
+        headless: runs the browser without a window
+        window_size: tuple (width, height), None keeps the browser default
+        page_load_strategy: normal (waits every resource), eager (waits DOMContentLoaded) or none
+        blocked_urls: list of URL wildcard patterns never downloaded (e.g. *.woff2, *://ads.example.com/*)
+        disk_cache_path: directory of the browser disk cache, shared across sessions and runs, None keeps the default
+    """
+
+    def __init__(self, name='default', browser=TARGET_BROWSER, headless=False, window_size=None,
+                 page_load_strategy='normal', blocked_urls=(), disk_cache_path=None):
+        self.name = name
+        self.browser = browser
+        self.headless = headless
+        self.window_size = window_size
+        self.page_load_strategy = page_load_strategy
+        self.blocked_urls = list(blocked_urls)
+        self.disk_cache_path = disk_cache_path
+
+    @staticmethod
+    def from_settings(name, settings):
+        """Builds a profile from its environment.json entry
+
+        :param name: name of the profile
+        :param settings: dictionary with browser, headless, window_size ([width, height]), page_load_strategy,
+            blocked_urls and disk_cache_path, every key is optional
+        :raise ValueError: unknown browser or page load strategy
+        :return: BrowserProfile
+        """
+        browser = get_value_or_default(settings, 'browser', TARGET_BROWSER)
+        if browser not in ('chrome', 'firefox', 'edge'):
+            raise ValueError('Browser profile %s: unknown browser "%s"' % (name, browser))
+        page_load_strategy = get_value_or_default(settings, 'page_load_strategy', 'normal')
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ValueError('Browser profile %s: unknown page load strategy "%s"' % (name, page_load_strategy))
+        window_size = get_value_or_default(settings, 'window_size', None)
+        disk_cache_path = get_value_or_default(settings, 'disk_cache_path', None)
+        return BrowserProfile(name, browser, get_value_or_default(settings, 'headless', False),
+                              None if window_size is None else tuple(window_size), page_load_strategy,
+                              get_value_or_default(settings, 'blocked_urls', []),
+                              None if disk_cache_path is None else os.path.abspath(disk_cache_path))
+
+    def options(self):
+        """Translates the profile into selenium options (every setting but window size and Chrome URL blocking,
+        applied by SessionManager after launching)
+
+        :return: ChromeOptions or FirefoxOptions, None for edge (capabilities only)
+        """
+        if self.browser == 'chrome':
+            options = ChromeOptions()
+            options.headless = self.headless
+            if self.disk_cache_path is not None:
+                options.add_argument('--disk-cache-dir=' + self.disk_cache_path)
+        elif self.browser == 'firefox':
+            options = FirefoxOptions()
+            options.headless = self.headless
+            if self.disk_cache_path is not None:
+                options.set_preference('browser.cache.disk.enable', True)
+                options.set_preference('browser.cache.disk.parent_directory', self.disk_cache_path)
+            if len(self.blocked_urls):
+                pac_script = BLOCKING_PAC_TEMPLATE % json.dumps(self.blocked_urls)
+                options.set_preference('network.proxy.type', 2)
+                options.set_preference('network.proxy.autoconfig_url.include_path', True)
+                options.set_preference('network.proxy.autoconfig_url', 'data:application/x-ns-proxy-autoconfig;base64,'
+                                       + base64.b64encode(pac_script.encode('utf8')).decode('ascii'))
+        else:
+            return None
+        options.set_capability('pageLoadStrategy', self.page_load_strategy)
+        return options
+
+    def capabilities(self):
+        """Translates the profile into W3C capabilities (alwaysMatch)
+
+        :return: dictionary of capabilities
+        """
+        options = self.options()
+        if options is None:
+            return {'browserName': 'MicrosoftEdge', 'pageLoadStrategy': self.page_load_strategy}
+        return options.to_capabilities()
+
+    def unsupported_settings(self):
+        """Lists the settings the browser of this profile ignores
+
+        :return: list of setting names
+        """
+        if self.browser == 'edge':
+            return [setting for setting, used in (('headless', self.headless), ('blocked_urls', self.blocked_urls),
+                                                  ('disk_cache_path', self.disk_cache_path)) if used]
+        return []
+
+
+class BrowserProfiles:
+    """
+    This class selects the profile of each feature: the feature_profiles entry of the feature, otherwise the
+    profile chosen for the run (--browser-profile or browser_profile in environment.json)
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        profiles: dictionary mapping each profile name into its BrowserProfile
+        default: BrowserProfile of the run
+        feature_profiles: dictionary mapping feature names into profile names
+    """
+
+    def __init__(self, environment, selected=None):
+        """
+        Class BrowserProfiles constructor
+
+        :param environment: dictionary with environment variables (read-only)
+        :param selected: name of the profile of the run, None uses browser_profile of environment.json
+        :raise ValueError: invalid profile or unknown profile name
+        """
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.profiles = {name: BrowserProfile.from_settings(name, settings)
+                         for name, settings in get_value_or_default(environment, 'browser_profiles', {}).items()}
+        for profile in self.profiles.values():
+            for setting in profile.unsupported_settings():
+                self.logger.warning("Browser profile %s: %s is not supported by %s"
+                                    % (profile.name, setting, profile.browser))
+
+        selected = get_value_or_default(environment, 'browser_profile', None) if selected is None else selected
+        self.default = BrowserProfile() if selected is None else self.get(selected)
+        self.feature_profiles = get_value_or_default(environment, 'feature_profiles', {})
+        for profile_name in self.feature_profiles.values():
+            self.get(profile_name)
+
+    def get(self, name):
+        if name not in self.profiles:
+            raise ValueError('Browser profile "%s" is not declared in environment' % name)
+        return self.profiles[name]
+
+    def for_feature(self, feature_name):
+        """Returns the profile a feature runs with
+
+        :param feature_name: name of the feature
+        :return: BrowserProfile
+        """
+        profile_name = self.feature_profiles.get(feature_name)
+        return self.default if profile_name is None else self.profiles[profile_name]
@@ -5,12 +5,17 @@ This file contains all the constants needed to run the program accordingly
 # built-in package for Enumeration
 from enum import Enum
 
+# built-in package for regular expressions
+import re
+
 # Macro definitions
 """ The following variables are used as macros across the program """
 VERSION = '0.9.0beta'
 LOGGER_INSTANCE = "SeleniumBDD.root"
 LOCALES_ROOT = "locales/"
 TARGET_BROWSER = 'firefox'
+DEFAULT_WAIT_TIMEOUT = 30
+DEFAULT_POLL_FREQUENCY = 0.05
 
 
 # Program Error Codes Enumeration
@@ -45,6 +50,19 @@ class ExecutionStatus(int, Enum):
     SKIPPED = 5
     PENDING = 6
     RUNNING = 7
+    CANCELLED = 8
+
+
+# Line classification of the .feature lexer
+class TokenKind(Enum):
+    """
+    The TokenKind class defines all possible classifications of a line in a .feature file
+    """
+    STATEMENT = 0
+    VERB = 1
+    DESCRIPTION = 2
+    TABLE = 3
+    UNKNOWN = 4
 
 
 # Regular expressions lookup table (EDIT CAREFULLY)
@@ -54,6 +72,7 @@ class RegularExpressions:
 
     Attributes:
         regexps: static member consisting of a python dictionary that takes strings into regexps
+        compiled: static member mapping the same keys into compiled pattern objects
     """
     regexps = {
         'blank_line': r'^\s*$',
@@ -65,3 +84,4 @@ class RegularExpressions:
         'step_args': r'"([^"]+)"',
         'spaces': r'\s+'
     }
+    compiled = {name: re.compile(expression) for name, expression in regexps.items()}
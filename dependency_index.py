@@ -0,0 +1,132 @@
+"""BDD-Selenium - dependency_index.py
+This file contains the index mapping each scenario into the step and factory modules it depends on
+Comparing the index of the current tree with a previous snapshot selects the scenarios affected by a change
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from utils import *
+
+
+class DependencyIndex:
+    """
+    Dependency Index
+    This class keeps a content hash of every scenario and module, along with the modules each scenario resolved to
+    A scenario is changed when its own hash, the modules it resolves to or the hash of one of them changed
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        scenarios: dictionary mapping each feature name into its scenarios, each one with its hash and module names
+        modules: dictionary mapping each step and factory module name into the hash of its file
+    """
+
+    def __init__(self, scenarios=None, modules=None):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.scenarios = {} if scenarios is None else scenarios
+        self.modules = {} if modules is None else modules
+
+    @staticmethod
+    def build(runtime, module_files):
+        """Indexes a runtime whose references were solved, before any scenario runs
+
+        :param runtime: dictionary of features (read-only)
+        :param module_files: list of addresses of the step and factory files
+        :return: DependencyIndex
+        """
+        index = DependencyIndex()
+        for file_path in module_files:
+            with open(file_path, 'rb') as fp:
+                index.modules[extract_module_name(file_path)] = hashlib.sha256(fp.read()).hexdigest()
+
+        for feature_name, feature_obj in runtime.items():
+            index.scenarios[feature_name] = {
+                scenario_name: {
+                    'hash': DependencyIndex.scenario_hash(feature_obj['description'], scenario_obj),
+                    'modules': sorted({step['module'] for step in scenario_obj['steps']
+                                       if step.get('module') is not None})
+                } for scenario_name, scenario_obj in feature_obj['scenarios'].items()
+            }
+        return index
+
+    @staticmethod
+    def scenario_hash(description, scenario_obj):
+        """Hashes the text of a scenario as parsed, thus comments and blank lines never change it
+
+        :param description: description of the parent feature
+        :param scenario_obj: scenario dictionary inside runtime (read-only)
+        :return: hexadecimal sha256 digest
+        """
+        content = json.dumps([description, ExecutionStatus(scenario_obj['status']).name,
+                              [[step['verb'], step['name'], step['args']] for step in scenario_obj['steps']]],
+                             ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def load(index_path):
+        """Reads an index written by save
+
+        :param index_path: address of the JSON index file
+        :return: DependencyIndex, None if missing or unreadable
+        """
+        logger = logging.getLogger(LOGGER_INSTANCE)
+        try:
+            with open(index_path, 'r', encoding='utf8') as fp:
+                content = json.load(fp)
+            if content.get('version') != VERSION:
+                logger.warning("Dependency index %s was written by version %s" % (index_path, content.get('version')))
+            return DependencyIndex(content['scenarios'], content['modules'])
+        except FileNotFoundError:
+            logger.error("Dependency index %s does not exist" % index_path)
+        except (ValueError, KeyError, AttributeError):
+            logger.error("Dependency index %s is corrupted" % index_path)
+        return None
+
+    def save(self, index_path):
+        """Writes the index atomically
+
+        :param index_path: destination path
+        :return: void
+        """
+        verify_directory(index_path, True)
+        temporary_path = index_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf8') as fp:
+            json.dump({'version': VERSION, 'scenarios': self.scenarios, 'modules': self.modules}, fp,
+                      ensure_ascii=False, indent=2)
+        os.replace(temporary_path, index_path)
+
+    def merge(self, previous):
+        """Completes an index built from a subset of the features with the entries of a previous index, so a run of
+        a few features does not drop the other ones from the snapshot
+
+        :param previous: DependencyIndex written by an earlier run
+        :return: void
+        """
+        for feature_name, scenarios in previous.scenarios.items():
+            self.scenarios.setdefault(feature_name, scenarios)
+        for module_name, digest in previous.modules.items():
+            self.modules.setdefault(module_name, digest)
+
+    def changed_scenarios(self, previous):
+        """Compares this index with a previous snapshot
+
+        :param previous: DependencyIndex of the snapshot
+        :return: dictionary mapping each feature name into the set of its changed scenario names
+        """
+        changed_modules = {name for name, digest in self.modules.items() if previous.modules.get(name) != digest}
+        changed_modules.update(name for name in previous.modules if name not in self.modules)
+        if len(changed_modules):
+            self.logger.info("Changed modules: %s" % ', '.join(sorted(changed_modules)))
+
+        changed = {}
+        for feature_name, scenarios in self.scenarios.items():
+            previous_scenarios = previous.scenarios.get(feature_name, {})
+            for scenario_name, entry in scenarios.items():
+                previous_entry = previous_scenarios.get(scenario_name)
+                if previous_entry is None or previous_entry['hash'] != entry['hash'] or \
+                        previous_entry['modules'] != entry['modules'] or \
+                        any(module in changed_modules for module in entry['modules']):
+                    changed.setdefault(feature_name, set()).add(scenario_name)
+        return changed
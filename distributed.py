@@ -0,0 +1,339 @@
+"""BDD-Selenium - distributed.py
+This file contains the coordinator and worker of the distributed execution
+The coordinator parses the features once and leases scenarios over HTTP, each worker pulls a scenario at a time,
+runs it against its own browser and posts the outcome back. A lease not renewed by heartbeats is re-queued
+"""
+
+import collections
+import json
+import logging
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from runtime_model import load_runtime
+from utils import *
+
+""" Seconds a worker may go without a heartbeat before its scenario is re-queued """
+DEFAULT_LEASE_TIMEOUT = 30
+
+""" Times a scenario is leased before being reported as failed (e.g. it keeps crashing the workers) """
+DEFAULT_MAX_ATTEMPTS = 3
+
+""" Seconds a worker waits before asking again, when every pending scenario is leased to other workers """
+IDLE_POLL_INTERVAL = 1.0
+
+""" Times a worker retries a request before giving up on an unreachable coordinator """
+REQUEST_RETRIES = 5
+
+
+class Coordinator:
+    """
+    Coordinator
+    This class serves the plan and leases scenarios to the workers, collecting their outcomes
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        plan: runtime sent to the workers, serialized by dump_runtime
+        on_outcome: callback receiving (feature name, scenario name, outcome) for each finished scenario
+        admits: callable receiving (feature name, scenario name), False withdraws the scenario instead of leasing it
+        on_withdrawn: callback receiving (feature name, scenario name) for each withdrawn scenario
+        lease_timeout: seconds a lease lasts without heartbeats
+        max_attempts: times a scenario is leased before being reported as failed
+        pending: deque of (feature name, scenario name) waiting for a worker
+        leases: dictionary mapping each lease id into its scenario, worker and deadline
+        expired: dictionary mapping each expired lease id into its scenario, a late outcome is still accepted
+        finished: set of (feature name, scenario name) with outcome
+        attempts: dictionary mapping each (feature name, scenario name) into the times it was leased
+        unfinished: amount of scenarios without outcome
+        condition: condition variable guarding the fields above, notified when a scenario finishes
+        server: ThreadingHTTPServer answering the workers
+    """
+
+    def __init__(self, address, plan, scenarios, on_outcome, lease_timeout=DEFAULT_LEASE_TIMEOUT,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, admits=None, on_withdrawn=None):
+        """
+        Class Coordinator constructor
+
+        :param address: tuple (host, port) to listen on
+        :param plan: runtime sent to the workers, serialized by dump_runtime
+        :param scenarios: list of (feature name, scenario name) to lease
+        :param on_outcome: callback receiving (feature name, scenario name, outcome)
+        :param lease_timeout: seconds a lease lasts without heartbeats
+        :param max_attempts: times a scenario is leased before being reported as failed
+        :param admits: callable receiving (feature name, scenario name), None admits every scenario
+        :param on_withdrawn: callback receiving (feature name, scenario name), None ignores withdrawn scenarios
+        """
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.plan = plan
+        self.on_outcome = on_outcome
+        self.admits = (lambda scenario: True) if admits is None else admits
+        self.on_withdrawn = (lambda feature, scenario: None) if on_withdrawn is None else on_withdrawn
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.pending = collections.deque(scenarios)
+        self.leases = {}
+        self.expired = {}
+        self.finished = set()
+        self.attempts = {}
+        self.unfinished = len(self.pending)
+        self.condition = threading.Condition()
+        self.server = ThreadingHTTPServer(address, CoordinatorRequestHandler)
+        self.server.daemon_threads = True
+        self.server.coordinator = self
+
+    def serve(self):
+        """Answers the workers until every scenario has an outcome
+
+        :return: void
+        """
+        host, port = self.server.server_address[:2]
+        self.logger.info("Coordinator listening on http://%s:%d with %d scenarios" % (host, port, self.unfinished))
+        server_thread = threading.Thread(target=self.server.serve_forever, name='Coordinator', daemon=True)
+        server_thread.start()
+        try:
+            with self.condition:
+                while self.unfinished:
+                    self.condition.wait(self.lease_timeout / 2)
+                    self.requeue_expired()
+            # Workers polling for work must learn that the execution is done before the server goes away
+            time.sleep(IDLE_POLL_INTERVAL * 2)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def requeue_expired(self):
+        """Puts back on the queue the scenarios of leases without heartbeats, must hold condition
+        Scenarios no longer admitted are withdrawn instead
+
+        :return: void
+        """
+        now = time.monotonic()
+        for lease_id in [lease_id for lease_id, lease in self.leases.items() if lease['deadline'] < now]:
+            lease = self.leases.pop(lease_id)
+            self.expired[lease_id] = lease
+            if self.admits(lease['scenario']):
+                self.logger.warning("Worker %s lost scenario %s. Re-queueing..."
+                                    % (lease['worker'], lease['scenario'][1]))
+                self.pending.appendleft(lease['scenario'])
+            else:
+                self.logger.warning("Worker %s lost scenario %s. Withdrawing..."
+                                    % (lease['worker'], lease['scenario'][1]))
+                self.finish_withdrawn(lease['scenario'])
+
+    def lease(self, worker):
+        """Hands the next pending scenario to a worker
+
+        :param worker: worker identifier
+        :return: dictionary with lease, feature, scenario and heartbeat, or wait (seconds), or done
+        """
+        with self.condition:
+            self.requeue_expired()
+            while len(self.pending):
+                scenario = self.pending.popleft()
+                if not self.admits(scenario):
+                    self.finish_withdrawn(scenario)
+                    continue
+                self.attempts[scenario] = self.attempts.get(scenario, 0) + 1
+                if self.attempts[scenario] <= self.max_attempts:
+                    lease_id = uuid.uuid4().hex
+                    self.leases[lease_id] = {'scenario': scenario, 'worker': worker,
+                                             'deadline': time.monotonic() + self.lease_timeout}
+                    return {'lease': lease_id, 'feature': scenario[0], 'scenario': scenario[1],
+                            'heartbeat': self.lease_timeout / 3}
+
+                self.logger.error("Scenario %s was lost by %d workers" % (scenario[1], self.max_attempts))
+                self.finish(scenario, None)
+            if self.unfinished:
+                return {'wait': IDLE_POLL_INTERVAL}
+            return {'done': True}
+
+    def heartbeat(self, lease_id):
+        """Extends a lease
+
+        :param lease_id: lease identifier
+        :return: dictionary with alive, False when the lease expired and the scenario was re-queued
+        """
+        with self.condition:
+            lease = self.leases.get(lease_id)
+            if lease is not None:
+                lease['deadline'] = time.monotonic() + self.lease_timeout
+            return {'alive': lease is not None}
+
+    def complete(self, lease_id, outcome):
+        """Receives the outcome of a leased scenario. Outcomes of re-queued leases are accepted if the scenario
+        did not finish yet, so a slow worker is not wasted
+
+        :param lease_id: lease identifier
+        :param outcome: dictionary returned by RunState.scenario_outcome
+        :return: dictionary with accepted
+        """
+        with self.condition:
+            lease = self.leases.pop(lease_id, None) or self.expired.pop(lease_id, None)
+            if lease is None or lease['scenario'] in self.finished:
+                return {'accepted': False}
+            if lease['scenario'] in self.pending:
+                self.pending.remove(lease['scenario'])
+            self.finish(lease['scenario'], outcome)
+            return {'accepted': True}
+
+    def withdraw(self):
+        """Withdraws the pending scenarios no longer admitted, e.g. once the failure budget is used up
+        Scenarios already leased keep running, the ones re-queued later are checked again when their lease expires
+
+        :return: list of the withdrawn (feature name, scenario name)
+        """
+        with self.condition:
+            withdrawn = [scenario for scenario in self.pending if not self.admits(scenario)]
+            for scenario in withdrawn:
+                self.pending.remove(scenario)
+                self.finish_withdrawn(scenario)
+            return withdrawn
+
+    def finish_withdrawn(self, scenario):
+        """Marks a scenario as finished without outcome, must hold condition
+
+        :param scenario: tuple (feature name, scenario name)
+        :return: void
+        """
+        self.finished.add(scenario)
+        self.unfinished -= 1
+        self.condition.notify_all()
+        self.on_withdrawn(scenario[0], scenario[1])
+
+    def finish(self, scenario, outcome):
+        """Marks a scenario as finished, must hold condition
+
+        :param scenario: tuple (feature name, scenario name)
+        :param outcome: dictionary returned by RunState.scenario_outcome, None if every worker was lost
+        :return: void
+        """
+        for lease_id in [lease_id for lease_id, lease in self.leases.items() if lease['scenario'] == scenario]:
+            del self.leases[lease_id]
+        self.finished.add(scenario)
+        self.unfinished -= 1
+        self.condition.notify_all()
+        self.on_outcome(scenario[0], scenario[1], outcome)
+
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    """
+    This class maps the HTTP requests of the workers into Coordinator calls
+    GET /plan, POST /lease {worker}, POST /heartbeat {lease} and POST /complete {lease, outcome}
+    """
+
+    def do_GET(self):
+        if self.path == '/plan':
+            self.send_body(self.server.coordinator.plan, 'application/octet-stream')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if self.path == '/lease':
+                response = coordinator.lease(request['worker'])
+            elif self.path == '/heartbeat':
+                response = coordinator.heartbeat(request['lease'])
+            elif self.path == '/complete':
+                response = coordinator.complete(request['lease'], request['outcome'])
+            else:
+                self.send_error(404)
+                return
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400)
+            return
+        self.send_body(json.dumps(response).encode('utf8'))
+
+    def send_body(self, body, content_type='application/json'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(LOGGER_INSTANCE).debug("Coordinator: " + format % args)
+
+
+class Worker:
+    """
+    Worker
+    This class pulls scenarios from a coordinator and runs them, one at a time, sending heartbeats meanwhile
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        url: base URL of the coordinator
+        worker_id: identifier of this worker, reported in the coordinator logs
+    """
+
+    def __init__(self, url):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.url = url.rstrip('/')
+        self.worker_id = '{host}:{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+
+    def request(self, path, payload=None):
+        """Sends a request to the coordinator, retrying while it's unreachable
+
+        :param path: endpoint path
+        :param payload: dictionary posted as JSON, None for GET
+        :return: response body (bytes)
+        """
+        data = None if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf8')
+        for attempt in range(REQUEST_RETRIES):
+            try:
+                with urllib.request.urlopen(urllib.request.Request(self.url + path, data=data), timeout=60) as response:
+                    return response.read()
+            except (urllib.error.URLError, ConnectionError) as error:
+                if attempt == REQUEST_RETRIES - 1:
+                    raise
+                self.logger.warning("Coordinator unreachable (%s). Retrying..." % error)
+                time.sleep(2 ** attempt)
+
+    def fetch_plan(self):
+        """Downloads the runtime parsed by the coordinator
+
+        :return: dictionary of features
+        """
+        return load_runtime(self.request('/plan'))
+
+    def serve(self, run_scenario):
+        """Runs leased scenarios until the coordinator has no more work
+
+        :param run_scenario: callback receiving (feature name, scenario name), returns the scenario outcome
+        :return: amount of scenarios executed
+        """
+        executed = 0
+        while True:
+            lease = json.loads(self.request('/lease', {'worker': self.worker_id}))
+            if lease.get('done', False):
+                return executed
+            if 'wait' in lease:
+                time.sleep(lease['wait'])
+                continue
+
+            stop_heartbeat = threading.Event()
+            heartbeat = threading.Thread(target=self.send_heartbeats, args=(lease, stop_heartbeat),
+                                         name='Heartbeat', daemon=True)
+            heartbeat.start()
+            try:
+                outcome = run_scenario(lease['feature'], lease['scenario'])
+            finally:
+                stop_heartbeat.set()
+                heartbeat.join()
+            self.request('/complete', {'lease': lease['lease'], 'outcome': outcome})
+            executed += 1
+
+    def send_heartbeats(self, lease, stop):
+        while not stop.wait(lease['heartbeat']):
+            try:
+                if not json.loads(self.request('/heartbeat', {'lease': lease['lease']}))['alive']:
+                    self.logger.warning("Lease of scenario %s expired on coordinator" % lease['scenario'])
+            except (urllib.error.URLError, ConnectionError):
+                self.logger.warning("Heartbeat of scenario %s was not delivered" % lease['scenario'])
+
@@ -0,0 +1,107 @@
+"""BDD-Selenium - dry_run.py
+This file contains the null runtime of the dry run (--dry-run --record-calls)
+Steps run against a NullRuntime, which records the calls they would send to the browser instead of launching one
+"""
+
+import inspect
+import logging
+
+from utils import *
+
+
+class NullValue:
+    """
+    This class stands for any value returned by the browser during a dry run (elements, texts, flags...)
+    Calls made on it are recorded by its NullRuntime, it is truthy and contains everything, so the usual
+    assertions of steps hold
+
+    Attributes:
+        runtime: NullRuntime recording the calls
+        path: expression producing this value (e.g. wait_for_element('submit'))
+    """
+
+    def __init__(self, runtime, path):
+        self.runtime = runtime
+        self.path = path
+
+    def __getattr__(self, name):
+        return NullValue(self.runtime, '{path}.{name}'.format(path=self.path, name=name))
+
+    def __call__(self, *args, **kwargs):
+        return self.runtime.record(self.path, args, kwargs)
+
+    def __bool__(self):
+        return True
+
+    def __contains__(self, item):
+        return True
+
+    def __iter__(self):
+        return iter(())
+
+    def __str__(self):
+        return ''
+
+    def __repr__(self):
+        return self.path
+
+
+class NullRuntime:
+    """
+    Null Runtime
+    This class replaces SeleniumRuntime during a dry run: the public methods and properties of the runtime class are
+    accepted and their calls are recorded, names the runtime class does not define raise AttributeError as they
+    would on a real run
+
+    Attributes:
+        runtime_class: class whose public attributes are accepted (e.g. SeleniumRuntime)
+        calls: list of strings, one for each call recorded since the last take_calls
+    """
+
+    def __init__(self, runtime_class):
+        self.runtime_class = runtime_class
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not hasattr(self.runtime_class, name):
+            raise AttributeError("'{runtime}' object has no attribute '{name}'"
+                                 .format(runtime=self.runtime_class.__name__, name=name))
+        return NullValue(self, name)
+
+    def record(self, path, args, kwargs):
+        """Records a call and returns a NullValue standing for its result
+
+        :param path: expression of the called attribute
+        :param args: positional arguments of the call
+        :param kwargs: keyword arguments of the call
+        :return: NullValue
+        """
+        call = '{path}({arguments})'.format(path=path, arguments=', '.join(
+            [repr(arg) for arg in args] + ['{key}={value!r}'.format(key=key, value=value)
+                                           for key, value in kwargs.items()]))
+        self.calls.append(call)
+        return NullValue(self, call)
+
+    def take_calls(self):
+        calls, self.calls = self.calls, []
+        return calls
+
+    def quit(self):
+        pass
+
+
+def signature_problem(step_ref, args):
+    """Checks that a step or factory accepts the arguments written in the .feature file
+
+    :param step_ref: solved reference of the step (run method of factories)
+    :param args: list of arguments of the step
+    :return: description of the mismatch, None if the call is valid
+    """
+    try:
+        inspect.signature(step_ref).bind(*args)
+    except TypeError as error:
+        return str(error)
+    except ValueError:
+        # Callables without signature (e.g. builtins) can't be checked
+        logging.getLogger(LOGGER_INSTANCE).debug("Signature of %s is not available" % step_ref)
+    return None
@@ -3,20 +3,44 @@ This file defines the principal service definition of application,
 which contains all the environment variables, localization, dependency tree and so on...
 """
 
+import asyncio
 import glob
+import hashlib
 import importlib
+import inspect
 import json
 import logging
 import sys
+import threading
+import time
 import traceback
 import yaml
-import pickle
 
-from datetime import datetime
-from feature import Feature
-from selenium_runtime import selenium_runtime
+from async_runtime import AsyncSeleniumRuntime, AsyncSession, SyncAdapter
+from async_webdriver import AsyncHTTPPool
+from browser_profiles import BrowserProfiles
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dependency_index import DependencyIndex
+from failure_budget import FailureBudget
+from dry_run import NullRuntime, signature_problem
+from distributed import Coordinator, Worker, DEFAULT_LEASE_TIMEOUT, DEFAULT_MAX_ATTEMPTS
+from feature import Feature, RecordCollector, init_parse_worker, parse_feature_file
+from plan_cache import PlanCache, dump_plan, load_plan
+from profiler import RunProfiler
+from registry import StepRegistry
+from reporters import ReporterPipeline
+from runtime_model import dump_runtime, load_runtime, traceback_spool
+from run_state import RunState
+from scheduling import TimingHistory
+from selenium_runtime import SeleniumRuntime, selenium_runtime
 from utils import *
 
+""" Least amount of uncached .feature files worth starting a process pool for """
+PARALLEL_PARSE_THRESHOLD = 64
+
+""" Feature statuses that a skipped or cancelled scenario may replace while settling (no failure so far) """
+SETTLED_WITHOUT_FAILURE = (ExecutionStatus.RUNNING, ExecutionStatus.SKIPPED, ExecutionStatus.CANCELLED)
+
 
 class ExecutionService:
     """
@@ -32,6 +56,16 @@ class ExecutionService:
         runtime: dictionary mapping each entity into it's dependencies and status
         loaded_steps: dictionary mapping each step file found (using filename) into the actual imported modules
         loaded_factories: dictionary mapping each factory file found (using filename) into the actual imported modules
+        registry: StepRegistry indexing loaded_steps and loaded_factories, built before solving references
+        wait_timings: list of tuples (wait name, elapsed seconds) gathered from every SeleniumRuntime used
+        cache_stats: dictionary with the element cache hits and misses gathered from every SeleniumRuntime used
+        reporters: ReporterPipeline streaming results while the tests run
+        state: RunState holding the outcome of each scenario of the previous runs, loaded before the execution
+        dependency_index: DependencyIndex of the current tree, built after solving references
+        history: TimingHistory of the scenario durations, used to dispatch the longest scenarios first
+        browser_profiles: BrowserProfiles selecting the browser launch settings of each feature
+        profiler: RunProfiler of the run, disabled unless --profile is given
+        failure_budget: FailureBudget cancelling the queued scenarios once too many failed
     """
 
     def __init__(self, env_path):
@@ -43,6 +77,16 @@ class ExecutionService:
         self.runtime = {}
         self.loaded_steps = {}
         self.loaded_factories = {}
+        self.registry = None
+        self.wait_timings = []
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self.reporters = ReporterPipeline([])
+        self.state = None
+        self.dependency_index = None
+        self.history = None
+        self.browser_profiles = None
+        self.profiler = RunProfiler()
+        self.failure_budget = FailureBudget()
 
     def load_environment_from_json(self, env_path):
         """Loads the content from environment.json
@@ -56,9 +100,36 @@ class ExecutionService:
         except FileNotFoundError:
             self.logger.error("Could not found environment JSON at: {path}. Check the address and try again."
                               .format(path=env_path))
-            selenium_runtime.browser.quit()
+            selenium_runtime.quit()
             exit(ErrorCodes.MISSING_ENVIRONMENT)
 
+    def load_browser_profiles(self, selected):
+        """Loads the browser profiles declared in environment.json
+
+        :param selected: name of the profile of the run, None uses browser_profile of environment.json
+        :return: BrowserProfiles, exit process with MISSING_PROPERTY if a profile is invalid or unknown
+        """
+        try:
+            return BrowserProfiles(self.environment, selected)
+        except ValueError as error:
+            self.logger.error(str(error))
+            selenium_runtime.quit()
+            exit(ErrorCodes.MISSING_PROPERTY)
+
+    def load_failure_budget(self, max_failures, fail_fast):
+        """Loads the failure budget of the run
+
+        :param max_failures: failed scenarios tolerated by the run, None uses environment.json
+        :param fail_fast: True stops every feature at its first failed scenario
+        :return: FailureBudget, exit process with MISSING_PROPERTY if max_failures is invalid
+        """
+        try:
+            return FailureBudget.from_environment(self.environment, max_failures, fail_fast)
+        except ValueError as error:
+            self.logger.error(str(error))
+            selenium_runtime.quit()
+            exit(ErrorCodes.MISSING_PROPERTY)
+
     def load_locale(self):
         """Loads the content of the locale specified on environment.json
 
@@ -74,12 +145,12 @@ class ExecutionService:
 
         except KeyError:
             self.logger.error("Variable language not found in environment.json")
-            selenium_runtime.browser.quit()
+            selenium_runtime.quit()
             exit(ErrorCodes.MISSING_PROPERTY)
         except FileNotFoundError:
             self.logger.error("Could not found locale file: {locale_path}. Check the address and try again."
                               .format(locale_path=locale_path))
-            selenium_runtime.browser.quit()
+            selenium_runtime.quit()
             exit(ErrorCodes.MISSING_LOCALE)
 
     def find_files(self):
@@ -109,113 +180,658 @@ class ExecutionService:
         }
 
     def display_results(self, selected_features):
-        """Pretty printer of the results, dumps to JSON if requested in environment"""
+        """Pretty printer of the results, the whole report is aggregated by summarize_results and printed at once"""
         self.logger.info("Testing session completed. Displaying results:")
-        self.logger.info(self.runtime)
+        self.logger.debug("Runtime: %s", self.runtime)
+
+        report, totals = self.summarize_results(selected_features)
+        if len(report):
+            print('\n'.join(report))
+        print("\nResults summary:")
+        print("Features:\n%d detected\n\t%d passed\n\t%d failed"
+              % (totals['features']['total'], totals['features']['passed'], totals['features']['failed']))
 
+        print("Scenarios:\n%d detected\n\t%d passed\n\t%d skipped\n\t%d failed"
+              % (totals['scenarios']['total'], totals['scenarios']['passed'], totals['scenarios']['skipped'],
+                 totals['scenarios']['failed']))
+        if totals['scenarios']['cancelled']:
+            print("\t%d cancelled (failure budget used up)" % totals['scenarios']['cancelled'])
+
+        if self.cache_stats['hits'] + self.cache_stats['misses']:
+            print("Element cache:\n\t%d hits\n\t%d misses" % (self.cache_stats['hits'], self.cache_stats['misses']))
+
+        wait_summary = summarize_timings(self.wait_timings)
+        if len(wait_summary):
+            print("Waits:")
+            for name, entry in sorted(wait_summary.items(), key=lambda item: item[1]['total'], reverse=True):
+                print("\t%s: %d waits, %.2f s total, %.2f s max" % (name, entry['count'], entry['total'], entry['max']))
+
+    def summarize_results(self, selected_features):
+        """Builds the report lines and the counters of the selected features in a single pass over runtime
+        Passed, skipped and cancelled scenarios take one line, the steps of the other ones are listed below them
+
+        :param selected_features: iterable of the feature names that ran
+        :return: tuple (list of report lines, dictionary mapping features, scenarios and steps into their counters)
+        """
         display_names = {
             ExecutionStatus.PASSED: 'PASSED',
-            ExecutionStatus.SKIPPED: 'SKIPPED'
-        }
-        features = {
-            'total': 0,
-            'passed': 0,
-            'failed': 0
+            ExecutionStatus.SKIPPED: 'SKIPPED',
+            ExecutionStatus.CANCELLED: 'CANCELLED'
         }
-        scenarios = {
-            'total': 0,
-            'passed': 0,
-            'skipped': 0,
-            'failed': 0
-        }
-        steps = {
-            'total': 0,
-            'passed': 0,
-            'skipped': 0,
-            'failed': 0
+        totals = {
+            'features': {'total': 0, 'passed': 0, 'failed': 0},
+            'scenarios': {'total': 0, 'passed': 0, 'skipped': 0, 'cancelled': 0, 'failed': 0},
+            'steps': {'total': 0, 'passed': 0, 'skipped': 0, 'failed': 0}
         }
+        features, scenarios, steps = totals['features'], totals['scenarios'], totals['steps']
+        report = []
 
-        ran_features = dict(filter(lambda item: item[0] in selected_features, self.runtime.items()))
-        for feature_name, feature_value in ran_features.items():
+        selected_features = set(selected_features)
+        for feature_name, feature_value in self.runtime.items():
+            if feature_name not in selected_features:
+                continue
             features['total'] += 1
             if feature_value['status'] == ExecutionStatus.PASSED:
                 features['passed'] += 1
-                print("[{status}][{elapsed} ms] - Feature {name}\n\t{description}".format(
+                report.append("[{status}][{elapsed} ms][{phases}] - Feature {name}\n\t{description}".format(
                     status=display_names.get(feature_value['status'], 'FAILED'),
                     elapsed=round(feature_value['exec_time'], 2),
+                    phases=phases_display(feature_value.get('timings')),
                     name=feature_name,
                     description=description_display(feature_value['description'])))
             else:
                 features['failed'] += 1
-                print("[{status}] - Feature {name}\n\t{description}".format(
+                report.append("[{status}] - Feature {name}\n\t{description}".format(
                     status=display_names.get(feature_value['status'], 'FAILED'),
                     name=feature_name,
                     description=description_display(feature_value['description'])))
 
-            print("\tScenarios:")
+            report.append("\tScenarios:")
             for scenario_name, scenario_value in feature_value['scenarios'].items():
                 scenarios['total'] += 1
                 if scenario_value['status'] == ExecutionStatus.PASSED:
                     scenarios['passed'] += 1
-                    print("\t[{status}][{elapsed} ms] - Scenario: {name}".format(
+                    report.append("\t[{status}][{elapsed} ms][{phases}] - Scenario: {name}".format(
                         status=display_names.get(scenario_value['status'], 'FAILED'),
                         elapsed=round(scenario_value['exec_time'], 2),
+                        phases=phases_display(scenario_value.get('timings')),
                         name=scenario_name
                     ))
-                elif scenario_value['status'] == ExecutionStatus.SKIPPED:
-                    scenarios['skipped'] += 1
-                    print("\t[{status}] - Scenario: {name}".format(
+                    continue
+                if scenario_value['status'] in (ExecutionStatus.SKIPPED, ExecutionStatus.CANCELLED):
+                    scenarios[display_names[scenario_value['status']].lower()] += 1
+                    report.append("\t[{status}] - Scenario: {name}".format(
                         status=display_names.get(scenario_value['status'], 'FAILED'),
                         name=scenario_name
                     ))
+                    continue
+
+                scenarios['failed'] += 1
+                report.append("\t[{status}] - Scenario: {name}".format(
+                    status=display_names.get(scenario_value['status'], 'FAILED'),
+                    name=scenario_name
+                ))
+                report.append("\t\tSteps:")
+                for step in scenario_value['steps']:
+                    steps['total'] += 1
+                    if step['status'] == ExecutionStatus.PASSED:
+                        steps['passed'] += 1
+                        report.append("\t\t[{status}][{elapsed} ms][{phases}] - {name}".format(
+                            status=display_names.get(step['status'], 'FAILED'),
+                            elapsed=round(step['details'], 2),
+                            phases=phases_display(step.get('timings')),
+                            name=' '.join([step['verb'], step['name']])
+                        ))
+                    elif step['status'] == ExecutionStatus.SKIPPED:
+                        steps['skipped'] += 1
+                        report.append("\t\t[{status}] - {name}".format(
+                            status=display_names.get(step['status'], 'FAILED'),
+                            name=' '.join([step['verb'], step['name']])
+                        ))
+                    else:
+                        steps['failed'] += 1
+                        details = step['details']
+                        report.append("\t\t[{status}] - {name}. Exception details:\n{exception}".format(
+                            status=display_names.get(step['status'], 'FAILED'),
+                            name=' '.join([step['verb'], step['name']]),
+                            exception=details if details is not None else step['status']
+                        ))
+        return report, totals
+
+    def gather_runtime_stats(self, runtime):
+        """Accumulates the wait timings and element cache counters of a runtime (AsyncSeleniumRuntime has no counters)
+
+        :param runtime: SeleniumRuntime that executed steps
+        :return: void
+        """
+        self.wait_timings.extend(runtime.wait_timings)
+        for counter, amount in runtime.cache_report().items():
+            self.cache_stats[counter] += amount
+
+    def run_scenario(self, feature_name, scenario_name, scenario_obj):
+        """Executes the steps of a single scenario against the browser bound to the calling thread
+        Only the scenario and its steps are modified, feature status is computed later by settle_feature
+        A reporter event is emitted for each finished step and for the scenario
+        The steps after the first failed one are skipped, and the scenario is cancelled once the failure budget
+        of the run (or of its feature) is used up
+
+        :param feature_name: name of the parent feature
+        :param scenario_name: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :return: void
+        """
+        if scenario_obj['status'] == ExecutionStatus.SKIPPED or scenario_obj.get('restored', False):
+            self.reporters.emit('scenario', **self.scenario_event(feature_name, scenario_name, scenario_obj))
+            return
+        if not self.failure_budget.allows(feature_name):
+            self.cancel_scenario(feature_name, scenario_name, scenario_obj)
+            return
+
+        self.reporters.emit('start', feature=feature_name, scenario=scenario_name,
+                            worker=threading.current_thread().name)
+        scenario_start = self.begin_scenario(scenario_obj)
+        for step in scenario_obj['steps']:
+            if scenario_obj['status'] != ExecutionStatus.RUNNING:
+                # The scenario already failed, the remaining steps would only wait on a broken page
+                ExecutionService.skip_step(step)
+            elif step['status'] == ExecutionStatus.PENDING_EXECUTION:
+                runtime = selenium_runtime.current()
+                step_start = self.begin_step(step, runtime)
+                self.profiler.enter_step(step)
+                try:
+                    step['ref'](*step['args'])
+                    failure = None
+                except:
+                    failure = traceback.format_exc()
+                self.profiler.exit_step()
+                self.end_step(scenario_obj, step, runtime, step_start, failure)
+            else:
+                scenario_obj['status'] = step['status']
+            self.reporters.emit('step', feature=feature_name, scenario=scenario_name, **self.step_event(step))
+        self.end_scenario(feature_name, scenario_name, scenario_obj, scenario_start)
+
+    async def run_scenario_async(self, feature_name, scenario_name, scenario_obj, runtime):
+        """Executes the steps of a single scenario on the event loop, see run_scenario
+        Coroutine steps are awaited with runtime bound to the task, synchronous steps run in a helper thread
+        with runtime wrapped by a SyncAdapter
+
+        :param feature_name: name of the parent feature
+        :param scenario_name: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :param runtime: AsyncSeleniumRuntime owned by the calling task
+        :return: void
+        """
+        if scenario_obj['status'] == ExecutionStatus.SKIPPED or scenario_obj.get('restored', False):
+            self.reporters.emit('scenario', **self.scenario_event(feature_name, scenario_name, scenario_obj))
+            return
+        if not self.failure_budget.allows(feature_name):
+            self.cancel_scenario(feature_name, scenario_name, scenario_obj)
+            return
+
+        selenium_runtime.bind_context(runtime)
+        adapter = SyncAdapter(runtime, asyncio.get_running_loop())
+
+        def run_sync_step(step):
+            selenium_runtime.bind_context(adapter)
+            self.profiler.enter_step(step)
+            try:
+                step['ref'](*step['args'])
+            finally:
+                self.profiler.exit_step()
+
+        self.reporters.emit('start', feature=feature_name, scenario=scenario_name,
+                            worker=asyncio.current_task().get_name())
+        scenario_start = self.begin_scenario(scenario_obj)
+        for step in scenario_obj['steps']:
+            if scenario_obj['status'] != ExecutionStatus.RUNNING:
+                ExecutionService.skip_step(step)
+            elif step['status'] == ExecutionStatus.PENDING_EXECUTION:
+                step_start = self.begin_step(step, runtime)
+                try:
+                    if inspect.iscoroutinefunction(step['ref']):
+                        await step['ref'](*step['args'])
+                    else:
+                        await asyncio.to_thread(run_sync_step, step)
+                    failure = None
+                except:
+                    failure = traceback.format_exc()
+                self.end_step(scenario_obj, step, runtime, step_start, failure)
+            else:
+                scenario_obj['status'] = step['status']
+            self.reporters.emit('step', feature=feature_name, scenario=scenario_name, **self.step_event(step))
+        self.end_scenario(feature_name, scenario_name, scenario_obj, scenario_start)
+
+    @staticmethod
+    def begin_scenario(scenario_obj):
+        """Marks a scenario as running
+
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :return: start timestamp (perf_counter_ns)
+        """
+        scenario_obj['status'] = ExecutionStatus.RUNNING
+        scenario_obj['timings'] = {'wait': 0.0, 'webdriver': 0.0, 'python': 0.0}
+        return time.perf_counter_ns()
+
+    def end_scenario(self, feature_name, scenario_name, scenario_obj, scenario_start):
+        """Computes the status and execution time of a scenario whose steps ran and emits its reporter event
+
+        :param feature_name: name of the parent feature
+        :param scenario_name: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :param scenario_start: timestamp returned by begin_scenario
+        :return: void
+        """
+        scenario_obj['exec_time'] = (time.perf_counter_ns() - scenario_start) / 1e6
+        if scenario_obj['status'] == ExecutionStatus.RUNNING:
+            scenario_obj['status'] = ExecutionStatus.PASSED
+        self.failure_budget.record(feature_name, scenario_obj)
+        self.reporters.emit('scenario', **self.scenario_event(feature_name, scenario_name, scenario_obj))
+
+    def cancel_scenario(self, feature_name, scenario_name, scenario_obj):
+        """Cancels a scenario that did not start, its steps are skipped
+
+        :param feature_name: name of the parent feature
+        :param scenario_name: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :return: void
+        """
+        scenario_obj['status'] = ExecutionStatus.CANCELLED
+        for step in scenario_obj['steps']:
+            ExecutionService.skip_step(step)
+        self.reporters.emit('scenario', **self.scenario_event(feature_name, scenario_name, scenario_obj))
+
+    @staticmethod
+    def skip_step(step):
+        if step['status'] == ExecutionStatus.PENDING_EXECUTION:
+            step['status'] = ExecutionStatus.SKIPPED
+
+    @staticmethod
+    def begin_step(step, runtime):
+        """Marks a step as running and reads the phase counters of the runtime executing it
+
+        :param step: step dictionary inside runtime (modified by reference)
+        :param runtime: runtime executing the step
+        :return: tuple (wait nanoseconds, WebDriver nanoseconds, start timestamp)
+        """
+        step['status'] = ExecutionStatus.RUNNING
+        wait_before, webdriver_before = runtime.phase_counters()
+        return wait_before, webdriver_before, time.perf_counter_ns()
+
+    @staticmethod
+    def end_step(scenario_obj, step, runtime, step_start, failure):
+        """Records the outcome and phase timings of a step
+
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :param step: step dictionary inside runtime (modified by reference)
+        :param runtime: runtime that executed the step
+        :param step_start: tuple returned by begin_step
+        :param failure: formatted traceback of the exception raised by the step, None if it passed
+        :return: void
+        """
+        step_elapsed = time.perf_counter_ns() - step_start[2]
+        if failure is None:
+            step['status'] = ExecutionStatus.PASSED
+            step['details'] = step_elapsed / 1e6
+        else:
+            step['status'] = ExecutionStatus.FAILED
+            scenario_obj['status'] = ExecutionStatus.FAILED
+            step['details'] = traceback_spool.intern(failure)
+        wait_after, webdriver_after = runtime.phase_counters()
+        step['timings'] = ExecutionService.phase_timings(step_elapsed, wait_after - step_start[0],
+                                                         webdriver_after - step_start[1])
+        for phase in scenario_obj['timings']:
+            scenario_obj['timings'][phase] += step['timings'][phase]
+
+    @staticmethod
+    def step_event(step):
+        """Extracts the JSON serializable data of a step for reporters
+
+        :param step: step dictionary inside runtime (read-only)
+        :return: dictionary with verb, name, status, exec_time, timings and details (failure traceback)
+        """
+        timings = step.get('timings')
+        return {
+            'verb': step['verb'],
+            'name': step['name'],
+            'status': ExecutionStatus(step['status']).name,
+            'exec_time': timings['total'] if timings else 0.0,
+            'timings': timings,
+            'details': step['details'] if isinstance(step['details'], str) else None
+        }
+
+    @staticmethod
+    def scenario_event(feature_name, scenario_name, scenario_obj):
+        """Extracts the JSON serializable data of a scenario for reporters
+
+        :param feature_name: name of the parent feature
+        :param scenario_name: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (read-only)
+        :return: dictionary with feature, scenario, status, exec_time, timings and steps
+        """
+        return {
+            'feature': feature_name,
+            'scenario': scenario_name,
+            'status': ExecutionStatus(scenario_obj['status']).name,
+            'exec_time': scenario_obj['exec_time'],
+            'timings': scenario_obj.get('timings'),
+            'steps': [ExecutionService.step_event(step) for step in scenario_obj['steps']]
+        }
+
+    def finish_feature(self, feature_name, feature_obj):
+        """Settles a feature whose scenarios all ran, records it into the run state and emits its reporter event
+        Its tracebacks were already reported by the step events, thus they're spooled to disk
+
+        :param feature_name: name of the feature
+        :param feature_obj: feature dictionary inside runtime (modified by reference)
+        :return: void
+        """
+        self.settle_feature(feature_obj)
+        traceback_spool.spool_feature(feature_obj)
+        if self.state is not None:
+            self.state.record(feature_name, feature_obj)
+        self.reporters.emit('feature', feature=feature_name, status=ExecutionStatus(feature_obj['status']).name,
+                            exec_time=feature_obj['exec_time'], timings=feature_obj['timings'])
+
+    @staticmethod
+    def phase_timings(total_ns, wait_ns, webdriver_ns):
+        """Splits the duration of a step into phases
+
+        :param total_ns: nanoseconds spent by the step
+        :param wait_ns: nanoseconds spent waiting for conditions
+        :param webdriver_ns: nanoseconds spent on WebDriver commands outside waits
+        :return: dictionary mapping total, wait, webdriver and python (remaining time) into milliseconds
+        """
+        return {
+            'total': total_ns / 1e6,
+            'wait': wait_ns / 1e6,
+            'webdriver': webdriver_ns / 1e6,
+            'python': max(total_ns - wait_ns - webdriver_ns, 0) / 1e6
+        }
+
+    @staticmethod
+    def settle_feature(feature_obj):
+        """Computes the status and execution time of a feature after all of its scenarios ran
+        Scenarios are visited in declaration order, so the outcome does not depend on execution order
+        A failure is never hidden by a skipped or cancelled scenario (nor by the skipped steps after the failed one)
+        The execution time (and its phases) of a feature is the sum of its passed scenarios
+
+        :param feature_obj: feature dictionary inside runtime (modified by reference)
+        :return: void
+        """
+        feature_obj['status'] = ExecutionStatus.RUNNING
+        feature_obj['exec_time'] = 0
+        feature_obj['timings'] = {}
+        for scenario_obj in feature_obj['scenarios'].values():
+            if scenario_obj['status'] in SETTLED_WITHOUT_FAILURE:
+                if feature_obj['status'] in SETTLED_WITHOUT_FAILURE:
+                    feature_obj['status'] = scenario_obj['status']
+                continue
+
+            for step in scenario_obj['steps']:
+                if step['status'] == ExecutionStatus.SKIPPED:
+                    if feature_obj['status'] in SETTLED_WITHOUT_FAILURE:
+                        feature_obj['status'] = ExecutionStatus.SKIPPED
+                elif step['status'] != ExecutionStatus.PASSED:
+                    feature_obj['status'] = step['status']
+            if scenario_obj['status'] == ExecutionStatus.PASSED:
+                feature_obj['exec_time'] += scenario_obj['exec_time']
+                for phase, elapsed in scenario_obj['timings'].items():
+                    feature_obj['timings'][phase] = feature_obj['timings'].get(phase, 0.0) + elapsed
+        if feature_obj['status'] == ExecutionStatus.RUNNING:
+            feature_obj['status'] = ExecutionStatus.PASSED
+
+    def run_parallel(self, features, workers):
+        """Dispatches the scenarios of the requested features to a pool of worker threads
+        Each worker owns an independent SeleniumRuntime (and browser session), bound through selenium_runtime
+
+        :param features: iterable of feature names that should run
+        :param workers: amount of browser sessions running concurrently
+        :return: void
+        """
+        runtimes = []
+        runtimes_lock = threading.Lock()
+
+        def bind_worker_runtime():
+            runtime = SeleniumRuntime()
+            with runtimes_lock:
+                runtimes.append(runtime)
+            selenium_runtime.bind(runtime)
+
+        remaining_scenarios = {}
+        remaining_lock = threading.Lock()
+
+        def run_worker_scenario(feature, scenario, scenario_obj):
+            # Queued scenarios cancelled by the failure budget never touch the browser
+            if not scenario_obj.get('restored', False) and self.failure_budget.allows(feature):
+                selenium_runtime.prepare(feature, self.browser_profiles.for_feature(feature))
+            self.run_scenario(feature, scenario, scenario_obj)
+            with remaining_lock:
+                remaining_scenarios[feature] -= 1
+                finished = remaining_scenarios[feature] == 0
+            if finished:
+                self.finish_feature(feature, self.runtime[feature])
+
+        selected_features = {}
+        for feature in features:
+            if feature in self.runtime:
+                self.runtime[feature]['status'] = ExecutionStatus.RUNNING
+                selected_features[feature] = self.runtime[feature]
+                remaining_scenarios[feature] = len(self.runtime[feature]['scenarios'])
+                if remaining_scenarios[feature] == 0:
+                    self.finish_feature(feature, self.runtime[feature])
+            else:
+                self.logger.error('Requested feature "%s" was not present on test files' % feature)
+
+        self.logger.info("Dispatching scenarios to %d workers" % workers)
+        try:
+            with ThreadPoolExecutor(max_workers=workers, initializer=bind_worker_runtime,
+                                    thread_name_prefix='Worker') as pool:
+                scenarios = [(feature, scenario) for feature, feature_obj in selected_features.items()
+                             for scenario in feature_obj['scenarios']]
+                scenarios = self.history.longest_first(self.runtime, scenarios)
+                pending = [pool.submit(run_worker_scenario, feature, scenario,
+                                       self.runtime[feature]['scenarios'][scenario])
+                           for feature, scenario in scenarios]
+                for future in pending:
+                    future.result()
+        finally:
+            for runtime in runtimes:
+                self.gather_runtime_stats(runtime)
+                runtime.quit()
+
+    def run_async(self, features, sessions):
+        """Runs the scenarios of the requested features as asyncio tasks of a single thread, each one driving its
+        browser through the W3C WebDriver server set in environment.json (async.webdriver_url)
+        The async backend does not cache elements, so no element cache summary is displayed
+
+        :param features: iterable of feature names that should run
+        :param sessions: amount of browser sessions driven concurrently, at least 1
+        :return: void
+        """
+        settings = get_value_or_default(self.environment, 'async', {})
+        # Without sessions (or connections) every task would wait forever for one
+        if sessions < 1 or get_value_or_default(settings, 'max_connections', sessions * 2) < 1:
+            raise ValueError("The async backend needs at least 1 session and 1 connection")
+        remaining_scenarios = {}
+        selected_features = {}
+        for feature in features:
+            if feature in self.runtime:
+                self.runtime[feature]['status'] = ExecutionStatus.RUNNING
+                selected_features[feature] = self.runtime[feature]
+                remaining_scenarios[feature] = len(self.runtime[feature]['scenarios'])
+                if remaining_scenarios[feature] == 0:
+                    self.finish_feature(feature, self.runtime[feature])
+            else:
+                self.logger.error('Requested feature "%s" was not present on test files' % feature)
+        scenarios = self.history.longest_first(self.runtime, [(feature, scenario)
+                                                              for feature, feature_obj in selected_features.items()
+                                                              for scenario in feature_obj['scenarios']])
+
+        async def run_all():
+            pool = AsyncHTTPPool(get_value_or_default(settings, 'webdriver_url', 'http://127.0.0.1:4444'),
+                                 get_value_or_default(settings, 'max_connections', sessions * 2))
+            runtimes = [AsyncSeleniumRuntime(AsyncSession(pool)) for _ in range(sessions)]
+            idle_runtimes = asyncio.Queue()
+            for runtime in runtimes:
+                idle_runtimes.put_nowait(runtime)
+
+            async def run_task(feature, scenario):
+                scenario_obj = self.runtime[feature]['scenarios'][scenario]
+                runtime = await idle_runtimes.get()
+                asyncio.current_task().set_name('Session-%d' % runtimes.index(runtime))
+                try:
+                    if scenario_obj['status'] != ExecutionStatus.SKIPPED and not scenario_obj.get('restored', False) \
+                            and self.failure_budget.allows(feature):
+                        await runtime.prepare(feature, self.browser_profiles.for_feature(feature))
+                    await self.run_scenario_async(feature, scenario, scenario_obj, runtime)
+                finally:
+                    idle_runtimes.put_nowait(runtime)
+                remaining_scenarios[feature] -= 1
+                if remaining_scenarios[feature] == 0:
+                    self.finish_feature(feature, self.runtime[feature])
+
+            try:
+                await asyncio.gather(*(run_task(feature, scenario) for feature, scenario in scenarios))
+            finally:
+                for runtime in runtimes:
+                    self.gather_runtime_stats(runtime)
+                    await runtime.quit()
+                await pool.close()
+                self.logger.info("%d WebDriver connections opened for %d sessions" % (pool.opened, sessions))
+
+        self.logger.info("Running scenarios on %d asynchronous sessions" % sessions)
+        asyncio.run(run_all())
+
+    def run_distributed(self, features, address, plan):
+        """Leases the scenarios of the requested features to remote workers and waits for their outcomes
+        Skipped and restored scenarios are settled locally, they never reach the workers
+        Once the failure budget is used up, the scenarios not leased yet (or re-queued later) are withdrawn and
+        cancelled
+
+        :param features: iterable of feature names that should run
+        :param address: string HOST:PORT the coordinator listens on
+        :param plan: runtime before reference solving serialized by dump_runtime, downloaded by the workers
+        :return: void
+        """
+        settings = get_value_or_default(self.environment, 'distributed', {})
+        remaining_scenarios = {}
+        leased_scenarios = []
+
+        def scenario_done(feature):
+            remaining_scenarios[feature] -= 1
+            if remaining_scenarios[feature] == 0:
+                self.finish_feature(feature, self.runtime[feature])
+
+        def apply_outcome(feature, scenario, outcome):
+            scenario_obj = self.runtime[feature]['scenarios'][scenario]
+            if outcome is None:
+                scenario_obj['status'] = ExecutionStatus.FAILED
+                for step in scenario_obj['steps']:
+                    if step['status'] == ExecutionStatus.PENDING_EXECUTION:
+                        step['status'] = ExecutionStatus.FAILED
+                        step['details'] = 'Scenario was lost by every worker it was leased to'
+                        break
+            else:
+                RunState.apply_outcome(outcome, scenario_obj)
+            for step in scenario_obj['steps']:
+                self.reporters.emit('step', feature=feature, scenario=scenario, **self.step_event(step))
+            self.reporters.emit('scenario', **self.scenario_event(feature, scenario, scenario_obj))
+            scenario_done(feature)
+            if self.failure_budget.record(feature, scenario_obj):
+                coordinator.withdraw()
+
+        def cancel_withdrawn(feature, scenario):
+            self.cancel_scenario(feature, scenario, self.runtime[feature]['scenarios'][scenario])
+            scenario_done(feature)
+
+        selected_features = []
+        for feature in features:
+            if feature in self.runtime:
+                self.runtime[feature]['status'] = ExecutionStatus.RUNNING
+                remaining_scenarios[feature] = len(self.runtime[feature]['scenarios']) + 1
+                selected_features.append(feature)
+            else:
+                self.logger.error('Requested feature "%s" was not present on test files' % feature)
+        for feature in selected_features:
+            for scenario, scenario_obj in self.runtime[feature]['scenarios'].items():
+                if scenario_obj['status'] == ExecutionStatus.SKIPPED or scenario_obj.get('restored', False):
+                    self.run_scenario(feature, scenario, scenario_obj)
+                    scenario_done(feature)
                 else:
-                    scenarios['failed'] += 1
-                    print("\t[{status}] - Scenario: {name}".format(
-                        status=display_names.get(scenario_value['status'], 'FAILED'),
-                        name=scenario_name
-                    ))
-                    print("\t\tSteps:")
-                    for step in scenario_value['steps']:
-                        steps['total'] += 1
-                        if step['status'] == ExecutionStatus.PASSED:
-                            steps['passed'] += 1
-                            print("\t\t[{status}][{elapsed} ms] - {name}".format(
-                                status=display_names.get(step['status'], 'FAILED'),
-                                elapsed=round(step['details'], 2),
-                                name=' '.join([step['verb'], step['name']])
-                            ))
-                        elif step['status'] == ExecutionStatus.SKIPPED:
-                            steps['skipped'] += 1
-                            print("\t\t[{status}] - {name}".format(
-                                status=display_names.get(step['status'], 'FAILED'),
-                                name=' '.join([step['verb'], step['name']])
-                            ))
-                        else:
-                            steps['failed'] += 1
-                            print("\t\t[{status}] - {name}. Exception details:\n{exception}".format(
-                                status=display_names.get(step['status'], 'FAILED'),
-                                name=' '.join([step['verb'], step['name']]),
-                                exception=step['details'] if step['details'] is not None else step['status']
-                            ))
-        print("\nResults summary:")
-        print("Features:\n%d detected\n\t%d passed\n\t%d failed"
-              % (features['total'], features['passed'], features['failed']))
+                    leased_scenarios.append((feature, scenario))
+            scenario_done(feature)
 
-        print("Scenarios:\n%d detected\n\t%d passed\n\t%d skipped\n\t%d failed"
-              % (scenarios['total'], scenarios['passed'], scenarios['skipped'], scenarios['failed']))
+        host, port = address.rsplit(':', 1)
+        coordinator = Coordinator((host, int(port)), plan, self.history.longest_first(self.runtime, leased_scenarios),
+                                  apply_outcome,
+                                  get_value_or_default(settings, 'lease_timeout', DEFAULT_LEASE_TIMEOUT),
+                                  get_value_or_default(settings, 'max_attempts', DEFAULT_MAX_ATTEMPTS),
+                                  admits=lambda item: self.failure_budget.allows(item[0]),
+                                  on_withdrawn=cancel_withdrawn)
+        coordinator.serve()
 
-    def run(self, features=None):
-        """Opens all the detected files and handles the execution by calling other modules
+    def work(self, url, browser_profile=None):
+        """Runs as a worker of a coordinator: downloads its plan and executes the leased scenarios
+        Step and factory modules are loaded from this machine's environment
 
-        :param features: array of strings specifying which features should run
-        :default features: None (executes everything)
+        :param url: base URL of the coordinator (e.g. http://127.0.0.1:8765)
+        :param browser_profile: name of the browser profile of this worker, None uses environment.json
         :return: void
         """
+        self.browser_profiles = self.load_browser_profiles(browser_profile)
+        self.load_modules()
+        worker = Worker(url)
+        self.runtime = worker.fetch_plan()
+        self.registry = StepRegistry(self.loaded_steps, self.loaded_factories)
+        Feature.solve_references(self.runtime, self.registry)
+
+        def run_leased(feature, scenario):
+            scenario_obj = self.runtime[feature]['scenarios'][scenario]
+            if scenario_obj['status'] != ExecutionStatus.PENDING:
+                # Leased again after its lease expired on the coordinator
+                scenario_obj['status'] = ExecutionStatus.PENDING
+                for step in scenario_obj['steps']:
+                    if step['status'] != ExecutionStatus.MISSING_REF:
+                        step['status'] = ExecutionStatus.PENDING_EXECUTION
+                        step['details'] = None
+            selenium_runtime.prepare(feature, self.browser_profiles.for_feature(feature))
+            self.run_scenario(feature, scenario, scenario_obj)
+            return RunState.scenario_outcome(scenario_obj)
+
+        self.logger.info("Worker %s pulling scenarios from %s" % (worker.worker_id, url))
+        executed = worker.serve(run_leased)
+        self.gather_runtime_stats(selenium_runtime.current())
+        self.logger.info("Worker finished after executing %d scenarios" % executed)
+
+    def module_files(self, features=None):
+        """Lists the step and factory files the given features resolve to: their own modules and the common ones
+
+        :param features: array of feature names, None selects every detected file
+        :return: tuple (list of step files, list of factory files)
+        """
+        if features is None:
+            return self.filenames['steps'], self.filenames['factories']
+        module_names = {'common_steps', 'common_factories'}
+        for feature in features:
+            module_key = StepRegistry.feature_module_key(feature)
+            module_names.update((module_key + '_steps', module_key + '_factories'))
+        return ([step for step in self.filenames['steps'] if extract_module_name(step) in module_names],
+                [factory for factory in self.filenames['factories'] if extract_module_name(factory) in module_names])
+
+    def load_modules(self, features=None):
+        """Imports the step and factory modules detected by find_files
+
+        :param features: array of feature names, only their modules (and the common ones) are imported
+        :default features: None (imports every module)
+        :return: void
+        """
+        step_files, factory_files = self.module_files(features)
+
         # Loading all steps
         self.logger.info("Loading step definitions...")
         sys.path.append(self.environment['paths']['steps_path'])
 
-        for step in self.filenames['steps']:
+        for step in step_files:
             module_name = extract_module_name(step)
             self.logger.info("Loading module %s..." % module_name)
             try:
@@ -230,7 +846,7 @@ class ExecutionService:
         self.logger.info("Loading factories definitions...")
         sys.path.append(self.environment['paths']['factories_path'])
 
-        for factory in self.filenames['factories']:
+        for factory in factory_files:
             module_name = extract_module_name(factory)
             self.logger.info("Loading module %s ..." % module_name)
             try:
@@ -241,12 +857,431 @@ class ExecutionService:
                                     % (module_name, traceback.format_exc()))
         self.logger.info("%d factories modules loaded" % (len(self.loaded_factories)))
         self.logger.info("Modules loaded")
+
+    def index_features(self):
+        """Maps each feature name into the files declaring it, reading only their feature statements
+
+        :return: dictionary mapping feature names into lists of file paths
+        """
+        header_index = {}
+        for feature_filename in self.filenames['features']:
+            for feature in Feature.read_headers(feature_filename, self.environment, self.locale):
+                header_index.setdefault(feature, []).append(feature_filename)
+        return header_index
+
+    def feature_files(self, features=None):
+        """Lists the .feature files declaring the given features, found with the header index
+
+        :param features: array of feature names, None selects every detected file
+        :return: list of file paths, in detection order
+        """
+        if features is None:
+            return self.filenames['features']
+        header_index = self.index_features()
+        requested_files = {path for feature in features for path in header_index.get(feature, [])}
+        feature_files = [path for path in self.filenames['features'] if path in requested_files]
+        self.logger.info("Parsing %d of %d feature files" % (len(feature_files), len(self.filenames['features'])))
+        return feature_files
+
+    def mount_features(self, features=None):
+        """Parses the detected .feature files into runtime, reusing the plan cache for unchanged files
+
+        :param features: array of feature names, only the files declaring them are parsed
+        :default features: None (parses every file)
+        :return: void
+        """
         self.logger.info("Mounting dependencies...")
+        feature_files = self.feature_files(features)
+        cache_path = get_value_or_default(self.environment['paths'], 'cache_path', '.bdd_cache/')
+        plan_cache = None if cache_path is None else PlanCache(cache_path, self.environment['language'],
+                                                               self.environment['tab_size'])
+
+        cached = {feature_filename: (None, None) if plan_cache is None else plan_cache.load(feature_filename)
+                  for feature_filename in feature_files}
+        parsed = self.parse_in_pool([feature_filename for feature_filename in feature_files
+                                     if cached[feature_filename][0] is None])
+
+        # Merging in file order, thus duplicated features and scenarios are reported as in a sequential parse
+        # Files parsed with warnings are never cached, otherwise later runs would load them without the warnings
+        cacheable = plan_cache is not None and self.logger.isEnabledFor(logging.WARNING)
+        for feature_filename in feature_files:
+            features, entry_path = cached[feature_filename]
+            if features is None:
+                if feature_filename in parsed:
+                    features, status, records = parsed[feature_filename]
+                    features = load_runtime(features)
+                    for record in records:
+                        self.logger.handle(record)
+                else:
+                    collector = RecordCollector()
+                    collector.setLevel(logging.WARNING)
+                    self.logger.addHandler(collector)
+                    try:
+                        feature = Feature(feature_filename, self.environment, self.locale)
+                    finally:
+                        self.logger.removeHandler(collector)
+                    features, status, records = feature.features, feature.status, collector.records
+                if cacheable and status == ErrorCodes.OK and \
+                        not any(record.levelno >= logging.WARNING for record in records):
+                    plan_cache.store(entry_path, features)
+            else:
+                self.logger.info("Loaded %s from plan cache" % feature_filename)
+            Feature.merge_features(features, self.runtime)
+
+    def parse_in_pool(self, file_paths):
+        """Parses files in a process pool, when there are enough of them to pay for starting it
+        Each file is parsed into a standalone dictionary, serialized by dump_runtime, the log records of the workers
+        are returned for replay
+
+        :param file_paths: list of .feature files to parse
+        :return: dictionary mapping each file path into (serialized features, ErrorCodes status, log records),
+            empty when the files should be parsed sequentially
+        """
+        parse_workers = get_value_or_default(self.environment, 'parse_workers', os.cpu_count() or 1)
+        if parse_workers < 2 or len(file_paths) < PARALLEL_PARSE_THRESHOLD:
+            return {}
+
+        self.logger.info("Parsing %d feature files with %d processes..." % (len(file_paths), parse_workers))
+        chunk_size = max(1, len(file_paths) // (parse_workers * 4))
+        with ProcessPoolExecutor(parse_workers, initializer=init_parse_worker,
+                                 initargs=(self.logger.getEffectiveLevel(),)) as executor:
+            results = executor.map(parse_feature_file, file_paths, [self.environment] * len(file_paths),
+                                   [self.locale] * len(file_paths), chunksize=chunk_size)
+            return dict(zip(file_paths, results))
+
+    def load_compiled_plan(self, plan_path):
+        """Loads runtime from a plan written by compile_plan, no .feature file is parsed
+
+        :param plan_path: address of the plan file
+        :return: void
+        """
+        self.logger.info("Loading compiled plan %s..." % plan_path)
+        plan = load_plan(plan_path)
+        if plan['version'] != VERSION:
+            self.logger.warning("Plan %s was compiled by version %s" % (plan_path, plan['version']))
+        if plan['language'] != self.environment['language'] or plan['tab_size'] != self.environment['tab_size']:
+            self.logger.warning("Plan %s was compiled with language %s and tab size %d"
+                                % (plan_path, plan['language'], plan['tab_size']))
+        self.runtime = plan['runtime']
+
+    def dry_run(self, features=None, record_calls=False):
+        """Validates the features without launching a browser: parses every file, solves the references and checks the
+        arguments of each step, then prints every problem found. No SeleniumRuntime is ever created
+
+        :param features: array of feature names, None validates every detected file
+        :param record_calls: runs the steps against a NullRuntime and prints the browser calls each one would make
+        :return: amount of problems found
+        """
+        self.load_modules(features)
+
+        # Parse messages are collected by file, the parser stops at the first structural error of a file
+        problems = []
+        warnings = []
+        declared_in = {}
+        collector = RecordCollector()
+        collector.setLevel(logging.WARNING)
+        self.logger.addHandler(collector)
+        try:
+            for feature_filename in self.feature_files(features):
+                collector.records = []
+                feature = Feature(feature_filename, self.environment, self.locale)
+                Feature.merge_features(feature.features, self.runtime)
+                for feature_name in feature.features:
+                    declared_in.setdefault(feature_name, feature_filename)
+                for record in collector.records:
+                    message = '{file}: {message}'.format(file=feature_filename, message=record.getMessage())
+                    (problems if record.levelno >= logging.ERROR else warnings).append(message)
+                if feature.status != ErrorCodes.OK and not len(collector.records):
+                    problems.append('{file}: {status}'.format(file=feature_filename, status=feature.status.name))
+        finally:
+            self.logger.removeHandler(collector)
+
+        self.registry = StepRegistry(self.loaded_steps, self.loaded_factories)
+        Feature.solve_references(self.runtime, self.registry)
+        for (class_name, method_name), locations in self.registry.ambiguous_steps().items():
+            warnings.append("Step %s.%s is declared more than once: %s"
+                            % (class_name, method_name, ', '.join(locations)))
+
+        null_runtime = NullRuntime(SeleniumRuntime) if record_calls else None
+        if record_calls:
+            selenium_runtime.bind(null_runtime)
+        step_count = 0
+        try:
+            for feature_name, feature_obj in self.runtime.items():
+                if features is not None and feature_name not in features:
+                    continue
+                if record_calls:
+                    print("Feature {name} ({file})".format(name=feature_name, file=declared_in.get(feature_name)))
+                for scenario_name, scenario_obj in feature_obj['scenarios'].items():
+                    if record_calls:
+                        print("\tScenario: %s" % scenario_name)
+                    for step in scenario_obj['steps']:
+                        step_count += 1
+                        location = '{file}: {feature} / {scenario} / {verb} {name}'.format(
+                            file=declared_in.get(feature_name), feature=feature_name, scenario=scenario_name,
+                            verb=step['verb'], name=step['name'])
+                        if step['status'] == ExecutionStatus.MISSING_REF:
+                            problems.append(location + ': undefined, expected {definition} in {module} or {common}'
+                                            .format(**self.expected_definition(feature_name, step)))
+                            continue
+                        if step['status'] != ExecutionStatus.PENDING_EXECUTION:
+                            continue
+                        step_ref = getattr(step['ref'], 'run_method', step['ref'])
+                        mismatch = signature_problem(step_ref, step['args'])
+                        if mismatch is not None:
+                            problems.append('{location}: {mismatch}'.format(location=location, mismatch=mismatch))
+                        elif record_calls:
+                            self.record_step_calls(null_runtime, step, step_ref, location, problems)
+        finally:
+            if record_calls:
+                selenium_runtime.unbind()
+
+        print("\nDry run summary:\n%d feature files\n%d features\n%d steps\n%d warnings\n%d problems"
+              % (len(declared_in), len(self.runtime), step_count, len(warnings), len(problems)))
+        for warning in warnings:
+            print("[WARNING] %s" % warning)
+        for problem in problems:
+            print("[PROBLEM] %s" % problem)
+        return len(problems)
+
+    @staticmethod
+    def record_step_calls(null_runtime, step, step_ref, location, problems):
+        """Runs a step against a NullRuntime and prints the browser calls it made
+        Only calls to runtime methods that do not exist are problems, assertions may fail on null values
+
+        :param null_runtime: NullRuntime bound to the calling thread
+        :param step: step dictionary inside runtime (read-only)
+        :param step_ref: reference to call (run method of cached factories)
+        :param location: description of the step used in problem messages
+        :param problems: list of problem messages (modified by reference)
+        :return: void
+        """
+        print("\t\t%s %s" % (step['verb'], step['name']))
+        try:
+            step_ref(*step['args'])
+        except AttributeError as error:
+            problems.append('{location}: {error}'.format(location=location, error=error))
+        except Exception as error:
+            null_runtime.calls.append('stopped by %s: %s' % (type(error).__name__, error))
+        for call in null_runtime.take_calls():
+            print("\t\t\t%s" % call)
+
+    def expected_definition(self, feature_name, step):
+        """Describes where an undefined step or factory should be written
+
+        :param feature_name: name of the feature using the step
+        :param step: step dictionary inside runtime (read-only)
+        :return: dictionary with definition, module and common
+        """
+        module_key = self.registry.module_key(feature_name)
+        if step['verb'] == 'factory':
+            return {'definition': 'class ' + step['method_name'], 'module': module_key + '_factories',
+                    'common': 'common_factories'}
+        return {'definition': '{verb}.{method}'.format(verb=step['verb'].capitalize(), method=step['method_name']),
+                'module': module_key + '_steps', 'common': 'common_steps'}
+
+    def compile_plan(self, plan_path):
+        """Parses every detected .feature file and writes the resulting execution plan
+
+        :param plan_path: destination path
+        :return: void
+        """
+        self.mount_features()
+        dump_plan(plan_path, self.runtime, self.environment)
+        self.logger.info("Execution plan with %d features written to %s" % (len(self.runtime), plan_path))
+
+    def select_failed(self, features):
+        """Restores the outcome of the scenarios that passed in the previous runs, so only the failed ones execute
+        Factory steps are part of their scenario, thus they run again along with it
+
+        :param features: array of strings specifying which features are eligible, None selects every recorded one
+        :return: list of feature names holding restored or failed scenarios
+        """
+        selected = []
+        rerun_count = 0
+        for feature in self.state.features if features is None else features:
+            if feature not in self.runtime:
+                self.logger.warning('Feature "%s" of the previous run is not present on test files' % feature)
+                continue
+            if feature not in self.state.features:
+                self.logger.info('Feature "%s" has no recorded outcome. Ignoring...' % feature)
+                continue
+
+            failed = self.state.failed_scenarios(feature)
+            for scenario, scenario_obj in self.runtime[feature]['scenarios'].items():
+                if scenario in failed:
+                    rerun_count += 1
+                elif not self.state.restore(feature, scenario, scenario_obj):
+                    self.logger.info('Scenario "%s" changed since the previous run. Running it again...' % scenario)
+                    rerun_count += 1
+            selected.append(feature)
+        self.logger.info("Rerunning %d scenarios of %d features" % (rerun_count, len(selected)))
+        return selected
+
+    def select_changed(self, features, snapshot_path):
+        """Selects the scenarios changed since a dependency index snapshot, either by their own text or by the code
+        of the step and factory modules they resolve to. Unchanged scenarios keep the outcome of the previous runs
+        (or are skipped if there is none) and features without changed scenarios do not run at all
+
+        :param features: array of strings specifying which features are eligible, None selects every one
+        :param snapshot_path: address of the dependency index of a previous run
+        :return: list of feature names holding changed scenarios
+        """
+        previous = DependencyIndex.load(snapshot_path)
+        if previous is None:
+            self.logger.warning("Running every requested scenario, changes can't be detected without a snapshot")
+            return list(self.runtime) if features is None else features
+
+        changed = self.dependency_index.changed_scenarios(previous)
+        selected = []
+        changed_count = 0
+        for feature in self.runtime if features is None else features:
+            if feature not in self.runtime:
+                selected.append(feature)
+                continue
+
+            scenarios = self.runtime[feature]['scenarios']
+            changed_scenarios = {scenario for scenario, scenario_obj in scenarios.items()
+                                 if scenario in changed.get(feature, ()) and not scenario_obj.get('restored', False)}
+            if not len(changed_scenarios):
+                continue
+            for scenario, scenario_obj in scenarios.items():
+                if scenario not in changed_scenarios and not scenario_obj.get('restored', False) and \
+                        not self.state.restore(feature, scenario, scenario_obj):
+                    scenario_obj['status'] = ExecutionStatus.SKIPPED
+            changed_count += len(changed_scenarios)
+            selected.append(feature)
+        self.logger.info("Running %d changed scenarios of %d features" % (changed_count, len(selected)))
+        return selected
+
+    def select_shard(self, features, shard, shard_history=None):
+        """Balances the scenarios of the requested features into shards by their estimated duration and keeps
+        only the ones of this shard in runtime. Every shard must partition the same input: a frozen history snapshot
+        (shard_history), or a timing history that no shard rewrites (sharded runs never save it)
+
+        :param features: array of strings specifying which features are eligible, None selects every one
+        :param shard: tuple (shard index starting at 1, amount of shards)
+        :param shard_history: history file the shards are balanced with, None uses the timing history of the run
+        :return: list of feature names holding scenarios of this shard
+        """
+        shard_index, shard_count = shard
+        history = self.history
+        if shard_history is not None:
+            if not os.path.isfile(shard_history):
+                self.logger.warning("Shard history %s not found, balancing the shards by step count" % shard_history)
+            history = TimingHistory.load(shard_history)
+        features = list(self.runtime) if features is None else features
+        # Sorted by name, thus the partition does not depend on the order the files were found
+        candidates = sorted((feature, scenario) for feature in features if feature in self.runtime
+                            for scenario in self.runtime[feature]['scenarios'])
+        partitions = history.partition(self.runtime, candidates, shard_count)
+        own_scenarios = set(partitions[shard_index - 1])
+
+        selected = []
+        for feature in features:
+            if feature not in self.runtime:
+                selected.append(feature)
+                continue
+            scenarios = self.runtime[feature]['scenarios']
+            for scenario in [scenario for scenario in scenarios if (feature, scenario) not in own_scenarios]:
+                del scenarios[scenario]
+            if len(scenarios):
+                selected.append(feature)
+        # Shards reporting different digests did not partition the same input
+        self.logger.info("Shard %d/%d holds %d scenarios (estimated %.2f s, partition %s)"
+                         % (shard_index, shard_count, len(own_scenarios),
+                            sum(history.estimate(feature, scenario, self.runtime[feature]['scenarios'][scenario])
+                                for feature, scenario in own_scenarios) / 1e3,
+                            hashlib.sha256(json.dumps(partitions).encode('utf8')).hexdigest()[:12]))
+        return selected
+
+    def run(self, features=None, workers=1, plan_path=None, rerun_failed=False, changed_since=None, coordinator=None,
+            shard=None, browser_profile=None, profile_path=None, max_failures=None, fail_fast=False,
+            shard_history=None):
+        """Opens all the detected files and handles the execution by calling other modules
+
+        :param features: array of strings specifying which features should run
+        :default features: None (executes everything)
+        :param workers: amount of scenarios running concurrently, each one with its own browser session
+        :default workers: 1 (sequential execution on selenium_runtime)
+        :param plan_path: compiled plan to execute instead of parsing the .feature files
+        :default plan_path: None (parses the detected files)
+        :param rerun_failed: runs only the scenarios that failed in the previous runs, merging their results
+        :default rerun_failed: False (runs every scenario of the requested features)
+        :param changed_since: dependency index snapshot, runs only the scenarios changed since it was written
+        :default changed_since: None (runs every scenario of the requested features)
+        :param coordinator: string HOST:PORT, leases the scenarios to remote workers (see work) instead of running them
+        :default coordinator: None (runs the scenarios in this process)
+        :param shard: tuple (shard index starting at 1, amount of shards), runs only the scenarios of that shard
+        :default shard: None (runs every scenario of the requested features)
+        :param browser_profile: name of the browser profile of the run, features listed in feature_profiles
+            of environment.json keep their own profile
+        :default browser_profile: None (browser_profile of environment.json, or the default browser settings)
+        :param profile_path: path prefix of the profile files ({profile_path}.folded and {profile_path}.txt)
+        :default profile_path: None (the run is not profiled)
+        :param max_failures: failed scenarios tolerated, the scenarios not started yet are cancelled after them
+        :default max_failures: None (max_failures of environment.json, or no limit)
+        :param fail_fast: cancels the scenarios not started yet of every feature with a failed scenario
+        :default fail_fast: False (only the features listed in fail_fast_features of environment.json)
+        :param shard_history: timing history snapshot the shards are balanced with, shared by every shard
+        :default shard_history: None (the timing history of the run, which sharded runs read but never write)
+        :return: void
+        """
+        self.browser_profiles = self.load_browser_profiles(browser_profile)
+        self.failure_budget = self.load_failure_budget(max_failures, fail_fast)
+        self.reporters = ReporterPipeline.from_environment(self.environment)
+        self.profiler = RunProfiler.from_environment(self.environment, profile_path)
+        self.profiler.start(SeleniumRuntime)
+        try:
+            self.execute(features, workers, plan_path, rerun_failed, changed_since, coordinator, shard, shard_history)
+        finally:
+            self.profiler.stop(SeleniumRuntime)
+            self.reporters.close()
+        self.profiler.report(self.runtime)
+
+    def execute(self, features, workers, plan_path, rerun_failed, changed_since, coordinator, shard, shard_history):
+        """Loads modules, mounts the dependency tree, runs the requested features and displays the results
+
+        :param features: array of strings specifying which features should run, None executes everything
+        :param workers: amount of scenarios running concurrently
+        :param plan_path: compiled plan to execute instead of parsing the .feature files, may be None
+        :param rerun_failed: runs only the scenarios that failed in the previous runs
+        :param changed_since: dependency index snapshot, runs only the scenarios changed since it, may be None
+        :param coordinator: string HOST:PORT the scenarios are leased on, None runs them in this process
+        :param shard: tuple (shard index starting at 1, amount of shards), None runs every scenario
+        :param shard_history: history file the shards are balanced with, None uses the timing history of the run
+        :return: void
+        """
+        # A feature subset is resolved with the header index, thus only its files are parsed and its modules imported
+        subset = features if plan_path is None else None
+        with self.profiler.phase('import'):
+            self.load_modules(subset)
 
         # Mounting dependencies
-        for feature_filename in self.filenames['features']:
-            Feature(feature_filename, self.loaded_steps, self.loaded_factories,
-                    self.environment, self.locale, self.runtime)
+        with self.profiler.phase('parse'):
+            if plan_path is None:
+                self.mount_features(subset)
+            else:
+                self.load_compiled_plan(plan_path)
+            plan = None if coordinator is None else dump_runtime(self.runtime)
+        with self.profiler.phase('resolve'):
+            self.registry = StepRegistry(self.loaded_steps, self.loaded_factories)
+            Feature.solve_references(self.runtime, self.registry)
+            self.registry.report()
+        with self.profiler.phase('select'):
+            self.state = RunState.load(get_value_or_default(self.environment['paths'], 'state_path',
+                                                            '.bdd_state.json'))
+            self.history = TimingHistory.load(get_value_or_default(self.environment['paths'], 'history_path',
+                                                                   '.bdd_history.json'))
+            index_path = get_value_or_default(self.environment['paths'], 'index_path', '.bdd_index.json')
+            step_files, factory_files = self.module_files(subset)
+            self.dependency_index = DependencyIndex.build(self.runtime, step_files + factory_files)
+            if rerun_failed:
+                features = self.select_failed(features)
+            if changed_since is not None:
+                features = self.select_changed(features, changed_since)
+            if shard is not None:
+                features = self.select_shard(features, shard, shard_history)
 
         self.logger.info("Dependency tree complete... Will init execution\n\n")
         self.logger.info("Execution started. Requested features: {features}"
@@ -254,41 +1289,42 @@ class ExecutionService:
 
         # Actually executing the tests
         features = self.runtime.keys() if features is None else features
-        for feature in features:
-            if feature in self.runtime:
-                feature_obj = self.runtime[feature]
-                feature_obj['status'] = ExecutionStatus.RUNNING
-                for scenario in feature_obj['scenarios'].keys():
-                    scenario_obj = self.runtime[feature]['scenarios'][scenario]
-                    if scenario_obj['status'] != ExecutionStatus.SKIPPED:
-                        scenario_obj['status'] = ExecutionStatus.RUNNING
-                        for step in scenario_obj['steps']:
-                            if step['status'] == ExecutionStatus.PENDING_EXECUTION:
-                                step['status'] = ExecutionStatus.RUNNING
-                                step_method = step['ref']
-                                step_args = step['args']
-                                try:
-                                    step_start = datetime.now()
-                                    step_method(*step_args)
-                                    step['status'] = ExecutionStatus.PASSED
-                                    step['details'] = (datetime.now() - step_start).microseconds / 1e3
-                                    scenario_obj['exec_time'] += step['details']
-                                except:
-                                    step['status'] = ExecutionStatus.FAILED
-                                    scenario_obj['status'] = ExecutionStatus.FAILED
-                                    feature_obj['status'] = ExecutionStatus.FAILED
-                                    step['details'] = traceback.format_exc()
-                            else:
-                                scenario_obj['status'] = step['status']
-                                feature_obj['status'] = step['status']
-                        if scenario_obj['status'] == ExecutionStatus.RUNNING:
-                            scenario_obj['status'] = ExecutionStatus.PASSED
-                            feature_obj['exec_time'] += scenario_obj['exec_time']
+        self.reporters.emit('run', features=len(features), scenarios=sum(
+            len(self.runtime[feature]['scenarios']) for feature in features if feature in self.runtime))
+        with self.profiler.phase('execute'):
+            if coordinator is not None:
+                self.run_distributed(features, coordinator, plan)
+            elif get_value_or_default(self.environment, 'backend', 'selenium') == 'async':
+                self.run_async(features, workers)
+            elif workers > 1:
+                self.run_parallel(features, workers)
+            else:
+                for feature in features:
+                    if feature in self.runtime:
+                        feature_obj = self.runtime[feature]
+                        feature_obj['status'] = ExecutionStatus.RUNNING
+                        for scenario, scenario_obj in feature_obj['scenarios'].items():
+                            # Prepared per scenario, thus a browser that died mid-feature is relaunched
+                            if not scenario_obj.get('restored', False) and self.failure_budget.allows(feature):
+                                selenium_runtime.prepare(feature, self.browser_profiles.for_feature(feature))
+                            self.run_scenario(feature, scenario, scenario_obj)
+                        self.finish_feature(feature, feature_obj)
                     else:
-                        feature_obj['status'] = ExecutionStatus.SKIPPED
-                if feature_obj['status'] == ExecutionStatus.RUNNING:
-                    feature_obj['status'] = ExecutionStatus.PASSED
-
+                        self.logger.error('Requested feature "%s" was not present on test files' % feature)
+                self.gather_runtime_stats(selenium_runtime.current())
+        # Reporters (and the progress display) finish before the results are printed
+        self.reporters.close()
+        with self.profiler.phase('report'):
+            self.display_results(features)
+            self.state.save()
+            # Other shards may still be partitioning on the history, thus only unsharded runs rewrite it
+            if shard is None:
+                self.history.update(self.runtime, features)
+                self.history.save()
             else:
-                self.logger.error('Requested feature "%s" was not present on test files' % feature)
-        self.display_results(features)
+                self.logger.info("Timing history is not updated by sharded runs")
+            if subset is not None and os.path.isfile(index_path):
+                previous_index = DependencyIndex.load(index_path)
+                if previous_index is not None:
+                    self.dependency_index.merge(previous_index)
+            self.dependency_index.save(index_path)
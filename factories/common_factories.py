@@ -3,6 +3,8 @@ from steps.common_steps import base_url
 
 
 class AsAnAuthenticatedUser:
+    cacheable = True
+    snapshot_ttl = 600
 
     @staticmethod
     def run():
@@ -10,3 +12,8 @@ class AsAnAuthenticatedUser:
         browser.fill_form({"Email": "hugo.fonseca@grupoorion.eng.br", "Password": "123456789"})
         browser.submit_form()
         pass
+
+    @staticmethod
+    def capture_after():
+        browser.wait_for_url_change(base_url + "/Auth/Login")
+        browser.wait_for_network_idle()
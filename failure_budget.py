@@ -0,0 +1,88 @@
+"""BDD-Selenium - failure_budget.py
+This file contains the failure budget of a run (--max-failures and --fail-fast)
+Once the budget is used up, the scenarios still queued are cancelled instead of waiting on a broken application
+"""
+
+import logging
+import threading
+
+from utils import *
+
+""" Scenario statuses counted as failures by the budget """
+FAILURE_STATUSES = (ExecutionStatus.FAILED, ExecutionStatus.MISSING_REF)
+
+
+class FailureBudget:
+    """
+    Failure Budget
+    This class counts the failed scenarios of a run and decides whether a queued scenario may still start
+    A run stops starting scenarios after max_failures failed ones, a fail-fast feature stops after its first one
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        max_failures: failed scenarios tolerated by the run, None tolerates any amount
+        fail_fast: True stops every feature at its first failed scenario
+        fail_fast_features: set of feature names that stop at their first failed scenario
+        failures: amount of failed scenarios so far
+        failed_features: set of fail-fast features that already failed
+        lock: mutex guarding the counters against concurrent workers
+    """
+
+    def __init__(self, max_failures=None, fail_fast=False, fail_fast_features=()):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.max_failures = max_failures
+        self.fail_fast = fail_fast
+        self.fail_fast_features = set(fail_fast_features)
+        self.failures = 0
+        self.failed_features = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_environment(environment, max_failures=None, fail_fast=False):
+        """Builds the budget of a run, the command line options take precedence over environment.json
+        (max_failures, fail_fast and fail_fast_features)
+
+        :param environment: dictionary with environment variables (read-only)
+        :param max_failures: failed scenarios tolerated by the run, None uses environment.json
+        :param fail_fast: True stops every feature at its first failed scenario
+        :return: FailureBudget
+        """
+        if max_failures is None:
+            max_failures = get_value_or_default(environment, 'max_failures', None)
+        if max_failures is not None and max_failures < 1:
+            raise ValueError("max_failures must be at least 1, got %d" % max_failures)
+        return FailureBudget(max_failures, fail_fast or get_value_or_default(environment, 'fail_fast', False),
+                             get_value_or_default(environment, 'fail_fast_features', []))
+
+    @property
+    def exhausted(self):
+        return self.max_failures is not None and self.failures >= self.max_failures
+
+    def allows(self, feature_name):
+        """Tells whether a scenario of a feature may start
+
+        :param feature_name: name of the feature
+        :return: False once the run budget is used up or the fail-fast feature failed
+        """
+        return not self.exhausted and feature_name not in self.failed_features
+
+    def record(self, feature_name, scenario_obj):
+        """Counts a finished scenario against the budget
+
+        :param feature_name: name of the parent feature
+        :param scenario_obj: scenario dictionary inside runtime (read-only)
+        :return: True if this failure used up the budget of the run or of the feature
+        """
+        if scenario_obj['status'] not in FAILURE_STATUSES:
+            return False
+        with self.lock:
+            self.failures += 1
+            exhausted = self.failures == self.max_failures
+            if exhausted:
+                self.logger.error("%d scenarios failed. Cancelling the scenarios not started yet..." % self.failures)
+            feature_failed = (self.fail_fast or feature_name in self.fail_fast_features) and \
+                feature_name not in self.failed_features
+            if feature_failed:
+                self.failed_features.add(feature_name)
+                self.logger.error('Feature "%s" failed. Cancelling its scenarios not started yet...' % feature_name)
+            return exhausted or feature_failed
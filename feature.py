@@ -1,4 +1,6 @@
 import logging
+from lexer import Lexer
+from runtime_model import FeatureRecord, ScenarioRecord, StepRecord, dump_runtime
 from utils import *
 import re
 
@@ -12,173 +14,131 @@ class Feature:
     Attributes:
         logger: logger instance gathered from logging module, acts like a singleton
         file_content: array of strings containing the file after pre-processing
+        features: dictionary mapping each feature declared in this file into its FeatureRecord
+        status: ErrorCodes value returned by process_file
     """
 
-    def __init__(self, file_path, steps, factories, env_variables, locale, features_dict):
+    def __init__(self, file_path, env_variables, locale, file_content=None):
         """
         Class Feature constructor
+        Parses the file into a standalone dictionary of features, step references are solved later by
+        solve_references (after merging with merge_features)
 
         :param file_path: file path to feature file
-        :param steps: dictionary with loaded_steps (read-only)
-        :param factories: dictionary with loaded_factories (read-only)
         :param env_variables: dictionary with environment variables (read-only)
         :param locale: dictionary of the loaded locale (read-only)
-        :param features_dict: dictionary with the traceback of the features (modified by reference)
+        :param file_content: lines of the file already returned by pre_process_file, None reads file_path
         """
         self.logger = logging.getLogger(LOGGER_INSTANCE)
-        self.file_content = pre_process_file(file_path)
+        self.file_content = pre_process_file(file_path) if file_content is None else file_content
+        self.features = {}
 
-        self.process_file(steps, factories, env_variables, locale, features_dict)
+        self.status = self.process_file(env_variables, locale, self.features)
 
-    def process_file(self, steps, factories, env_variables, locale, features_dict):
+    def process_file(self, env_variables, locale, features_dict):
         """
         Iterates through each line of the file_content variable and takes the correct action
 
-        :param steps: dictionary with loaded_steps (read-only)
-        :param factories: dictionary with loaded_factories (read-only)
         :param env_variables: dictionary with environment variables (read-only)
         :param locale: dictionary of the loaded locale (read-only)
         :param features_dict: dictionary with the traceback of the features (modified by reference)
-        :return: void
+        :return: ErrorCodes.OK if the whole file was processed, the error code that interrupted it otherwise
         """
         current_feature = ""
         current_scenario = ""
         current_skipped = ""
+        tab_size = env_variables['tab_size']
+        lexer = Lexer.for_locale(env_variables['language'], locale)
 
-        for line in self.file_content:
-            statement_match = re.match(RegularExpressions.regexps['statement'], line, re.IGNORECASE | re.MULTILINE)
-            verb_match = re.match(RegularExpressions.regexps['verb'], line, re.IGNORECASE | re.MULTILINE)
-            table_match = re.match(RegularExpressions.regexps['table'], line, re.IGNORECASE | re.MULTILINE)
-
-            if statement_match:
-                groups = statement_match.groups()
-                indentation = len(groups[0])
-                statement = groups[1]
-                name = groups[2]
-
-                try:
-                    localized_statement = locale['statements'][statement.lower()]
-                    if localized_statement == 'feature':
-                        if check_indentation((indentation, env_variables['tab_size'], 0)):
-                            self.logger.info("New feature %s detected. Processing..." % name)
-                            current_feature = self.process_feature(name, features_dict)
-                        else:
-                            self.logger.error("Unexpected indent at statement:\n\t%s\n\u2191\u2191\u2191\u2191" % line)
-                            return ErrorCodes.SYNTAX_ERROR
-
-                    elif localized_statement == 'scenario':
-                        if len(current_feature):
-                            if check_indentation((indentation, env_variables['tab_size'], 1)):
-                                self.logger.info("New scenario %s detected for feature %s" % (name, current_feature))
-                                current_scenario = self.process_scenario(name, features_dict, current_feature)
-                            else:
-                                self.logger.error("Unexpected indent at statement:\n\t%s\n\u2191\u2191\u2191\u2191"
-                                                  % line)
-                                return ErrorCodes.SEMANTIC_ERROR
-                        else:
-                            self.logger.error("Scenario statement (%s) without a previous Feature" % line)
-
-                    elif localized_statement == 'factory':
-                        if len(current_scenario):
-                            if check_indentation((indentation, env_variables['tab_size'], 2)):
-                                self.logger.info('New reference to factory "%s" detected (below scenario %s)...'
-                                                 ' Solving pending' % (name, current_scenario))
-                                scenario_steps = features_dict[current_feature]['scenarios'][current_scenario]['steps']
-                                factory_class_name = Feature.generate_factory_name(name)
-
-                                try:
-                                    factory_ref = Feature.get_factory_ref(factory_class_name, factories,
-                                                                          current_feature)
-                                    self.logger.info("Factory %s reference found." % name)
-                                    scenario_steps.append({
-                                        'name': name,
-                                        'args': [],
-                                        'status': ExecutionStatus.PENDING_EXECUTION,
-                                        'ref': factory_ref,
-                                        'details': None,
-                                        'method_name': factory_class_name,
-                                        'verb': 'factory'
-                                    })
-
-                                except (AttributeError, KeyError):
-                                    self.logger.error("Could not solve reference to %s factory..." % name)
-                                    scenario_steps.append({
-                                        'name': name,
-                                        'args': [],
-                                        'status': ExecutionStatus.MISSING_REF,
-                                        'ref': None,
-                                        'details': None,
-                                        'method_name': factory_class_name,
-                                        'verb': 'factory'
-                                    })
-                            else:
-                                self.logger.error("Unexpected indent at statement:\n\t%s\n\u2191\u2191\u2191\u2191"
-                                                  % line)
-                        else:
-                            self.logger.error("Factory statement (%s) without a previous Scenario" % line)
+        for token in lexer.tokenize(self.file_content):
+            kind = token.kind
+            indentation = token.indentation
+            line = token.line
 
-                    else:
-                        self.logger.critical(
-                            'Unknown translation "%s" for statement %s' % (localized_statement, statement))
-                        return ErrorCodes.UNKNOWN_TRANSLATION
+            if kind == TokenKind.STATEMENT:
+                statement = token.word
+                name = token.text
+                localized_statement = token.keyword
 
-                except KeyError:
+                if localized_statement is None:
                     self.logger.critical('Missing translation for "%s". Locale: %s', statement, env_variables['language'])
                     return ErrorCodes.MISSING_TRANSLATION
 
-            elif verb_match:
-                groups = verb_match.groups()
-                indentation = len(groups[0])
-                verb = groups[1].lower()
-                step_name = groups[2]
-
-                if Feature.is_verb(locale, verb):
-                    verb = locale['verbs'][verb]
-                    if check_indentation((indentation, env_variables['tab_size'], 2)):
-                        scenario = features_dict[current_feature]['scenarios'][current_scenario]
-
-                        if verb == 'do':
-                            cmd = step_name.lower()
-                            if cmd == 'skip':
-                                self.logger.info("Skipping %s scenario (below feature: %s)"
-                                                 % (current_scenario, current_feature))
-                                current_skipped = current_scenario
-                                scenario['status'] = ExecutionStatus.SKIPPED
-
-                        if current_skipped != current_scenario:
-                            step_attr = Feature.process_step_name(step_name)
-
-                            try:
-                                step_ref = self.get_step_ref(current_feature, steps, locale['verbs'][verb],
-                                                             step_attr['method_name'])
-                                step_attr['ref'] = step_ref
-                                step_attr['status'] = ExecutionStatus.PENDING_EXECUTION
-                            except (AttributeError, KeyError):
-                                self.logger.warning("Undefined step (below feature %s): %s"
-                                                    % (current_feature, step_name))
-                                step_attr['status'] = ExecutionStatus.MISSING_REF
-
-                            finally:
-                                step_attr['verb'] = locale['verbs'][verb]
-                                scenario['steps'].append(step_attr)
-
+                elif localized_statement == 'feature':
+                    if check_indentation((indentation, tab_size, 0)):
+                        self.logger.info("New feature %s detected. Processing..." % name)
+                        current_feature = self.process_feature(name, features_dict)
                     else:
-                        self.logger.error("Unexpected indent at verb:\n\t%s\n\u2191\u2191\u2191\u2191" % line)
+                        self.logger.error("Unexpected indent at statement:\n\t%s\n\u2191\u2191\u2191\u2191" % line)
                         return ErrorCodes.SYNTAX_ERROR
 
-                else:
-                    if check_indentation((indentation, env_variables['tab_size'], 1)):
-                        self.update_feature_desc(verb, step_name, features_dict, current_feature)
+                elif localized_statement == 'scenario':
+                    if len(current_feature):
+                        if check_indentation((indentation, tab_size, 1)):
+                            self.logger.debug("New scenario %s detected for feature %s" % (name, current_feature))
+                            current_scenario = self.process_scenario(name, features_dict, current_feature)
+                        else:
+                            self.logger.error("Unexpected indent at statement:\n\t%s\n\u2191\u2191\u2191\u2191"
+                                              % line)
+                            return ErrorCodes.SEMANTIC_ERROR
                     else:
-                        self.logger.error("Unexpected indent at description:\n\t%s\n\u2191\u2191\u2191\u2191" % line)
-                        return ErrorCodes.SYNTAX_ERROR
-            elif table_match:
+                        self.logger.error("Scenario statement (%s) without a previous Feature" % line)
+
+                elif localized_statement == 'factory':
+                    if len(current_scenario):
+                        if check_indentation((indentation, tab_size, 2)):
+                            self.logger.debug('New reference to factory "%s" detected (below scenario %s)...'
+                                             ' Solving pending' % (name, current_scenario))
+                            scenario_steps = features_dict[current_feature]['scenarios'][current_scenario]['steps']
+                            scenario_steps.append(StepRecord(name, [], Feature.generate_factory_name(name),
+                                                             'factory'))
+                        else:
+                            self.logger.error("Unexpected indent at statement:\n\t%s\n\u2191\u2191\u2191\u2191"
+                                              % line)
+                    else:
+                        self.logger.error("Factory statement (%s) without a previous Scenario" % line)
+
+                else:
+                    self.logger.critical(
+                        'Unknown translation "%s" for statement %s' % (localized_statement, statement))
+                    return ErrorCodes.UNKNOWN_TRANSLATION
+
+            elif kind == TokenKind.VERB:
+                verb = token.keyword
+                step_name = token.text
+
+                if check_indentation((indentation, tab_size, 2)):
+                    scenario = features_dict[current_feature]['scenarios'][current_scenario]
+
+                    if verb == 'do':
+                        cmd = step_name.lower()
+                        if cmd == 'skip':
+                            self.logger.info("Skipping %s scenario (below feature: %s)"
+                                             % (current_scenario, current_feature))
+                            current_skipped = current_scenario
+                            scenario['status'] = ExecutionStatus.SKIPPED
+
+                    if current_skipped != current_scenario:
+                        step_attr = Feature.process_step_name(step_name)
+                        step_attr['verb'] = verb
+                        scenario['steps'].append(step_attr)
+
+                else:
+                    self.logger.error("Unexpected indent at verb:\n\t%s\n\u2191\u2191\u2191\u2191" % line)
+                    return ErrorCodes.SYNTAX_ERROR
+
+            elif kind == TokenKind.DESCRIPTION:
+                if check_indentation((indentation, tab_size, 1)):
+                    self.update_feature_desc(token.word.lower(), token.text, features_dict, current_feature)
+                else:
+                    self.logger.error("Unexpected indent at description:\n\t%s\n\u2191\u2191\u2191\u2191" % line)
+                    return ErrorCodes.SYNTAX_ERROR
+
+            elif kind == TokenKind.TABLE:
                 if current_skipped != current_scenario:
-                    groups = table_match.groups()
-                    indentation = len(groups[0])
-                    key = groups[1]
-                    value = groups[2]
-                    if check_indentation((indentation, env_variables['tab_size'], 3)):
+                    key = token.word
+                    value = token.text
+                    if check_indentation((indentation, tab_size, 3)):
                         steps_arr = features_dict[current_feature]['scenarios'][current_scenario]['steps']
                         last_args_arr = steps_arr[len(steps_arr)-1]['args']
                         if len(last_args_arr):
@@ -188,6 +148,8 @@ class Feature:
             else:
                 self.logger.error("Syntax error at expression %s" % line)
 
+        return ErrorCodes.OK
+
     @staticmethod
     def is_verb(locale, candidate):
         """
@@ -221,80 +183,99 @@ class Feature:
                 features_dict[parent_feature]['description'] += '\n' + line
 
     @staticmethod
-    def get_step_ref(current_feature, steps, verb, step_name):
+    def read_headers(file_path, env_variables, locale):
         """
-        Search for a step definition inside feature_steps module
-        If step is not found inside feature_steps, search inside common_steps
-        If not found inside common_steps, raise AttributeError
-
-        :param current_feature: name of feature
-        :param steps: dictionary with loaded_steps (read-only)
-        :param verb: verb of the step in .feature file
-        :param step_name: name of the step in .feature file
-        :raise AttributeError (Step undefined)
-        :raise KeyError (Module not loaded)
-        :return: staticmethod reference pointer
+        Lists the features declared in a file by matching only its feature statements, nothing is parsed
+
+        :param file_path: file path to feature file
+        :param env_variables: dictionary with environment variables (read-only)
+        :param locale: dictionary of the loaded locale (read-only)
+        :return: list of feature names
         """
-        module_key = sub(RegularExpressions.regexps['spaces'], '_', current_feature).lower() + '_steps'
-        try:
-            di_module = steps[module_key]
-            verb_class = getattr(di_module, verb.capitalize())
-            return getattr(verb_class, step_name)
-        except (AttributeError, KeyError):
-            di_module = steps['common_steps']
-            verb_class = getattr(di_module, verb.capitalize())
-            return getattr(verb_class, step_name)
+        header_pattern = Lexer.for_locale(env_variables['language'], locale).header_pattern
+        comment_regexp = RegularExpressions.compiled['comment']
+        names = []
+        with open(file_path, 'r', encoding='utf8') as fp:
+            for line in fp:
+                match = header_pattern.match(line)
+                if match is not None:
+                    names.append(comment_regexp.sub('', match.group('name')))
+        return names
 
     @staticmethod
-    def get_factory_ref(factory_class_name, factories, parent_feature):
+    def merge_features(source_dict, features_dict):
         """
-        Search for a factory definition inside feature_factories module
-        If factory is not found inside feature_factories, search inside common_factories
-        If not found inside common_factories, raise AttributeError
-
-        :param factory_class_name: name of the factory class (Python PEP 8 standardization)
-        :param factories: dictionary with loaded_factories (read-only)
-        :param parent_feature: current feature where the factory is being used
-        :raise AttributeError (Step undefined)
-        :raise KeyError (Module not loaded)
-        :return: staticmethod reference pointer
+        Merges the features parsed from a single file into the runtime
+        A feature declared again extends the previous declaration (description lines and scenarios)
+
+        :param source_dict: dictionary of features parsed from one file (read-only)
+        :param features_dict: dictionary with the traceback of the features (modified by reference)
+        :return: void
         """
-        module_key = sub(RegularExpressions.regexps['spaces'], '_', parent_feature).lower() + '_factories'
-
-        try:
-            di_module = factories[module_key]
-            factory_class = getattr(di_module, factory_class_name)
-            run_method = getattr(factory_class, 'run')
-            return run_method
-        except (AttributeError, KeyError):
-            di_module = factories['common_factories']
-            factory_class = getattr(di_module, factory_class_name)
-            run_method = getattr(factory_class, 'run')
-            return run_method
+        for name, feature in source_dict.items():
+            if name not in features_dict:
+                features_dict[name] = feature
+                continue
+
+            logging.getLogger(LOGGER_INSTANCE).warning("Feature %s is defined in more than once" % name)
+            target = features_dict[name]
+            if feature['description'] is not None:
+                if target['description'] is None:
+                    target['description'] = feature['description']
+                else:
+                    target['description'] += '\n' + feature['description']
+            target['scenarios'].update(feature['scenarios'])
+
+    @staticmethod
+    def solve_references(features_dict, registry):
+        """
+        Solves the reference of every step pending solving, marking it as PENDING_EXECUTION or MISSING_REF
+        The name of the module defining each solved step is kept in step['module']
+
+        :param features_dict: dictionary with the traceback of the features (modified by reference)
+        :param registry: StepRegistry built from the loaded steps and factories (read-only)
+        :return: void
+        """
+        logger = logging.getLogger(LOGGER_INSTANCE)
+        for feature_name, feature in features_dict.items():
+            for scenario in feature['scenarios'].values():
+                for step in scenario['steps']:
+                    if step['status'] != ExecutionStatus.PENDING_SOLVING:
+                        continue
+
+                    if step['verb'] == 'factory':
+                        key = registry.factory_key(feature_name, step['method_name'])
+                        step['ref'] = None if key is None else registry.factories[key]
+                        if step['ref'] is None:
+                            logger.error("Could not solve reference to %s factory..." % step['name'])
+                        else:
+                            logger.debug("Factory %s reference found." % step['name'])
+                    else:
+                        key = registry.step_key(feature_name, step['verb'], step['method_name'])
+                        step['ref'] = None if key is None else registry.steps[key]
+                        if step['ref'] is None:
+                            logger.warning("Undefined step (below feature %s): %s" % (feature_name, step['name']))
+
+                    step['module'] = None if key is None else key[0]
+                    step['status'] = ExecutionStatus.MISSING_REF if step['ref'] is None \
+                        else ExecutionStatus.PENDING_EXECUTION
 
     @staticmethod
     def process_step_name(step_name):
         """
         Text processing step_name to Python PEP 8 naming conventions which should be used to write steps
         :param step_name: step name written in .feature file
-        :return: dictionary describing a 'empty' step
+        :return: StepRecord describing a 'empty' step
         """
         step_name = step_name.lstrip()
         step_name = step_name.rstrip()
-        step_dict = {
-            'name': step_name,
-            'args': re.findall(RegularExpressions.regexps['step_args'], step_name),
-            'status': ExecutionStatus.PENDING_SOLVING,
-            'ref': None,
-            'details': None
-        }
-
-        step_name = step_name.lower()
-        step_name = re.sub(RegularExpressions.regexps['step_args'], '', step_name)
-        step_name = step_name.lstrip()
-        step_name = step_name.rstrip()
-        step_dict['method_name'] = re.sub(RegularExpressions.regexps['spaces'], '_', step_name)
-        return step_dict
+        args = RegularExpressions.compiled['step_args'].findall(step_name)
+
+        method_name = step_name.lower()
+        method_name = RegularExpressions.compiled['step_args'].sub('', method_name)
+        method_name = method_name.lstrip()
+        method_name = method_name.rstrip()
+        return StepRecord(step_name, args, RegularExpressions.compiled['spaces'].sub('_', method_name))
 
     @staticmethod
     def generate_factory_name(factory_name):
@@ -310,20 +291,20 @@ class Feature:
 
     def process_feature(self, name, features_dict):
         """
-        Returns a dictionary describing an empty feature
+        Adds a FeatureRecord describing an empty feature
         :param name: name of the feature (note that an file may contain multiple features)
         :param features_dict: dictionary with the traceback of the features (modified by reference)
         :return: param: name
         """
         if name not in features_dict:
-            features_dict[name] = {'description': None, 'scenarios': {}, 'exec_time': 0, 'status': ExecutionStatus.PENDING}
+            features_dict[name] = FeatureRecord()
         else:
             self.logger.warning("Feature %s is defined in more than once" % name)
         return name
 
     def process_scenario(self, name, features_dict, parent_feature):
         """
-        Returns a dictionary describing an empty scenario
+        Adds a ScenarioRecord describing an empty scenario
 
         :param name: name of the scenario in .feature file
         :param features_dict: dictionary with the traceback of the features (modified by reference)
@@ -331,7 +312,58 @@ class Feature:
         :return: param: name
         """
         if name not in features_dict[parent_feature]:
-            features_dict[parent_feature]['scenarios'][name] = {'steps': [], 'exec_time': 0, 'status': ExecutionStatus.PENDING}
+            features_dict[parent_feature]['scenarios'][name] = ScenarioRecord()
         else:
             self.logger.warning("Scenario %s was redeclared. Ignoring redeclaration..." % name)
         return name
+
+
+class RecordCollector(logging.Handler):
+    """
+    This class keeps the log records emitted while parsing in a worker process, so the parent process replays them
+    in file order, exactly as a sequential parse would have logged them
+
+    Attributes:
+        records: list of LogRecord, with their message already formatted (picklable)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+""" Collector installed in each parsing worker process by init_parse_worker """
+parse_collector = None
+
+
+def init_parse_worker(level):
+    """Routes the logger of a parsing worker process into a RecordCollector (process pool initializer)
+
+    :param level: logging level of the parent process logger
+    :return: void
+    """
+    global parse_collector
+    parse_collector = RecordCollector()
+    logger = logging.getLogger(LOGGER_INSTANCE)
+    logger.handlers = [parse_collector]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def parse_feature_file(file_path, env_variables, locale):
+    """Parses a file inside a worker process initialized by init_parse_worker
+
+    :param file_path: file path to feature file
+    :param env_variables: dictionary with environment variables (read-only)
+    :param locale: dictionary of the loaded locale (read-only)
+    :return: tuple (features serialized by dump_runtime, ErrorCodes status, list of LogRecord emitted while parsing)
+    """
+    parse_collector.records = []
+    feature = Feature(file_path, env_variables, locale)
+    return dump_runtime(feature.features), feature.status, parse_collector.records
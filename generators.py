@@ -19,15 +19,174 @@ def generate_environment(full_path):
             "language": "en-US",
             "tab_size": 2,
             "dump_results_json": True,
+            "progress": True,
+            "reports": {
+                "jsonl_path": path_only + '/reports/results.jsonl',
+                "junit_path": path_only + '/reports/junit.xml'
+            },
+            "browser_profile": "debug",
+            "browser_profiles": {
+                "debug": {
+                    "browser": "firefox",
+                    "window_size": [1366, 768]
+                },
+                "ci": {
+                    "browser": "chrome",
+                    "headless": True,
+                    "window_size": [1366, 768],
+                    "page_load_strategy": "eager",
+                    "blocked_urls": ["*.woff", "*.woff2", "*.png", "*.jpg", "*.gif"],
+                    "disk_cache_path": path_only + '/.bdd_browser_cache'
+                }
+            },
+            "feature_profiles": {},
+            "fail_fast_features": [],
             "paths": {
                 "features_path": path_only + '/features',
                 "steps_path": path_only + '/steps',
-                "factories_path": path_only + '/factories'
+                "factories_path": path_only + '/factories',
+                "cache_path": path_only + '/.bdd_cache'
             }
         }, fp, indent=4)
 
 
+""" Scenarios written by the bench generator when no amount is given """
+DEFAULT_BENCHMARK_SCENARIOS = 1000
+
+""" Scenarios of each synthetic feature (one feature per file) """
+BENCHMARK_SCENARIOS_PER_FEATURE = 10
+
+""" Step definitions shared by every synthetic feature """
+BENCHMARK_COMMON_STEPS = '''from selenium_runtime import selenium_runtime as browser
+from selenium.webdriver.common.by import By
+
+base_url = "http://bench.local"
+
+
+class Given:
+    @staticmethod
+    def that_i_am_at_page(path):
+        browser.go_to_page(base_url + path)
+
+
+class When:
+    @staticmethod
+    def i_fill_the_form_with(table):
+        browser.fill_form(table, batched=True)
+
+
+class And:
+    @staticmethod
+    def i_click_on_with(selector, value):
+        browser.wait_for_element(value, By.ID if selector == 'id' else By.XPATH).click()
+
+    @staticmethod
+    def i_should_see_one_with(class_name, text):
+        assert text in browser.wait_for_element(class_name, By.CLASS_NAME).text
+
+
+class Then:
+    @staticmethod
+    def i_should_be_redirected_to_page(path):
+        assert browser.wait_for_redirect(base_url + path)
+'''
+
+""" Factory shared by every synthetic feature """
+BENCHMARK_COMMON_FACTORIES = '''from selenium_runtime import selenium_runtime as browser
+
+base_url = "http://bench.local"
+
+
+class AsABenchmarkUser:
+    @staticmethod
+    def run():
+        browser.go_to_page(base_url + "/login")
+        browser.fill_form({"Email": "bench@bench.local", "Password": "secret"}, batched=True)
+        browser.submit_form()
+'''
+
+""" Step definitions of a single synthetic feature """
+BENCHMARK_FEATURE_STEPS = '''from selenium_runtime import selenium_runtime as browser
+
+
+class Then:
+    @staticmethod
+    def i_read_the_page_title():
+        browser.current_title()
+'''
+
+""" Factory of a single synthetic feature, formatted with its number """
+BENCHMARK_FEATURE_FACTORIES = '''from selenium_runtime import selenium_runtime as browser
+
+
+class OnTheFeatureHome:
+    @staticmethod
+    def run():
+        browser.go_to_page("http://bench.local/bench/{feature}")
+'''
+
+""" Scenario of a synthetic feature, formatted with its feature and scenario numbers """
+BENCHMARK_SCENARIO = '''
+  Scenario: Scenario {feature}-{scenario}
+    Factory: As A Benchmark User
+    Factory: On The Feature Home
+    Given that I am at "/bench/{feature}/{scenario}" page
+    When I fill the form with
+      |Email|user{scenario}@bench.local|
+      |Password|secret{scenario}|
+    And I click on "id" with "submit"
+    Then I should be redirected to "/bench/{feature}/{scenario}" page
+    And I should see one "alert" with "Benchmark"
+    Then I read the page title
+'''
+
+
+def generate_benchmark(full_path, scenario_count=DEFAULT_BENCHMARK_SCENARIOS):
+    """Writes a synthetic test tree for benchmark.py: environment.json, features with 10 scenarios each and
+    their step and factory modules, besides the common ones
+
+    :param full_path: destination directory
+    :param scenario_count: amount of scenarios
+    :return: void
+    """
+    for directory in ('features', 'steps', 'factories'):
+        os.makedirs(os.path.join(full_path, directory), exist_ok=True)
+    with open(os.path.join(full_path, 'environment.json'), 'w', encoding='utf-8') as fp:
+        json.dump({
+            "language": "en-US",
+            "tab_size": 2,
+            "dump_results_json": False,
+            "paths": {
+                "features_path": os.path.join(full_path, 'features'),
+                "steps_path": os.path.join(full_path, 'steps'),
+                "factories_path": os.path.join(full_path, 'factories'),
+                "cache_path": None
+            }
+        }, fp, indent=4)
+    with open(os.path.join(full_path, 'steps', 'common_steps.py'), 'w', encoding='utf-8') as fp:
+        fp.write(BENCHMARK_COMMON_STEPS)
+    with open(os.path.join(full_path, 'factories', 'common_factories.py'), 'w', encoding='utf-8') as fp:
+        fp.write(BENCHMARK_COMMON_FACTORIES)
+
+    feature_count = -(-scenario_count // BENCHMARK_SCENARIOS_PER_FEATURE)
+    for feature_index in range(feature_count):
+        feature = '%05d' % (feature_index + 1)
+        first_scenario = feature_index * BENCHMARK_SCENARIOS_PER_FEATURE
+        scenarios = range(first_scenario, min(first_scenario + BENCHMARK_SCENARIOS_PER_FEATURE, scenario_count))
+        with open(os.path.join(full_path, 'features', 'bench_%s.feature' % feature), 'w', encoding='utf-8') as fp:
+            fp.write('# encoding: utf-8\n\nFeature: Bench %s\n  As a benchmark\n  I want to measure the framework\n'
+                     % feature)
+            for scenario in scenarios:
+                fp.write(BENCHMARK_SCENARIO.format(feature=feature, scenario=scenario + 1))
+        with open(os.path.join(full_path, 'steps', 'bench_%s_steps.py' % feature), 'w', encoding='utf-8') as fp:
+            fp.write(BENCHMARK_FEATURE_STEPS)
+        with open(os.path.join(full_path, 'factories', 'bench_%s_factories.py' % feature), 'w',
+                  encoding='utf-8') as fp:
+            fp.write(BENCHMARK_FEATURE_FACTORIES.format(feature=feature))
+
+
 """ Dictionary 'generator' maps the generator argument into the reference of the function """
 generators = {
-    'env': generate_environment
+    'env': generate_environment,
+    'bench': generate_benchmark
 }
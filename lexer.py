@@ -0,0 +1,89 @@
+"""BDD-Selenium - lexer.py
+This file contains the tokenizer of .feature files
+The grammar is compiled once per locale, with the localized keywords folded into a single pattern
+"""
+
+import re
+from collections import namedtuple
+from definitions import *
+
+""" Token describes a classified line: canonical keyword, word as written and remaining text (key/value for tables) """
+Token = namedtuple('Token', ['kind', 'indentation', 'keyword', 'word', 'text', 'line'])
+
+
+class Lexer:
+    """
+    Lexer
+    This class classifies each line of a pre-processed .feature file in a single regular expression match
+
+    Attributes:
+        grammars: static cache mapping each language into its compiled Lexer
+        statements: dictionary mapping each lower case localized statement into its canonical name
+        verbs: dictionary mapping each lower case localized verb into its canonical name
+        pattern: compiled alternation of statement, verb, description and table rules (in this priority)
+        header_pattern: compiled rule matching only the feature statement, used to index files without parsing them
+    """
+    grammars = {}
+
+    def __init__(self, locale):
+        self.statements = {word.lower(): canonical for word, canonical in locale['statements'].items()}
+        self.verbs = {word.lower(): canonical for word, canonical in locale['verbs'].items()}
+
+        verbs_alternation = '|'.join(re.escape(word) for word in sorted(self.verbs, key=len, reverse=True))
+        self.pattern = re.compile(
+            r'(?P<statement_indent>\s*)(?P<statement>\w+):\s*(?P<statement_text>.*)$'
+            r'|(?P<verb_indent>\s*)(?P<verb>' + verbs_alternation + r')(?!\w)[^:](?P<verb_text>.*)'
+            r'|(?P<word_indent>\s*)(?P<word>\w+)[^:](?P<word_text>.*)'
+            r'|(?P<table_indent>\s*)\|(?P<table_key>.*)\|(?P<table_value>.*)\|',
+            re.IGNORECASE
+        )
+        feature_alternation = '|'.join(re.escape(word) for word, canonical in self.statements.items()
+                                       if canonical == 'feature')
+        self.header_pattern = re.compile(r'\s*(?:' + feature_alternation + r'):\s*(?P<name>.*)$', re.IGNORECASE)
+
+    @staticmethod
+    def for_locale(language, locale):
+        """
+        Returns the Lexer of a language, compiling its grammar on first use
+        :param language: language name set in environment (cache key)
+        :param locale: dictionary of the loaded locale (read-only)
+        :return: Lexer instance
+        """
+        lexer = Lexer.grammars.get(language)
+        if lexer is None:
+            lexer = Lexer(locale)
+            Lexer.grammars[language] = lexer
+        return lexer
+
+    def tokenize(self, lines):
+        """
+        Generator classifying each line into a Token
+        Statements without translation get keyword None, lines matching no rule get TokenKind.UNKNOWN
+        :param lines: array of pre-processed lines
+        :return: generator of Token
+        """
+        for line in lines:
+            match = self.pattern.match(line)
+            if match is None:
+                yield Token(TokenKind.UNKNOWN, 0, None, None, None, line)
+                continue
+
+            rule = match.lastgroup
+            if rule == 'statement_text':
+                indentation, word, text = match.group('statement_indent', 'statement', 'statement_text')
+                yield Token(TokenKind.STATEMENT, len(indentation), self.statements.get(word.lower()), word, text, line)
+
+            elif rule == 'verb_text':
+                indentation, word, text = match.group('verb_indent', 'verb', 'verb_text')
+                yield Token(TokenKind.VERB, len(indentation), self.verbs[word.lower()], word, text, line)
+
+            elif rule == 'word_text':
+                # A verb at the end of line is matched without its last letter (e.g. "Give" for "Given")
+                indentation, word, text = match.group('word_indent', 'word', 'word_text')
+                keyword = self.verbs.get(word.lower())
+                kind = TokenKind.DESCRIPTION if keyword is None else TokenKind.VERB
+                yield Token(kind, len(indentation), keyword, word, text, line)
+
+            else:
+                indentation, key, value = match.group('table_indent', 'table_key', 'table_value')
+                yield Token(TokenKind.TABLE, len(indentation), None, key, value, line)
@@ -7,9 +7,11 @@ Argparser is configured in this file, thus providing help text for arguments
 import argparse
 
 # Logging built-in package
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # Datetime built-in package
 from datetime import datetime
@@ -21,6 +23,7 @@ from generators import *
 from definitions import *
 
 from execution_service import ExecutionService
+from progress import ProgressConsoleHandler
 from selenium_runtime import selenium_runtime
 
 
@@ -32,6 +35,7 @@ def setup_logging():
     """Configures the logger instance SeleniumBDD.root to usage across all the application
 
     The logger settings are defined in settings.json
+    Records are queued by the logging thread and written to the console and file by a QueueListener thread
 
     :return: void
     """
@@ -57,8 +61,8 @@ def setup_logging():
             logger = logging.getLogger(LOGGER_INSTANCE)
             logger.setLevel(minimum_level)
 
-            # Setting configuration for console
-            console_handler = logging.StreamHandler()
+            # Setting configuration for console (log lines are printed above the progress display)
+            console_handler = ProgressConsoleHandler()
             console_handler.setLevel(logging.DEBUG)
 
             # File Handler config
@@ -74,15 +78,49 @@ def setup_logging():
             file_handler.setFormatter(file_formatter)
             console_handler.setFormatter(file_formatter)
 
-            logger.addHandler(file_handler)
-            logger.addHandler(console_handler)
+            # Handlers run on the listener thread, thus no caller waits for the console nor the disk
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+            logger.addHandler(QueueHandler(log_queue))
 
     except FileNotFoundError:
         logger.critical("FATAL ERROR: settings.json file do NOT exists.")
-        selenium_runtime.browser.quit()
+        selenium_runtime.quit()
         exit(ErrorCodes.MISSING_SETTINGS)
 
 
+def shard_type(value):
+    """Parses the --shard argument
+
+    :param value: string I/N, where 1 <= I <= N
+    :return: tuple (I, N)
+    """
+    try:
+        shard_index, shard_count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must be written as I/N, e.g. 1/4")
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError("shard index must be between 1 and %d" % shard_count)
+    return shard_index, shard_count
+
+
+def positive_int_type(value):
+    """Parses the --workers and --max-failures arguments
+
+    :param value: string with an integer greater than 0
+    :return: int
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not an integer" % value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
 if __name__ == '__main__':
     # Setting up log module
     setup_logging()
@@ -100,16 +138,70 @@ if __name__ == '__main__':
     parser_group.add_argument('-e', '--environment', default='environment.json', type=str, dest='environment',
                               help='Path to json environment file, contains all needed variables to start the program')
 
-    parser_group.add_argument('-r', '--run', type=str, dest='run', required=False,
-                              help='Specify the features you wish to run')
-
     parser_group.add_argument('-g', '--generate', nargs=2,
                               help='Generator command.'
                                    '\n\tYou can use this tool to generate the files needed, probably inside a new project.'
                                    '\n\tAvailable options:'
                                    '\n\t\tENV [output_path]: generates a new environment json file'
                                    '\n\t\tFEATURES [output_path]: generates a new features path with examples'
-                                   '\n\t\tALL [output_path]: generates everything you need')
+                                   '\n\t\tALL [output_path]: generates everything you need'
+                                   '\n\t\tBENCH [output_path]: generates a synthetic tree with 1000 scenarios for '
+                                   'benchmark.py')
+
+    parser.add_argument('-r', '--run', type=str, dest='run', required=False,
+                        help='Specify the features you wish to run')
+
+    parser.add_argument('--rerun-failed', action='store_true', dest='rerun_failed',
+                        help='Runs only the scenarios that failed in the previous runs, merging them into their '
+                             'results')
+
+    parser.add_argument('--changed-since', type=str, dest='changed_since', required=False,
+                        help='Runs only the scenarios whose text, step or factory code changed since the given '
+                             'dependency index (each run writes one, .bdd_index.json by default)')
+
+    parser.add_argument('--coordinator', type=str, dest='coordinator', required=False, metavar='HOST:PORT',
+                        help='Parses the features once and leases their scenarios to workers connecting to HOST:PORT')
+
+    parser.add_argument('--worker', type=str, dest='worker', required=False, metavar='URL',
+                        help='Executes the scenarios leased by the coordinator at URL (e.g. http://10.0.0.1:8765)')
+
+    parser.add_argument('--shard', type=shard_type, dest='shard', required=False, metavar='I/N',
+                        help='Balances the scenarios into N shards by their duration history and runs only the I-th')
+
+    parser.add_argument('--shard-history', type=str, dest='shard_history', required=False, metavar='PATH',
+                        help='With --shard, balances the shards with the timing history snapshot at PATH, which every '
+                             'shard must share (default: the timing history, never updated by sharded runs)')
+
+    parser.add_argument('--browser-profile', type=str, dest='browser_profile', required=False, metavar='NAME',
+                        help='Launches the browsers with the given profile of browser_profiles in the environment '
+                             '(features listed in feature_profiles keep their own)')
+
+    parser.add_argument('--profile', nargs='?', const='bdd_profile', type=str, dest='profile', metavar='PATH',
+                        help='Profiles the run, writing collapsed stacks to PATH.folded (flamegraph input) and the '
+                             'slowest steps and most called runtime methods to PATH.txt (default PATH: bdd_profile)')
+
+    parser.add_argument('--max-failures', type=positive_int_type, dest='max_failures', metavar='N',
+                        help='Cancels the scenarios not started yet once N scenarios failed')
+
+    parser.add_argument('--fail-fast', action='store_true', dest='fail_fast',
+                        help='Cancels the scenarios not started yet of a feature once one of its scenarios failed')
+
+    parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+                        help='Parses every feature and solves its steps without launching a browser, reporting '
+                             'syntax errors, missing translations, undefined steps and wrong step arguments')
+
+    parser.add_argument('--record-calls', action='store_true', dest='record_calls',
+                        help='With --dry-run, runs the steps against a null runtime and prints the browser calls '
+                             'each one would make')
+
+    parser.add_argument('-w', '--workers', default=1, type=positive_int_type, dest='workers',
+                        help='Amount of scenarios executed concurrently, each one on its own browser session')
+
+    parser.add_argument('-c', '--compile', type=str, dest='compile', required=False,
+                        help='Parses every feature and writes the execution plan to the given path, without running it')
+
+    parser.add_argument('-p', '--plan', type=str, dest='plan', required=False,
+                        help='Executes a plan written by --compile instead of parsing the features')
 
     try:
         args = parser.parse_args()
@@ -123,9 +215,25 @@ if __name__ == '__main__':
 
         elif args.environment:
             service = ExecutionService(args.environment)
-            if args.run:
-                service.run(args.run.split(","))
+            if args.compile:
+                service.compile_plan(args.compile)
+            elif args.dry_run:
+                if service.dry_run(None if args.run is None else args.run.split(","), args.record_calls):
+                    exit(ErrorCodes.SEMANTIC_ERROR)
+            elif args.worker:
+                service.work(args.worker, browser_profile=args.browser_profile)
+            elif args.run:
+                service.run(args.run.split(","), workers=args.workers, plan_path=args.plan,
+                            rerun_failed=args.rerun_failed, changed_since=args.changed_since,
+                            coordinator=args.coordinator, shard=args.shard,
+                            browser_profile=args.browser_profile, profile_path=args.profile,
+                            max_failures=args.max_failures, fail_fast=args.fail_fast,
+                            shard_history=args.shard_history)
             else:
-                service.run()
+                service.run(workers=args.workers, plan_path=args.plan, rerun_failed=args.rerun_failed,
+                            changed_since=args.changed_since, coordinator=args.coordinator, shard=args.shard,
+                            browser_profile=args.browser_profile, profile_path=args.profile,
+                            max_failures=args.max_failures, fail_fast=args.fail_fast,
+                            shard_history=args.shard_history)
     finally:
-        selenium_runtime.browser.quit()
+        selenium_runtime.quit()
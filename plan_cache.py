@@ -0,0 +1,100 @@
+"""BDD-Selenium - plan_cache.py
+This file contains the on-disk cache of parsed .feature files and the compiled execution plan
+Both store features before reference solving, serialized by dump_runtime (references are never serialized)
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+
+from runtime_model import dump_runtime, load_runtime, MARSHAL_VERSION
+from utils import *
+
+
+class PlanCache:
+    """
+    Plan Cache
+    This class stores the features parsed from each file, keyed by the file content, locale and tab size
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        cache_path: directory holding one entry file for each parsed .feature file
+        salt: bytes identifying the parsing settings (version, language and tab size)
+    """
+
+    def __init__(self, cache_path, language, tab_size):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.cache_path = cache_path
+        self.salt = '{version}:{language}:{tab_size}'.format(version=VERSION, language=language,
+                                                            tab_size=tab_size).encode('utf8')
+        os.makedirs(cache_path, exist_ok=True)
+
+    def entry_path(self, file_path):
+        """Computes the cache entry of a .feature file from its current content
+
+        :param file_path: address of the .feature file
+        :return: path of the entry file holding the parsed features
+        """
+        digest = hashlib.sha256(self.salt)
+        with open(file_path, 'rb') as fp:
+            digest.update(fp.read())
+        return os.path.join(self.cache_path, digest.hexdigest() + '.runtime')
+
+    def load(self, file_path):
+        """Loads the features parsed from file_path, if the file did not change since it was stored
+
+        :param file_path: address of the .feature file
+        :return: tuple (dictionary of features or None on cache miss, entry path)
+        """
+        entry_path = self.entry_path(file_path)
+        try:
+            with open(entry_path, 'rb') as fp:
+                return load_runtime(fp.read()), entry_path
+        except FileNotFoundError:
+            return None, entry_path
+        except Exception as error:
+            # Any entry that does not load back into runtime is a miss, the file is parsed again
+            self.logger.warning("Ignoring corrupted cache entry %s (%r)" % (entry_path, error))
+            return None, entry_path
+
+    def store(self, entry_path, features):
+        """Writes the features parsed from a file into its cache entry (only files parsed without warnings)
+
+        :param entry_path: path returned by load
+        :param features: dictionary of features parsed from the file (steps must not be solved yet)
+        :return: void
+        """
+        temporary_path = entry_path + '.tmp'
+        with open(temporary_path, 'wb') as fp:
+            fp.write(dump_runtime(features))
+        os.replace(temporary_path, entry_path)
+
+
+def dump_plan(plan_path, runtime, environment):
+    """Writes a compiled execution plan: every parsed feature, scenario and step before reference solving
+
+    :param plan_path: destination path
+    :param runtime: dictionary of features (steps must not be solved yet)
+    :param environment: dictionary with environment variables (read-only)
+    :return: void
+    """
+    with open(plan_path, 'wb') as fp:
+        marshal.dump({
+            'version': VERSION,
+            'language': environment['language'],
+            'tab_size': environment['tab_size'],
+            'runtime': dump_runtime(runtime)
+        }, fp, MARSHAL_VERSION)
+
+
+def load_plan(plan_path):
+    """Loads a compiled execution plan written by dump_plan
+
+    :param plan_path: address of the plan file
+    :return: plan dictionary (version, language, tab_size and runtime)
+    """
+    with open(plan_path, 'rb') as fp:
+        plan = marshal.load(fp)
+    plan['runtime'] = load_runtime(plan['runtime'])
+    return plan
@@ -0,0 +1,288 @@
+"""BDD-Selenium - profiler.py
+This file contains the profiler enabled by --profile
+A sampling thread records the stack of every thread running a phase or a step into collapsed stacks (flamegraph.pl,
+speedscope and inferno read them), while the SeleniumRuntime methods are counted and timed deterministically
+Nothing is sampled nor wrapped while the profiler is disabled
+"""
+
+import collections
+import contextlib
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+
+from utils import *
+
+""" Seconds between two stack samples """
+DEFAULT_SAMPLING_INTERVAL = 0.005
+
+""" Rows of each table of the profile report """
+DEFAULT_TOP_ROWS = 10
+
+
+class RunProfiler:
+    """
+    Run Profiler
+    This class samples the stacks of the threads doing work for the run and reports where its time went:
+    collapsed stacks ({output_path}.folded) and the tables of phases, slowest steps and runtime methods most called
+    by steps ({output_path}.txt, also logged)
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        output_path: path prefix of the profile files, None disables the profiler
+        interval: seconds between two stack samples
+        top_rows: rows of each table of the report
+        samples: Counter mapping each collapsed stack into the amount of samples taken on it
+        phases: dictionary mapping each thread identifier into the phase it's running
+        step_labels: dictionary mapping each thread identifier into the step it's running
+        phase_ns: dictionary mapping each phase into the nanoseconds spent on it
+        method_stats: dictionary mapping each instrumented method into [calls, nanoseconds]
+        originals: dictionary mapping each instrumented method into its original class attribute
+        lock: lock guarding method_stats
+        stopped: event ending the sampling thread
+        sampler: sampling thread, None while not started
+    """
+
+    def __init__(self, output_path=None, interval=DEFAULT_SAMPLING_INTERVAL, top_rows=DEFAULT_TOP_ROWS):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.output_path = output_path
+        self.interval = interval
+        self.top_rows = top_rows
+        self.samples = collections.Counter()
+        self.phases = {}
+        self.step_labels = {}
+        self.phase_ns = {}
+        self.method_stats = {}
+        self.originals = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    @staticmethod
+    def from_environment(environment, output_path):
+        """Builds the profiler of a run, settings are read from the profile section of environment.json
+
+        :param environment: dictionary with environment variables (read-only)
+        :param output_path: path prefix of the profile files, None disables the profiler
+        :return: RunProfiler
+        """
+        settings = get_value_or_default(environment, 'profile', {})
+        return RunProfiler(output_path, get_value_or_default(settings, 'interval', DEFAULT_SAMPLING_INTERVAL),
+                           get_value_or_default(settings, 'top_rows', DEFAULT_TOP_ROWS))
+
+    @property
+    def enabled(self):
+        return self.output_path is not None
+
+    def start(self, runtime_class):
+        """Instruments the methods of runtime_class and starts sampling
+
+        :param runtime_class: class whose public methods are counted (e.g. SeleniumRuntime)
+        :return: void
+        """
+        if not self.enabled:
+            return
+        self.instrument(runtime_class)
+        self.sampler = threading.Thread(target=self.sample, name='Profiler', daemon=True)
+        self.sampler.start()
+
+    def stop(self, runtime_class):
+        """Stops sampling and restores the methods of runtime_class
+
+        :param runtime_class: class given to start
+        :return: void
+        """
+        if self.sampler is None:
+            return
+        self.stopped.set()
+        self.sampler.join()
+        self.sampler = None
+        for name, attribute in self.originals.items():
+            setattr(runtime_class, name, attribute)
+        self.originals = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Attributes the samples and time of the calling thread to a phase of the run
+
+        :param name: name of the phase (e.g. parse, execute)
+        :return: context manager
+        """
+        if not self.enabled:
+            yield
+            return
+        thread_id = threading.get_ident()
+        previous = self.phases.get(thread_id)
+        self.phases[thread_id] = name
+        phase_start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.phase_ns[name] = self.phase_ns.get(name, 0) + time.perf_counter_ns() - phase_start
+            if previous is None:
+                del self.phases[thread_id]
+            else:
+                self.phases[thread_id] = previous
+
+    def enter_step(self, step):
+        """Attributes the samples of the calling thread to a step until exit_step
+
+        :param step: step dictionary inside runtime (read-only)
+        :return: void
+        """
+        if self.enabled:
+            self.step_labels[threading.get_ident()] = 'step {verb} {name}'.format(verb=step['verb'],
+                                                                                 name=step['name'])
+
+    def exit_step(self):
+        if self.enabled:
+            self.step_labels.pop(threading.get_ident(), None)
+
+    def instrument(self, runtime_class):
+        """Replaces each public method of a class by a wrapper counting its calls and time
+
+        :param runtime_class: class to instrument
+        :return: void
+        """
+        for name, attribute in list(vars(runtime_class).items()):
+            if name.startswith('_'):
+                continue
+            if isinstance(attribute, staticmethod):
+                wrapper = staticmethod(self.counted(name, attribute.__func__))
+            elif inspect.isfunction(attribute):
+                wrapper = self.counted(name, attribute)
+            else:
+                continue
+            self.originals[name] = attribute
+            setattr(runtime_class, name, wrapper)
+
+    def counted(self, name, function):
+        stats = self.method_stats.setdefault(name, [0, 0])
+        step_labels = self.step_labels
+        lock = self.lock
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            # Only calls made by steps and factories are counted, not the bookkeeping of ExecutionService
+            if threading.get_ident() not in step_labels:
+                return function(*args, **kwargs)
+            call_start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - call_start
+                with lock:
+                    stats[0] += 1
+                    stats[1] += elapsed
+        return profiled
+
+    def sample(self):
+        """Sampling thread body: records the stack of each thread running a phase or a step
+
+        :return: void
+        """
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                phase = self.phases.get(thread_id)
+                step_label = self.step_labels.get(thread_id)
+                if phase is None and step_label is None:
+                    continue
+                self.samples[RunProfiler.collapse(frame, phase, step_label)] += 1
+
+    @staticmethod
+    def collapse(frame, phase, step_label):
+        """Formats a stack as a collapsed stack line (root first, frames separated by semicolons)
+
+        :param frame: innermost frame of the thread
+        :param phase: phase of the thread, None if unknown
+        :param step_label: step of the thread, None outside steps
+        :return: string
+        """
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            # Frames of the profiler itself (method wrappers) are left out
+            if code.co_filename != __file__:
+                frames.append('{function} ({file}:{line})'.format(function=code.co_name,
+                                                                 file=os.path.basename(code.co_filename),
+                                                                 line=code.co_firstlineno))
+            frame = frame.f_back
+        frames.reverse()
+        labels = [label for label in (phase or 'worker', step_label) if label is not None]
+        return ';'.join(label.replace(';', ',') for label in labels + frames)
+
+    def slowest_steps(self, runtime):
+        """Aggregates the step timings of a run by step definition
+
+        :param runtime: dictionary of features after the execution (read-only)
+        :return: list of tuples (definition, calls, total, max, wait, webdriver, python), times in milliseconds,
+            sorted by total time
+        """
+        definitions = {}
+        for feature_obj in runtime.values():
+            for scenario_obj in feature_obj['scenarios'].values():
+                if scenario_obj.get('restored', False):
+                    continue
+                for step in scenario_obj['steps']:
+                    timings = step.get('timings')
+                    if timings is None:
+                        continue
+                    definition = '{module}.{verb}.{method}'.format(module=step.get('module'),
+                                                                   verb=step['verb'].capitalize(),
+                                                                   method=step['method_name'])
+                    row = definitions.setdefault(definition, [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+                    row[0] += 1
+                    row[1] += timings['total']
+                    row[2] = max(row[2], timings['total'])
+                    row[3] += timings['wait']
+                    row[4] += timings['webdriver']
+                    row[5] += timings['python']
+        return sorted(((definition,) + tuple(row) for definition, row in definitions.items()),
+                      key=lambda row: -row[2])
+
+    def report_lines(self, runtime):
+        """Formats the profile tables
+
+        :param runtime: dictionary of features after the execution (read-only)
+        :return: list of strings
+        """
+        lines = ['Phases', '\t{:<12} {:>12}'.format('phase', 'seconds')]
+        for name, elapsed in self.phase_ns.items():
+            lines.append('\t{:<12} {:>12.3f}'.format(name, elapsed / 1e9))
+
+        lines += ['', 'Slowest steps (ms)', '\t{:<60} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            'definition', 'calls', 'total', 'mean', 'max', 'wait', 'webdriver', 'python')]
+        for definition, calls, total, maximum, wait, webdriver, python in self.slowest_steps(runtime)[:self.top_rows]:
+            lines.append('\t{:<60} {:>6} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+                definition, calls, total, total / calls, maximum, wait, webdriver, python))
+
+        lines += ['', 'Most called runtime methods (ms)', '\t{:<30} {:>8} {:>10} {:>10}'.format(
+            'method', 'calls', 'total', 'mean')]
+        method_rows = sorted(((name, calls, elapsed) for name, (calls, elapsed) in self.method_stats.items() if calls),
+                             key=lambda row: -row[1])
+        for name, calls, elapsed in method_rows[:self.top_rows]:
+            lines.append('\t{:<30} {:>8} {:>10.1f} {:>10.3f}'.format(name, calls, elapsed / 1e6,
+                                                                      elapsed / calls / 1e6))
+        return lines
+
+    def report(self, runtime):
+        """Writes the collapsed stacks and the profile tables, and logs the tables
+
+        :param runtime: dictionary of features after the execution (read-only)
+        :return: void
+        """
+        if not self.enabled:
+            return
+        verify_directory(self.output_path, True)
+        with open(self.output_path + '.folded', 'w', encoding='utf8') as fp:
+            for stack, count in self.samples.most_common():
+                fp.write('{stack} {count}\n'.format(stack=stack, count=count))
+        lines = self.report_lines(runtime)
+        with open(self.output_path + '.txt', 'w', encoding='utf8') as fp:
+            fp.write('\n'.join(lines) + '\n')
+        self.logger.info("Profile (%d samples) written to %s.folded and %s.txt\n%s"
+                         % (sum(self.samples.values()), self.output_path, self.output_path, '\n'.join(lines)))
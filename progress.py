@@ -0,0 +1,182 @@
+"""BDD-Selenium - progress.py
+This file contains the live progress display of a run, drawn on the console while the scenarios execute
+It's fed by the ReporterPipeline thread and redrawn by its own thread, thus steps never wait for the terminal
+"""
+
+import logging
+import shutil
+import sys
+import threading
+import time
+
+from utils import *
+
+""" Seconds between two redraws of the progress display """
+DEFAULT_REFRESH_INTERVAL = 0.25
+
+""" Workers listed below the counters, the remaining ones are summarized in a single line """
+DEFAULT_WORKER_ROWS = 8
+
+""" Events consumed only by the progress display (the machine readable reporters ignore them) """
+PROGRESS_EVENTS = ('run', 'start')
+
+
+class ProgressRenderer:
+    """
+    Progress Renderer
+    This class draws a block at the bottom of the console with the scenario counters, the elapsed time, the ETA and
+    the scenario each worker is running. Log lines written through ProgressConsoleHandler are printed above it
+
+    Attributes:
+        active: static member referencing the renderer drawing on the console, None when there is none
+        stream: text stream of the console (a terminal)
+        interval: seconds between two redraws
+        worker_rows: workers listed below the counters
+        total: amount of scenarios selected to run, 0 until the run event
+        counts: dictionary mapping each scenario status name into the amount of finished scenarios
+        running: dictionary mapping each (feature, scenario) running into (worker, start timestamp)
+        started: timestamp of the run event
+        drawn: amount of lines of the block currently on the console
+        lock: mutex guarding the fields above and the console
+        stopped: event ending the drawing thread
+        thread: drawing thread
+    """
+    active = None
+
+    def __init__(self, stream, interval=DEFAULT_REFRESH_INTERVAL, worker_rows=DEFAULT_WORKER_ROWS):
+        self.stream = stream
+        self.interval = interval
+        self.worker_rows = worker_rows
+        self.total = 0
+        self.counts = {}
+        self.running = {}
+        self.started = time.monotonic()
+        self.drawn = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.draw_periodically, name='ProgressRenderer', daemon=True)
+        self.thread.start()
+        ProgressRenderer.active = self
+
+    @staticmethod
+    def from_environment(environment, stream=None):
+        """Builds the progress display requested in environment.json (progress, enabled by default)
+        It's drawn only on terminals, a redirected console keeps the plain log lines
+
+        :param environment: dictionary with environment variables (read-only)
+        :param stream: console stream, None uses sys.stderr
+        :return: ProgressRenderer, None if disabled
+        """
+        stream = sys.stderr if stream is None else stream
+        if not get_value_or_default(environment, 'progress', True) or not stream.isatty():
+            return None
+        return ProgressRenderer(stream, get_value_or_default(environment, 'progress_interval',
+                                                             DEFAULT_REFRESH_INTERVAL))
+
+    def handle(self, event):
+        """Updates the counters with an event of the ReporterPipeline
+
+        :param event: dictionary of the event (run, start, step, scenario or feature)
+        :return: void
+        """
+        with self.lock:
+            if event['event'] == 'run':
+                self.total = event['scenarios']
+                self.started = time.monotonic()
+            elif event['event'] == 'start':
+                self.running[(event['feature'], event['scenario'])] = (event['worker'], time.monotonic())
+            elif event['event'] == 'scenario':
+                self.running.pop((event['feature'], event['scenario']), None)
+                self.counts[event['status']] = self.counts.get(event['status'], 0) + 1
+
+    def status_lines(self):
+        """Formats the block: counters and ETA, then the scenario of each worker
+
+        :return: list of strings
+        """
+        now = time.monotonic()
+        elapsed = now - self.started
+        done = sum(self.counts.values())
+        counters = ', '.join('{count} {status}'.format(count=count, status=status.lower())
+                             for status, count in sorted(self.counts.items()))
+        eta = '--:--' if not done or done >= self.total else clock_display(elapsed / done * (self.total - done))
+        lines = ['Scenarios {done}/{total} ({percent:.0f}%) | {counters} | {elapsed} elapsed, ETA {eta}'.format(
+            done=done, total=self.total, percent=100.0 * done / self.total if self.total else 0.0,
+            counters=counters or 'none finished', elapsed=clock_display(elapsed), eta=eta)]
+
+        running = sorted(self.running.items(), key=lambda item: item[1][0])
+        for (feature, scenario), (worker, scenario_start) in running[:self.worker_rows]:
+            lines.append('  {worker}: {feature} / {scenario} ({elapsed})'.format(
+                worker=worker, feature=feature, scenario=scenario, elapsed=clock_display(now - scenario_start)))
+        if len(running) > self.worker_rows:
+            lines.append('  ... %d more running' % (len(running) - self.worker_rows))
+        return lines
+
+    def erase(self):
+        # Moves to the first line of the block and clears everything below it
+        return '\x1b[{lines}F\x1b[J'.format(lines=self.drawn) if self.drawn else ''
+
+    def draw(self, text=''):
+        """Redraws the block, printing text above it (the caller must hold lock)
+
+        :param text: lines printed above the block, ending with a line break
+        :return: void
+        """
+        width = max(shutil.get_terminal_size().columns - 1, 20)
+        lines = [line[:width] for line in self.status_lines()]
+        self.stream.write(self.erase() + text + '\n'.join(lines) + '\n')
+        self.stream.flush()
+        self.drawn = len(lines)
+
+    def write_above(self, text):
+        with self.lock:
+            self.draw(text + '\n')
+
+    def draw_periodically(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                self.draw()
+
+    def close(self):
+        """Stops the drawing thread, leaving the final counters on the console
+
+        :return: void
+        """
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self.running = {}
+            self.draw()
+            self.drawn = 0
+        if ProgressRenderer.active is self:
+            ProgressRenderer.active = None
+
+
+class ProgressConsoleHandler(logging.StreamHandler):
+    """
+    This class writes log records on the console, above the progress block while a ProgressRenderer draws on the
+    same stream
+    """
+
+    def emit(self, record):
+        renderer = ProgressRenderer.active
+        if renderer is None or renderer.stream is not self.stream:
+            super().emit(record)
+            return
+        try:
+            renderer.write_above(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def clock_display(seconds):
+    """Formats a duration as MM:SS (or H:MM:SS)
+
+    :param seconds: duration in seconds
+    :return: formatted string
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '{hours}:{minutes:02d}:{seconds:02d}'.format(hours=hours, minutes=minutes, seconds=seconds)
+    return '{minutes:02d}:{seconds:02d}'.format(minutes=minutes, seconds=seconds)
@@ -0,0 +1,214 @@
+"""BDD-Selenium - registry.py
+This file contains the index of step and factory definitions, built once after their modules are imported
+"""
+
+import ast
+import inspect
+import logging
+
+from snapshots import CachedFactory, snapshot_store
+from utils import *
+
+
+class StepRegistry:
+    """
+    Step Registry
+    This class indexes every step and factory definition, so references are solved with dictionary lookups
+    A definition inside a feature module (e.g. login_steps) takes precedence over the common module
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        steps: dictionary mapping (module name, verb class name, method name) into the step reference
+        factories: dictionary mapping (module name, factory class name) into the run reference
+            (wrapped by CachedFactory when the factory is cacheable)
+        module_keys: dictionary mapping each feature name into its module name prefix (e.g. edit_profile)
+        used: set of keys of steps and factories that solved at least one reference
+        imported: dictionary mapping (module name, class name) of each class a module imported (or re-exported) into
+            the module declaring it
+        step_modules: dictionary with the loaded step modules, their source is read only to find repeated declarations
+    """
+
+    def __init__(self, steps, factories):
+        """
+        Class StepRegistry constructor
+
+        :param steps: dictionary with loaded_steps (read-only)
+        :param factories: dictionary with loaded_factories (read-only)
+        """
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.steps = {}
+        self.factories = {}
+        self.module_keys = {}
+        self.used = set()
+        self.imported = {}
+        self.step_modules = steps
+
+        for module_name, module in steps.items():
+            for class_name, verb_class in self.module_classes(module_name, module):
+                for method_name in dir(verb_class):
+                    step_ref = getattr(verb_class, method_name)
+                    if not method_name.startswith('_') and callable(step_ref):
+                        self.steps[(module_name, class_name, method_name)] = step_ref
+
+        for module_name, module in factories.items():
+            for class_name, factory_class in self.module_classes(module_name, module):
+                run_method = getattr(factory_class, 'run', None)
+                if callable(run_method):
+                    if getattr(factory_class, 'cacheable', False):
+                        run_method = CachedFactory(factory_class, snapshot_store)
+                    self.factories[(module_name, class_name)] = run_method
+
+        self.logger.info("Registry built with %d steps and %d factories" % (len(self.steps), len(self.factories)))
+
+    def module_classes(self, module_name, module):
+        """
+        Lists the classes reachable on a module, as getattr(module, verb) finds them, recording the imported ones
+        :param module_name: name of the module inside loaded_steps or loaded_factories
+        :param module: imported module
+        :return: list of tuples (class name, class)
+        """
+        classes = [(name, value) for name, value in vars(module).items() if inspect.isclass(value)]
+        for class_name, value in classes:
+            if value.__module__ != module.__name__:
+                self.imported[(module_name, class_name)] = value.__module__
+        return classes
+
+    def module_key(self, feature_name):
+        """
+        Returns the module name prefix of a feature (e.g. "Edit Profile" -> "edit_profile")
+        :param feature_name: name of the feature
+        :return: module name prefix
+        """
+        module_key = self.module_keys.get(feature_name)
+        if module_key is None:
+            module_key = StepRegistry.feature_module_key(feature_name)
+            self.module_keys[feature_name] = module_key
+        return module_key
+
+    @staticmethod
+    def feature_module_key(feature_name):
+        """
+        Computes the module name prefix of a feature, without an instance (e.g. to import only the needed modules)
+        :param feature_name: name of the feature
+        :return: module name prefix
+        """
+        return RegularExpressions.compiled['spaces'].sub('_', feature_name).lower()
+
+    def step_key(self, feature_name, verb, method_name):
+        """
+        Search for a step definition inside feature_steps module, then inside common_steps
+        :param feature_name: name of feature
+        :param verb: verb of the step in .feature file
+        :param method_name: name of the step method
+        :return: registry key (module name, verb class name, method name), None if undefined
+        """
+        verb_class = verb.capitalize()
+        key = (self.module_key(feature_name) + '_steps', verb_class, method_name)
+        if key not in self.steps:
+            key = ('common_steps', verb_class, method_name)
+            if key not in self.steps:
+                return None
+        self.used.add(key)
+        return key
+
+    def factory_key(self, feature_name, factory_class_name):
+        """
+        Search for a factory definition inside feature_factories module, then inside common_factories
+        :param feature_name: current feature where the factory is being used
+        :param factory_class_name: name of the factory class (Python PEP 8 standardization)
+        :return: registry key (module name, factory class name), None if undefined
+        """
+        key = (self.module_key(feature_name) + '_factories', factory_class_name)
+        if key not in self.factories:
+            key = ('common_factories', factory_class_name)
+            if key not in self.factories:
+                return None
+        self.used.add(key)
+        return key
+
+    def get_step(self, feature_name, verb, method_name):
+        """
+        Search for a step definition inside feature_steps module, then inside common_steps
+        :param feature_name: name of feature
+        :param verb: verb of the step in .feature file
+        :param method_name: name of the step method
+        :return: staticmethod reference pointer, None if undefined
+        """
+        key = self.step_key(feature_name, verb, method_name)
+        return None if key is None else self.steps[key]
+
+    def get_factory(self, feature_name, factory_class_name):
+        """
+        Search for a factory definition inside feature_factories module, then inside common_factories
+        :param feature_name: current feature where the factory is being used
+        :param factory_class_name: name of the factory class (Python PEP 8 standardization)
+        :return: run staticmethod reference pointer, None if undefined
+        """
+        key = self.factory_key(feature_name, factory_class_name)
+        return None if key is None else self.factories[key]
+
+    def overridden_steps(self):
+        """
+        Lists the steps defined in more than one module, each feature still resolves them to a single definition
+        (its own module shadows common_steps). A module reaching the step through an imported class is listed as
+        "module (from origin)"
+        :return: dictionary mapping (verb class name, method name) into the sorted list of module names
+        """
+        definitions = {}
+        for module_name, class_name, method_name in self.steps:
+            origin = self.imported.get((module_name, class_name))
+            definitions.setdefault((class_name, method_name), []).append(
+                module_name if origin is None else '{module} (from {origin})'.format(module=module_name, origin=origin))
+        return {key: sorted(modules) for key, modules in definitions.items() if len(modules) > 1}
+
+    def ambiguous_steps(self):
+        """
+        Lists the steps whose (feature, verb, method) matches more than one declaration: a method declared twice in
+        its verb class, or in two declarations of the same verb class, where Python silently keeps the last one
+        :return: dictionary mapping (verb class name, method name) into the sorted list of "module:line" declarations
+        """
+        declarations = {}
+        for module_name, module in self.step_modules.items():
+            try:
+                tree = ast.parse(inspect.getsource(module))
+            except (OSError, TypeError, SyntaxError):
+                continue
+            for class_node in tree.body:
+                if not isinstance(class_node, ast.ClassDef):
+                    continue
+                for node in class_node.body:
+                    key = (module_name, class_node.name, getattr(node, 'name', None))
+                    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and key in self.steps:
+                        declarations.setdefault(key, []).append(node.lineno)
+
+        ambiguous = {}
+        for (module_name, class_name, method_name), lines in sorted(declarations.items()):
+            if len(lines) > 1:
+                ambiguous.setdefault((class_name, method_name), []).extend(
+                    '{module}:{line}'.format(module=module_name, line=line) for line in lines)
+        return ambiguous
+
+    def unused_steps(self):
+        """
+        Lists the steps and factories that did not solve any reference, imported classes are listed by their own module
+        :return: sorted list of registry keys
+        """
+        definitions = dict(self.steps)
+        definitions.update((key, getattr(run_method, 'run_method', run_method))
+                           for key, run_method in self.factories.items())
+        used_definitions = {id(definitions[key]) for key in self.used}
+        return sorted(key for key, definition in definitions.items()
+                      if id(definition) not in used_definitions and key[:2] not in self.imported)
+
+    def report(self):
+        """
+        Logs ambiguous, overridden and unused definitions
+        :return: void
+        """
+        for (class_name, method_name), locations in self.ambiguous_steps().items():
+            self.logger.warning("Step %s.%s is declared more than once: %s"
+                                % (class_name, method_name, ', '.join(locations)))
+        for (class_name, method_name), modules in self.overridden_steps().items():
+            self.logger.info("Step %s.%s is defined in modules: %s" % (class_name, method_name, ', '.join(modules)))
+        for key in self.unused_steps():
+            self.logger.info("Unused definition: %s" % '.'.join(key))
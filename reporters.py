@@ -0,0 +1,174 @@
+"""BDD-Selenium - reporters.py
+This file contains the machine readable reporters (JSON Lines and JUnit XML)
+Results are streamed as they finish, written by a background thread so file I/O never stalls the execution
+The same thread feeds the live progress display (progress.py)
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+
+from progress import ProgressRenderer, PROGRESS_EVENTS
+from xml.sax.saxutils import quoteattr, escape
+from utils import *
+
+
+class JsonLinesReporter:
+    """
+    This class writes one JSON object per line for each finished step, scenario and feature
+    Events meant only for the progress display (run and start) are not written
+
+    Attributes:
+        fp: file object of the report
+    """
+
+    def __init__(self, path):
+        verify_directory(path, True)
+        self.fp = open(path, 'w', encoding='utf8')
+
+    def handle(self, event):
+        if event['event'] in PROGRESS_EVENTS:
+            return
+        self.fp.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.fp.flush()
+
+    def close(self):
+        self.fp.close()
+
+
+class JUnitReporter:
+    """
+    This class writes a JUnit XML report, one testcase (feature as class, scenario as name) per finished scenario
+    The closing tags are rewritten after every testcase, so the file is well-formed even if the run crashes
+
+    Attributes:
+        fp: file object of the report
+        tail_position: file offset where the closing tags start
+    """
+    tail = '  </testsuite>\n</testsuites>\n'
+
+    def __init__(self, path):
+        verify_directory(path, True)
+        self.fp = open(path, 'w', encoding='utf8')
+        self.fp.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n  <testsuite name="BDD-Selenium">\n')
+        self.tail_position = self.fp.tell()
+        self.write_tail()
+
+    def write_tail(self):
+        self.fp.write(JUnitReporter.tail)
+        self.fp.truncate()
+        self.fp.flush()
+
+    def handle(self, event):
+        if event['event'] != 'scenario':
+            return
+
+        testcase = '    <testcase classname={feature} name={scenario} time="{time:.3f}"'.format(
+            feature=quoteattr(event['feature']), scenario=quoteattr(event['scenario']),
+            time=event['exec_time'] / 1e3)
+        if event['status'] == 'PASSED':
+            testcase += '/>\n'
+        elif event['status'] == 'SKIPPED':
+            testcase += '>\n      <skipped/>\n    </testcase>\n'
+        elif event['status'] == 'CANCELLED':
+            testcase += '>\n      <skipped message="cancelled by the failure budget"/>\n    </testcase>\n'
+        else:
+            failures = '\n'.join('{verb} {name}: {details}'.format(verb=step['verb'], name=step['name'],
+                                                                  details=step['details'] or step['status'])
+                                 for step in event['steps'] if step['status'] not in ('PASSED', 'SKIPPED'))
+            testcase += '>\n      <failure message={status}>{failures}</failure>\n    </testcase>\n'.format(
+                status=quoteattr(event['status']), failures=escape(failures))
+
+        self.fp.seek(self.tail_position)
+        self.fp.write(testcase)
+        self.tail_position = self.fp.tell()
+        self.write_tail()
+
+    def close(self):
+        self.fp.close()
+
+
+class ReporterPipeline:
+    """
+    This class dispatches execution events to the reporters from a background thread
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        reporters: list of reporters (objects with handle(event) and close())
+        events: queue of events waiting to be written
+        thread: background writer thread, None when there are no reporters
+    """
+
+    def __init__(self, reporters):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.reporters = reporters
+        self.events = queue.Queue()
+        self.thread = None
+        if len(reporters):
+            self.thread = threading.Thread(target=self.write_events, name='ReporterPipeline', daemon=True)
+            self.thread.start()
+
+    @staticmethod
+    def from_environment(environment):
+        """Builds the reporters requested in environment.json
+
+        dump_results_json enables the JSON Lines reporter (reports.jsonl_path, default reports/results.jsonl)
+        reports.junit_path enables the JUnit XML reporter
+        progress (default true) enables the live progress display, drawn only when the console is a terminal
+
+        :param environment: dictionary with environment variables (read-only)
+        :return: ReporterPipeline
+        """
+        reports = get_value_or_default(environment, 'reports', {})
+        reporters = []
+        if get_value_or_default(environment, 'dump_results_json', False):
+            reporters.append(JsonLinesReporter(get_value_or_default(reports, 'jsonl_path', 'reports/results.jsonl')))
+        if get_value_or_default(reports, 'junit_path', None) is not None:
+            reporters.append(JUnitReporter(reports['junit_path']))
+        renderer = ProgressRenderer.from_environment(environment)
+        if renderer is not None:
+            reporters.append(renderer)
+        return ReporterPipeline(reporters)
+
+    def emit(self, event_type, **fields):
+        """Queues an event, never blocks the caller
+
+        :param event_type: 'run', 'start', 'step', 'scenario' or 'feature'
+        :param fields: JSON serializable event data
+        :return: void
+        """
+        if self.thread is not None:
+            fields['event'] = event_type
+            fields['timestamp'] = time.time()
+            self.events.put(fields)
+
+    def write_events(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            # A failing reporter loses this event only, the thread keeps serving the others
+            for reporter in self.reporters:
+                try:
+                    reporter.handle(event)
+                except Exception:
+                    self.logger.exception("Reporter %s failed to write a %s event"
+                                          % (type(reporter).__name__, event.get('event')))
+
+    def close(self):
+        """Writes the pending events and closes every reporter
+
+        :return: void
+        """
+        if self.thread is None:
+            return
+        self.events.put(None)
+        self.thread.join()
+        self.thread = None
+        for reporter in self.reporters:
+            try:
+                reporter.close()
+            except Exception:
+                self.logger.exception("Reporter %s failed to close" % type(reporter).__name__)
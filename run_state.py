@@ -0,0 +1,191 @@
+"""BDD-Selenium - run_state.py
+This file contains the state file holding the outcome of each scenario of the previous runs
+It allows executing only the scenarios that failed (--rerun-failed) and merging their new results
+"""
+
+import json
+import logging
+import os
+import time
+
+from utils import *
+
+""" Scenario statuses selected by --rerun-failed (cancelled scenarios never ran) """
+RERUN_STATUSES = ('FAILED', 'MISSING_REF', 'CANCELLED')
+
+""" Seconds a state file lock may be held before it's considered abandoned by a crashed run """
+STALE_LOCK_TIMEOUT = 60
+
+""" Seconds between two attempts of taking a state file lock """
+LOCK_POLL_INTERVAL = 0.05
+
+
+class RunState:
+    """
+    Run State
+    This class keeps the outcome (status, execution time, timings and steps) of every scenario already executed
+    Statuses are stored by name, so the file stays readable and independent of the enumeration values
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        state_path: address of the JSON state file
+        features: dictionary mapping each feature name into its description and scenarios outcomes
+        recorded: dictionary with the entries of features written by this run, merged into the file when saved
+    """
+
+    def __init__(self, state_path):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.state_path = state_path
+        self.features = {}
+        self.recorded = {}
+
+    @staticmethod
+    def load(state_path):
+        """Reads a state file, a missing or unreadable file results in an empty state
+
+        :param state_path: address of the JSON state file
+        :return: RunState
+        """
+        state = RunState(state_path)
+        try:
+            with open(state_path, 'r', encoding='utf8') as fp:
+                content = json.load(fp)
+            if content.get('version') != VERSION:
+                state.logger.warning("State file %s was written by version %s" % (state_path, content.get('version')))
+            state.features = content['features']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, AttributeError):
+            state.logger.warning("Ignoring corrupted state file %s" % state_path)
+        return state
+
+    def save(self):
+        """Merges the outcomes recorded by this run into the state file, atomically and under a lock file
+        The file is read again before writing, thus runs sharing it (e.g. shards) keep each other's outcomes
+
+        :return: void
+        """
+        verify_directory(self.state_path, True)
+        with StateFileLock(self.state_path + '.lock'):
+            self.features = RunState.load(self.state_path).features
+            for feature_name, recorded in self.recorded.items():
+                entry = self.features.setdefault(feature_name, {'scenarios': {}})
+                entry['status'] = recorded['status']
+                entry['scenarios'].update(recorded['scenarios'])
+
+            temporary_path = self.state_path + '.tmp'
+            with open(temporary_path, 'w', encoding='utf8') as fp:
+                json.dump({'version': VERSION, 'features': self.features}, fp, ensure_ascii=False, indent=2,
+                          default=str)
+            os.replace(temporary_path, self.state_path)
+
+    def record(self, feature_name, feature_obj):
+        """Stores the outcome of every scenario of a settled feature, replacing their previous ones
+        Scenarios absent from feature_obj (e.g. executed by another shard) keep their previous outcome
+
+        :param feature_name: name of the feature
+        :param feature_obj: feature dictionary inside runtime (read-only)
+        :return: void
+        """
+        outcomes = {scenario_name: RunState.scenario_outcome(scenario_obj)
+                    for scenario_name, scenario_obj in feature_obj['scenarios'].items()}
+        for entries in (self.features, self.recorded):
+            entry = entries.setdefault(feature_name, {'scenarios': {}})
+            entry['status'] = ExecutionStatus(feature_obj['status']).name
+            entry['scenarios'].update(outcomes)
+
+    @staticmethod
+    def scenario_outcome(scenario_obj):
+        """Extracts the JSON serializable outcome of a scenario
+        Spooled tracebacks are kept as SpooledText (serialized by their text), so they're read only when saved
+
+        :param scenario_obj: ScenarioRecord inside runtime (read-only)
+        :return: dictionary with status, exec_time, timings and steps (verb, name, status, details and timings)
+        """
+        return {
+            'status': ExecutionStatus(scenario_obj['status']).name,
+            'exec_time': scenario_obj.get('exec_time', 0),
+            'timings': scenario_obj.get('timings'),
+            'steps': [{
+                'verb': step['verb'],
+                'name': step['name'],
+                'status': ExecutionStatus(step['status']).name,
+                'details': step.stored_details,
+                'timings': step.get('timings')
+            } for step in scenario_obj['steps']]
+        }
+
+    @staticmethod
+    def apply_outcome(outcome, scenario_obj):
+        """Copies an outcome extracted by scenario_outcome into a scenario with the same steps
+
+        :param outcome: dictionary returned by scenario_outcome (read-only)
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :return: void
+        """
+        scenario_obj['status'] = ExecutionStatus[outcome['status']]
+        scenario_obj['exec_time'] = outcome['exec_time']
+        scenario_obj['timings'] = outcome['timings']
+        for saved, step in zip(outcome['steps'], scenario_obj['steps']):
+            step['status'] = ExecutionStatus[saved['status']]
+            step['details'] = saved['details']
+            step['timings'] = saved['timings']
+
+    def failed_scenarios(self, feature_name):
+        """Lists the scenarios of a feature whose last outcome was FAILED, MISSING_REF or CANCELLED
+
+        :param feature_name: name of the feature
+        :return: set of scenario names
+        """
+        scenarios = self.features.get(feature_name, {}).get('scenarios', {})
+        return {name for name, outcome in scenarios.items() if outcome['status'] in RERUN_STATUSES}
+
+    def restore(self, feature_name, scenario_name, scenario_obj):
+        """Copies the last outcome of a scenario into runtime, so it's reported without running again
+        A scenario whose steps changed since the state was written can't be restored
+
+        :param feature_name: name of the feature
+        :param scenario_name: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (modified by reference)
+        :return: True if restored, False if the scenario is unknown or changed
+        """
+        outcome = self.features.get(feature_name, {}).get('scenarios', {}).get(scenario_name)
+        if outcome is None or len(outcome['steps']) != len(scenario_obj['steps']) or \
+                any((saved['verb'], saved['name']) != (step['verb'], step['name'])
+                    for saved, step in zip(outcome['steps'], scenario_obj['steps'])):
+            return False
+
+        RunState.apply_outcome(outcome, scenario_obj)
+        scenario_obj['restored'] = True
+        return True
+
+
+class StateFileLock:
+    """
+    This class is a lock file guarding the state file against concurrent runs (e.g. shards on a shared directory)
+    The lock is a file created exclusively, a lock older than STALE_LOCK_TIMEOUT is removed as abandoned
+
+    Attributes:
+        lock_path: address of the lock file
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_TIMEOUT:
+                        logging.getLogger(LOGGER_INSTANCE).warning("Removing abandoned lock %s" % self.lock_path)
+                        os.remove(self.lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        os.remove(self.lock_path)
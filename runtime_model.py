@@ -0,0 +1,299 @@
+"""BDD-Selenium - runtime_model.py
+This file contains the records of runtime (features, scenarios and steps) and their binary serialization
+Records keep their fields in __slots__ but are read and written like the dictionaries they replaced
+(step['status'], scenario_obj.get('timings')), so every consumer of runtime handles both
+"""
+
+import hashlib
+import marshal
+import tempfile
+import threading
+
+from definitions import *
+
+""" Tag and format version of the serialized runtimes, checked by load_runtime """
+RUNTIME_FORMAT = ('bdd-runtime', 1)
+
+""" Version of the marshal format, fixed so runtimes move between processes of the same interpreter """
+MARSHAL_VERSION = 4
+
+
+class RuntimeRecord:
+    """
+    Base class of the runtime records: a fixed set of fields exposed through the mapping protocol
+    Unknown keys raise KeyError, like a dictionary lacking them
+
+    Attributes:
+        fields: static member listing the public fields of the record, in serialization order
+        field_set: static member with the same fields, for membership tests
+    """
+    __slots__ = ()
+    fields = ()
+    field_set = frozenset()
+
+    def __getitem__(self, key):
+        if key not in self.field_set:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.field_set:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.field_set
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.field_set else default
+
+    def keys(self):
+        return self.fields
+
+    def values(self):
+        return [getattr(self, field) for field in self.fields]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.fields]
+
+    def as_dict(self):
+        """Builds the dictionary view of the record (nested records are converted too)
+
+        :return: dictionary mapping each field into its value
+        """
+        return dict(self.items())
+
+    def __repr__(self):
+        return '{record}({fields})'.format(record=type(self).__name__, fields=', '.join(
+            '{field}={value!r}'.format(field=field, value=value) for field, value in self.items()))
+
+
+class StepRecord(RuntimeRecord):
+    """
+    This class describes a step (or factory) of a scenario
+
+    Attributes:
+        name: step name written in .feature file
+        args: list of arguments (quoted strings and tables)
+        method_name: name of the step method or factory class (Python PEP 8 standardization)
+        verb: verb of the step, 'factory' for factories
+        status: ExecutionStatus of the step
+        ref: solved reference of the step, None until solve_references
+        details: execution time in milliseconds (passed), failure traceback (failed) or None
+        module: name of the module defining the step, None until solve_references
+        timings: dictionary of phase timings in milliseconds, None until executed
+    """
+    __slots__ = ('name', 'args', 'method_name', 'verb', 'status', 'ref', 'stored_details', 'module', 'timings')
+    fields = ('name', 'args', 'method_name', 'verb', 'status', 'ref', 'details', 'module', 'timings')
+    field_set = frozenset(fields)
+
+    def __init__(self, name, args, method_name, verb=None, status=ExecutionStatus.PENDING_SOLVING, ref=None,
+                 details=None, module=None, timings=None):
+        self.name = name
+        self.args = args
+        self.method_name = method_name
+        self.verb = verb
+        self.status = status
+        self.ref = ref
+        self.stored_details = details
+        self.module = module
+        self.timings = timings
+
+    @property
+    def details(self):
+        if type(self.stored_details) is SpooledText:
+            return self.stored_details.read()
+        return self.stored_details
+
+    @details.setter
+    def details(self, value):
+        self.stored_details = value
+
+
+class ScenarioRecord(RuntimeRecord):
+    """
+    This class describes a scenario of a feature
+
+    Attributes:
+        steps: list of StepRecord
+        status: ExecutionStatus of the scenario
+        exec_time: execution time in milliseconds
+        timings: dictionary of phase timings in milliseconds, None until executed
+        restored: True if the outcome was restored from the run state instead of executed
+    """
+    __slots__ = ('steps', 'status', 'exec_time', 'timings', 'restored')
+    fields = __slots__
+    field_set = frozenset(fields)
+
+    def __init__(self, steps=None, status=ExecutionStatus.PENDING, exec_time=0, timings=None, restored=False):
+        self.steps = [] if steps is None else steps
+        self.status = status
+        self.exec_time = exec_time
+        self.timings = timings
+        self.restored = restored
+
+    def as_dict(self):
+        scenario_dict = super().as_dict()
+        scenario_dict['steps'] = [step.as_dict() for step in self.steps]
+        return scenario_dict
+
+
+class FeatureRecord(RuntimeRecord):
+    """
+    This class describes a feature
+
+    Attributes:
+        description: description lines of the feature, None if it has none
+        scenarios: dictionary mapping each scenario name into its ScenarioRecord
+        status: ExecutionStatus of the feature
+        exec_time: execution time in milliseconds (sum of its passed scenarios)
+        timings: dictionary of phase timings in milliseconds, None until settled
+    """
+    __slots__ = ('description', 'scenarios', 'status', 'exec_time', 'timings')
+    fields = __slots__
+    field_set = frozenset(fields)
+
+    def __init__(self, description=None, scenarios=None, status=ExecutionStatus.PENDING, exec_time=0, timings=None):
+        self.description = description
+        self.scenarios = {} if scenarios is None else scenarios
+        self.status = status
+        self.exec_time = exec_time
+        self.timings = timings
+
+    def as_dict(self):
+        feature_dict = super().as_dict()
+        feature_dict['scenarios'] = {name: scenario.as_dict() for name, scenario in self.scenarios.items()}
+        return feature_dict
+
+
+class SpooledText:
+    """
+    This class references a text moved into a TracebackSpool
+
+    Attributes:
+        spool: TracebackSpool holding the text
+        offset: position of the text inside the spool file
+        length: size of the text in bytes
+    """
+    __slots__ = ('spool', 'offset', 'length')
+
+    def __init__(self, spool, offset, length):
+        self.spool = spool
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        return self.spool.read(self.offset, self.length)
+
+    def __str__(self):
+        return self.read()
+
+
+class TracebackSpool:
+    """
+    This class keeps the failure tracebacks of a run out of the step records
+    Identical tracebacks (e.g. the same step failing in many scenarios) share a single string while their feature
+    runs, and are moved into a temporary file once reported, the steps keep a SpooledText instead
+
+    Attributes:
+        interned: dictionary mapping each traceback not spooled yet into its shared copy
+        spooled: dictionary mapping the digest of each spooled traceback into its SpooledText
+        fp: temporary file holding the spooled tracebacks, None until the first one
+        lock: mutex guarding the fields above against concurrent workers
+    """
+
+    def __init__(self):
+        self.interned = {}
+        self.spooled = {}
+        self.fp = None
+        self.lock = threading.Lock()
+
+    def intern(self, text):
+        with self.lock:
+            return self.interned.setdefault(text, text)
+
+    def spool(self, text):
+        """Moves a text into the spool file, a text already spooled is written only once
+
+        :param text: string to spool
+        :return: SpooledText
+        """
+        content = text.encode('utf8')
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        with self.lock:
+            self.interned.pop(text, None)
+            spooled = self.spooled.get(digest)
+            if spooled is None:
+                if self.fp is None:
+                    self.fp = tempfile.TemporaryFile(prefix='bdd-tracebacks-')
+                self.fp.seek(0, 2)
+                spooled = SpooledText(self, self.fp.tell(), len(content))
+                self.fp.write(content)
+                self.spooled[digest] = spooled
+            return spooled
+
+    def read(self, offset, length):
+        with self.lock:
+            self.fp.seek(offset)
+            return self.fp.read(length).decode('utf8')
+
+    def spool_feature(self, feature_obj):
+        """Spools the tracebacks of the failed steps of a feature already reported
+
+        :param feature_obj: FeatureRecord (modified by reference)
+        :return: void
+        """
+        for scenario_obj in feature_obj.scenarios.values():
+            for step in scenario_obj.steps:
+                if type(step.stored_details) is str:
+                    step.stored_details = self.spool(step.stored_details)
+
+
+""" Tracebacks of the steps executed by this process """
+traceback_spool = TracebackSpool()
+
+
+def dump_runtime(runtime):
+    """Serializes a runtime into compact bytes (marshal of plain tuples), to move plans and results between processes
+    Step references are not serialized, they are solved again by the receiving process
+
+    :param runtime: dictionary mapping each feature name into its FeatureRecord (read-only)
+    :return: bytes
+    """
+    return marshal.dumps((RUNTIME_FORMAT, tuple(
+        (feature_name, feature_obj.description, int(feature_obj.status), feature_obj.exec_time, feature_obj.timings,
+         tuple((scenario_name, int(scenario_obj.status), scenario_obj.exec_time, scenario_obj.timings,
+                scenario_obj.restored,
+                tuple((step.name, step.args, step.method_name, step.verb, int(step.status),
+                       step.details, step.module, step.timings) for step in scenario_obj.steps))
+               for scenario_name, scenario_obj in feature_obj.scenarios.items()))
+        for feature_name, feature_obj in runtime.items())), MARSHAL_VERSION)
+
+
+def load_runtime(data):
+    """Deserializes a runtime written by dump_runtime
+
+    :param data: bytes returned by dump_runtime
+    :raise ValueError: data is not a serialized runtime of this format version
+    :return: dictionary mapping each feature name into its FeatureRecord
+    """
+    content = marshal.loads(data)
+    if not isinstance(content, tuple) or len(content) != 2 or content[0] != RUNTIME_FORMAT:
+        raise ValueError("Unknown runtime serialization format")
+
+    runtime = {}
+    for feature_name, description, feature_status, feature_time, feature_timings, scenarios in content[1]:
+        runtime[feature_name] = FeatureRecord(description, {
+            scenario_name: ScenarioRecord([
+                StepRecord(name, args, method_name, verb, ExecutionStatus(status), None, details, module, timings)
+                for name, args, method_name, verb, status, details, module, timings in steps
+            ], ExecutionStatus(status), exec_time, timings, restored)
+            for scenario_name, status, exec_time, timings, restored, steps in scenarios
+        }, ExecutionStatus(feature_status), feature_time, feature_timings)
+    return runtime
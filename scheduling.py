@@ -0,0 +1,138 @@
+"""BDD-Selenium - scheduling.py
+This file contains the timing history of the scenarios and the duration-aware ordering built on it
+Longest scenarios are dispatched first and shards are balanced by their estimated duration (LPT heuristic)
+"""
+
+import heapq
+import json
+import logging
+import os
+import statistics
+
+from utils import *
+
+""" Weight of the latest run in the moving average of a scenario duration """
+HISTORY_SMOOTHING = 0.5
+
+""" Duration of a step (ms) assumed while there is no history at all """
+DEFAULT_STEP_TIME = 1000.0
+
+
+class TimingHistory:
+    """
+    Timing History
+    This class keeps an exponential moving average of each scenario duration across runs, plus the median step
+    duration, used to estimate the scenarios that never ran
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        history_path: address of the JSON history file
+        scenarios: dictionary mapping each feature name into its scenarios average duration (ms)
+        median_step: median duration (ms) of the steps executed in the latest run that measured any
+    """
+
+    def __init__(self, history_path):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.history_path = history_path
+        self.scenarios = {}
+        self.median_step = DEFAULT_STEP_TIME
+
+    @staticmethod
+    def load(history_path):
+        """Reads a history file, a missing or unreadable file results in an empty history
+
+        :param history_path: address of the JSON history file
+        :return: TimingHistory
+        """
+        history = TimingHistory(history_path)
+        try:
+            with open(history_path, 'r', encoding='utf8') as fp:
+                content = json.load(fp)
+            history.scenarios = content['scenarios']
+            history.median_step = content['median_step']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, AttributeError, TypeError):
+            history.logger.warning("Ignoring corrupted timing history %s" % history_path)
+        return history
+
+    def save(self):
+        """Writes the history file atomically
+
+        :return: void
+        """
+        verify_directory(self.history_path, True)
+        temporary_path = self.history_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf8') as fp:
+            json.dump({'version': VERSION, 'median_step': self.median_step, 'scenarios': self.scenarios}, fp,
+                      ensure_ascii=False, indent=2)
+        os.replace(temporary_path, self.history_path)
+
+    def update(self, runtime, features):
+        """Folds the durations measured in this run into the history
+        Scenarios restored from a previous run or skipped are ignored
+
+        :param runtime: dictionary of features after the execution (read-only)
+        :param features: iterable of feature names that ran
+        :return: void
+        """
+        step_times = []
+        for feature in features:
+            if feature not in runtime:
+                continue
+            averages = self.scenarios.setdefault(feature, {})
+            for scenario, scenario_obj in runtime[feature]['scenarios'].items():
+                if scenario_obj.get('restored', False) or scenario_obj['status'] not in (ExecutionStatus.PASSED,
+                                                                                         ExecutionStatus.FAILED):
+                    continue
+                previous = averages.get(scenario)
+                averages[scenario] = scenario_obj['exec_time'] if previous is None else \
+                    HISTORY_SMOOTHING * scenario_obj['exec_time'] + (1 - HISTORY_SMOOTHING) * previous
+                step_times.extend(step['timings']['total'] for step in scenario_obj['steps']
+                                  if step.get('timings') is not None)
+        if len(step_times):
+            self.median_step = statistics.median(step_times)
+
+    def estimate(self, feature, scenario, scenario_obj):
+        """Expected duration of a scenario: its average, or its step count times the median step duration
+        Scenarios that won't execute (skipped or restored from a previous run) take no time
+
+        :param feature: name of the feature
+        :param scenario: name of the scenario
+        :param scenario_obj: scenario dictionary inside runtime (read-only)
+        :return: duration in milliseconds
+        """
+        if scenario_obj['status'] == ExecutionStatus.SKIPPED or scenario_obj.get('restored', False):
+            return 0.0
+        average = self.scenarios.get(feature, {}).get(scenario)
+        if average is not None:
+            return average
+        return len(scenario_obj['steps']) * self.median_step
+
+    def longest_first(self, runtime, scenarios):
+        """Sorts scenarios by their estimated duration, longest first (ties keep the declaration order)
+
+        :param runtime: dictionary of features (read-only)
+        :param scenarios: list of (feature name, scenario name)
+        :return: sorted list of (feature name, scenario name)
+        """
+        return sorted(scenarios, key=lambda item: -self.estimate(item[0], item[1],
+                                                                 runtime[item[0]]['scenarios'][item[1]]))
+
+    def partition(self, runtime, scenarios, bins):
+        """Splits scenarios into bins of balanced estimated duration, by assigning the longest remaining scenario
+        to the least loaded bin (Longest Processing Time first)
+
+        :param runtime: dictionary of features (read-only)
+        :param scenarios: list of (feature name, scenario name)
+        :param bins: amount of bins
+        :return: list with the (feature name, scenario name) list of each bin
+        """
+        loads = [(0.0, index) for index in range(bins)]
+        partitions = [[] for _ in range(bins)]
+        for item in self.longest_first(runtime, scenarios):
+            load, index = heapq.heappop(loads)
+            partitions[index].append(item)
+            heapq.heappush(loads, (load + self.estimate(item[0], item[1], runtime[item[0]]['scenarios'][item[1]]),
+                                   index))
+        return partitions
@@ -1,7 +1,13 @@
+import contextvars
 import logging
+import threading
+import time
 
-from selenium.common.exceptions import NoSuchElementException
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, WebDriverException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions
 
@@ -10,68 +16,546 @@ from selenium.webdriver import Firefox
 from selenium.webdriver import Chrome
 from selenium.webdriver import Edge
 
+from browser_profiles import BrowserProfile
+from utils import summarize_timings
 from definitions import *
 
 
+""" Sets the value of each field id, returns the ids not found """
+FILL_FORM_SCRIPT = (
+    "var fields = arguments[0], missing = [];"
+    "Object.keys(fields).forEach(function (id) {"
+    "  var element = document.getElementById(id), value = fields[id];"
+    "  if (!element) { missing.push(id); return; }"
+    "  if (element.type === 'checkbox' || element.type === 'radio') {"
+    "    element.checked = ['true', 'on', 'yes', '1'].indexOf(value.trim().toLowerCase()) >= 0;"
+    "  } else {"
+    "    var setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(element), 'value');"
+    "    if (setter && setter.set) { setter.set.call(element, value); } else { element.value = value; }"
+    "  }"
+    "  element.dispatchEvent(new Event('input', {bubbles: true}));"
+    "  element.dispatchEvent(new Event('change', {bubbles: true}));"
+    "});"
+    "return missing;"
+)
+
+""" Picks the options located by the XPaths in order, stops at the first one missing and returns the amount picked """
+FILL_SELECTS_SCRIPT = (
+    "var xpaths = arguments[0];"
+    "for (var i = 0; i < xpaths.length; i++) {"
+    "  var option = document.evaluate(xpaths[i], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)"
+    "    .singleNodeValue;"
+    "  if (!option) { return i; }"
+    "  var select = option.closest ? option.closest('select') : null;"
+    "  if (select) {"
+    "    option.selected = true;"
+    "    select.dispatchEvent(new Event('input', {bubbles: true}));"
+    "    select.dispatchEvent(new Event('change', {bubbles: true}));"
+    "  } else {"
+    "    option.click();"
+    "  }"
+    "}"
+    "return xpaths.length;"
+)
+
+
+""" Clears localStorage and sessionStorage (pages without storage access, e.g. about:blank, throw) """
+CLEAR_STORAGE_SCRIPT = "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+
+""" Returns [localStorage items, sessionStorage items] """
+DUMP_STORAGE_SCRIPT = (
+    "function dump(storage) {"
+    "  var items = {};"
+    "  for (var i = 0; i < storage.length; i++) { items[storage.key(i)] = storage.getItem(storage.key(i)); }"
+    "  return items;"
+    "}"
+    "return [dump(window.localStorage), dump(window.sessionStorage)];"
+)
+
+""" Replaces localStorage and sessionStorage with the items in arguments[0] and arguments[1] """
+RESTORE_STORAGE_SCRIPT = (
+    "var storages = [[window.localStorage, arguments[0]], [window.sessionStorage, arguments[1]]];"
+    "storages.forEach(function (pair) {"
+    "  pair[0].clear();"
+    "  Object.keys(pair[1]).forEach(function (key) { pair[0].setItem(key, pair[1][key]); });"
+    "});"
+)
+
+""" Returns true when the DOM did not change for arguments[0] milliseconds """
+DOM_QUIET_SCRIPT = (
+    "if (!window.__bddMutationObserver) {"
+    "  window.__bddLastMutation = Date.now();"
+    "  window.__bddMutationObserver = new MutationObserver(function () {"
+    "    window.__bddLastMutation = Date.now();"
+    "  });"
+    "  window.__bddMutationObserver.observe(document, "
+    "    {childList: true, subtree: true, attributes: true, characterData: true});"
+    "}"
+    "return Date.now() - window.__bddLastMutation >= arguments[0];"
+)
+
+""" Returns true when the page is loaded and there are no pending XHR/fetch (nor jQuery) requests """
+NETWORK_IDLE_SCRIPT = (
+    "if (!window.__bddPendingRequests) {"
+    "  window.__bddPendingRequests = {count: 0};"
+    "  var pending = window.__bddPendingRequests;"
+    "  var send = XMLHttpRequest.prototype.send;"
+    "  XMLHttpRequest.prototype.send = function () {"
+    "    pending.count++;"
+    "    this.addEventListener('loadend', function () { pending.count--; });"
+    "    return send.apply(this, arguments);"
+    "  };"
+    "  if (window.fetch) {"
+    "    var fetch = window.fetch;"
+    "    window.fetch = function () {"
+    "      pending.count++;"
+    "      return fetch.apply(this, arguments).finally(function () { pending.count--; });"
+    "    };"
+    "  }"
+    "}"
+    "var jQueryActive = window.jQuery ? window.jQuery.active : 0;"
+    "return document.readyState === 'complete' && window.__bddPendingRequests.count === 0 "
+    "  && jQueryActive === 0;"
+)
+
+""" Returns true when no finite CSS animation, transition or jQuery animation is running """
+ANIMATIONS_SCRIPT = (
+    "var running = document.getAnimations ? document.getAnimations().filter(function (animation) {"
+    "  return animation.playState === 'running' && animation.effect"
+    "    && animation.effect.getComputedTiming().endTime !== Infinity;"
+    "}).length : 0;"
+    "var jQueryRunning = window.jQuery ? window.jQuery(':animated').length : 0;"
+    "return running === 0 && jQueryRunning === 0;"
+)
+
+
+class SessionSnapshot:
+    """
+    This class holds the authentication state of a browser session, captured after a factory ran
+
+    Attributes:
+        url: address of the page open when the snapshot was captured
+        origin: scheme and host of url
+        cookies: list of cookie dictionaries, as returned by WebDriver
+        local_storage: dictionary with the localStorage items
+        session_storage: dictionary with the sessionStorage items
+        captured_at: monotonic timestamp of the capture, in seconds
+    """
+
+    def __init__(self, url, cookies, local_storage, session_storage):
+        self.url = url
+        self.origin = SessionSnapshot.origin_of(url)
+        self.cookies = cookies
+        self.local_storage = local_storage
+        self.session_storage = session_storage
+        self.captured_at = time.monotonic()
+
+    @staticmethod
+    def origin_of(url):
+        split_url = urlsplit(url)
+        return '{scheme}://{host}'.format(scheme=split_url.scheme, host=split_url.netloc)
+
+    def expired(self, ttl):
+        """Tests (True or False) if the snapshot is older than ttl
+
+        :param ttl: time to live in seconds, None never expires
+        :return: True if expired, False otherwise
+        """
+        return ttl is not None and time.monotonic() - self.captured_at > ttl
+
+
+class CachedElement(WebElement):
+    """
+    This class is a WebElement whose identity is the element cached by a SeleniumRuntime for its locator
+    It's serialized like any WebElement (execute_script arguments, ActionChains, Select), and when the cached element
+    became stale (e.g. the page was rendered again), it's located again and the command retried
+
+    Attributes:
+        runtime: SeleniumRuntime owning the element cache
+        key: tuple (by, value) locating the element
+    """
+
+    def __init__(self, runtime, key):
+        # WebElement.__init__ is not called, parent, id and w3c are read from the cached element
+        self.runtime = runtime
+        self.key = key
+
+    @property
+    def wrapped_element(self):
+        return self.runtime.resolve(self.key)
+
+    @property
+    def _parent(self):
+        return self.wrapped_element.parent
+
+    @property
+    def _id(self):
+        return self.wrapped_element.id
+
+    @property
+    def _w3c(self):
+        return self.wrapped_element._w3c
+
+    def with_stale_retry(self, action):
+        """Runs action on the cached element, locating it again and retrying once if it became stale
+
+        :param action: callable receiving the WebElement
+        :return: value returned by action
+        """
+        try:
+            return action(self.runtime.resolve(self.key))
+        except StaleElementReferenceException:
+            return action(self.runtime.resolve(self.key, refresh=True))
+
+    def _execute(self, command, params=None):
+        return self.with_stale_retry(lambda element: element._execute(command, params))
+
+    # The methods below send the element as a script argument instead of going through _execute
+    def submit(self):
+        return self.with_stale_retry(lambda element: element.submit())
+
+    def get_property(self, name):
+        return self.with_stale_retry(lambda element: element.get_property(name))
+
+    def get_attribute(self, name):
+        return self.with_stale_retry(lambda element: element.get_attribute(name))
+
+    def is_displayed(self):
+        return self.with_stale_retry(lambda element: element.is_displayed())
+
+
+class SessionManager:
+    """
+    This class owns the lifecycle of a single WebDriver session
+    The browser is launched the first time it is requested, reused across features and relaunched only
+    when the session dies or a feature requires a different BrowserProfile
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        profile: BrowserProfile the browser is launched with
+        driver_instance: live WebDriver, None until the first request
+        command_ns: nanoseconds spent launching browsers and executing WebDriver commands
+    """
+
+    def __init__(self, profile=None):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.profile = BrowserProfile() if profile is None else profile
+        self.driver_instance = None
+        self.command_ns = 0
+
+    @property
+    def driver(self):
+        """WebDriver of this session, launched on first access"""
+        if self.driver_instance is None:
+            launch_start = time.perf_counter_ns()
+            self.driver_instance = self.launch()
+            self.command_ns += time.perf_counter_ns() - launch_start
+            self.time_commands(self.driver_instance)
+        return self.driver_instance
+
+    def time_commands(self, driver):
+        """Wraps the execute method of a WebDriver (used by every command, including WebElement ones)
+        to accumulate its duration into command_ns
+
+        :param driver: WebDriver instance
+        :return: void
+        """
+        execute = driver.execute
+
+        def timed_execute(driver_command, params=None):
+            command_start = time.perf_counter_ns()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.command_ns += time.perf_counter_ns() - command_start
+        driver.execute = timed_execute
+
+    def launch(self):
+        """Starts a new browser process configured by profile
+
+        :return: WebDriver instance
+        """
+        profile = self.profile
+        self.logger.info("Launching %s browser session (profile %s)..." % (profile.browser, profile.name))
+        if profile.browser == 'chrome':
+            driver = Chrome(options=profile.options())
+            if len(profile.blocked_urls):
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': profile.blocked_urls})
+        elif profile.browser == 'firefox':
+            driver = Firefox(options=profile.options())
+        else:
+            driver = Edge(capabilities=profile.capabilities())
+        if profile.window_size is not None:
+            driver.set_window_size(*profile.window_size)
+        return driver
+
+    def use_profile(self, profile):
+        """Selects the profile of the next launches, closing the browser if it was launched with another one
+
+        :param profile: BrowserProfile
+        :return: void
+        """
+        if profile is not self.profile:
+            self.quit()
+            self.profile = profile
+
+    def is_alive(self):
+        """Tests (True or False) if the browser session still answers to commands
+
+        :return: True if the session is launched and responsive, False otherwise
+        """
+        if self.driver_instance is None:
+            return False
+        try:
+            self.driver_instance.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def reset(self):
+        """Cheaply brings the session back to a clean state: storage, cookies and an empty page
+        The browser process is kept, unless the session is dead, in which case it is relaunched lazily
+
+        :return: void
+        """
+        if self.driver_instance is None:
+            return
+        try:
+            self.driver_instance.execute_script(CLEAR_STORAGE_SCRIPT)
+            self.driver_instance.delete_all_cookies()
+            self.driver_instance.get('about:blank')
+        except WebDriverException:
+            self.logger.warning("Browser session is not responding. Restarting...")
+            self.restart()
+
+    def restart(self):
+        """Discards the current browser process, a new one is launched on next access
+
+        :return: void
+        """
+        self.quit()
+
+    def quit(self):
+        """Closes the browser process, if launched
+
+        :return: void
+        """
+        if self.driver_instance is None:
+            return
+        try:
+            self.driver_instance.quit()
+        except WebDriverException:
+            self.logger.warning("Browser session was already closed")
+        finally:
+            self.driver_instance = None
+
+
 class SeleniumRuntime:
     """
-    This class works like a singleton containing a single instance of the browser environment
+    This class wraps a browser session with the high level operations used by steps and factories
 
     Attributes:
         logger: logger instance gathered from logging module, acts like a singleton
+        session: SessionManager owning the browser of this runtime
+        scope: name of the feature the session was last prepared for
+        wait_timings: list of tuples (wait name, elapsed seconds) recorded by wait_until
+        wait_ns: nanoseconds spent inside wait_until
+        wait_command_ns: part of session.command_ns spent inside wait_until
+        element_cache: dictionary mapping (by, value) into the WebElement found on the current page
+        cache_hits: amount of lookups answered by element_cache
+        cache_misses: amount of cached lookups sent to the browser (first lookups and stale elements located again)
     """
 
     def __init__(self):
         self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.session = SessionManager()
+        self.scope = None
+        self.wait_timings = []
+        self.wait_ns = 0
+        self.wait_command_ns = 0
+        self.element_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def browser(self):
+        """WebDriver of the session, launched the first time a step needs it"""
+        return self.session.driver
+
+    def prepare(self, scope, profile=None):
+        """Resets the session when it's about to be used by a different feature
+        A session kept for the same feature is checked first, a browser that died is relaunched lazily
+
+        :param scope: name of the feature that will use the session
+        :param profile: BrowserProfile the feature runs with, None keeps the current one
+        :return: void
+        """
+        if profile is not None:
+            self.session.use_profile(profile)
+        if self.scope != scope:
+            self.invalidate_cache()
+            self.session.reset()
+            self.scope = scope
+        elif self.session.driver_instance is not None and not self.session.is_alive():
+            self.logger.warning("Browser session is not responding. Restarting...")
+            self.invalidate_cache()
+            self.session.restart()
+
+    def quit(self):
+        self.invalidate_cache()
+        self.session.quit()
+
+    def invalidate_cache(self):
+        """Forgets every cached element, must be called whenever the page changes
+
+        :return: void
+        """
+        self.element_cache.clear()
+
+    def cache_report(self):
+        return {'hits': self.cache_hits, 'misses': self.cache_misses}
+
+    def find_cached(self, value, by=By.ID):
+        """Returns the element located by (by, value), looking it up in the browser only on cache misses
+
+        :param value: locator value
+        :param by: locator strategy
+        :raise NoSuchElementException: element not present on the page
+        :return: CachedElement
+        """
+        key = (by, value)
+        if key in self.element_cache:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            self.element_cache[key] = self.browser.find_element(by, value)
+        return CachedElement(self, key)
+
+    def resolve(self, key, refresh=False):
+        """Returns the WebElement cached for key, waiting for it again when refresh is set (stale element)
+
+        :param key: tuple (by, value)
+        :param refresh: discards the cached element before resolving
+        :return: WebElement
+        """
+        element = None if refresh else self.element_cache.get(key)
+        if element is None:
+            self.cache_misses += 1
+            element = self.wait_until('element', expected_conditions.presence_of_element_located(key))
+            self.element_cache[key] = element
+        return element
 
-        if TARGET_BROWSER == 'chrome':
-            self.browser = Chrome()
-        elif TARGET_BROWSER == 'firefox':
-            self.browser = Firefox()
-        elif TARGET_BROWSER == 'edge':
-            self.browser = Edge()
+    def capture_snapshot(self):
+        """Captures the authentication state of the current page: cookies, localStorage and sessionStorage
+
+        :return: SessionSnapshot of the current page
+        """
+        local_storage, session_storage = self.browser.execute_script(DUMP_STORAGE_SCRIPT)
+        return SessionSnapshot(self.browser.current_url, self.browser.get_cookies(), local_storage, session_storage)
+
+    def restore_snapshot(self, snapshot):
+        """Restores a SessionSnapshot and opens the page where it was captured
+
+        :param snapshot: SessionSnapshot returned by capture_snapshot
+        :return: True if the page was opened without redirects (snapshot accepted), False otherwise
+        """
+        # Cookies and storage can only be written while visiting the snapshot origin
+        self.invalidate_cache()
+        if SessionSnapshot.origin_of(self.browser.current_url) != snapshot.origin:
+            self.browser.get(snapshot.url)
+        landed = self.browser.current_url == snapshot.url
+
+        self.browser.delete_all_cookies()
+        for cookie in snapshot.cookies:
+            self.browser.add_cookie(cookie)
+        self.browser.execute_script(RESTORE_STORAGE_SCRIPT, snapshot.local_storage, snapshot.session_storage)
+        # Already on the snapshot page, reloading it sends the restored cookies without a second navigation
+        if landed:
+            self.browser.refresh()
+        else:
+            self.browser.get(snapshot.url)
+        return self.browser.current_url == snapshot.url
 
     def go_to_page(self, url):
+        self.invalidate_cache()
         self.browser.get(url)
 
     def submit_form(self):
         form = self.browser.find_element_by_tag_name('form')
         form.submit()
 
-    def fill_form(self, table):
+    def fill_form(self, table, batched=False, keystroke_fields=()):
+        """Fills the form fields identified by id
+
+        :param table: dictionary mapping each field id into its value
+        :param batched: sets every value in a single script call, dispatching input and change events
+        :param keystroke_fields: ids typed with send_keys even when batched (fields that need real keystrokes)
+        :raise NoSuchElementException: a field id was not found
+        :return: void
+        """
+        if batched:
+            scripted_fields = {field: value for field, value in table.items() if field not in keystroke_fields}
+            missing_fields = self.browser.execute_script(FILL_FORM_SCRIPT, scripted_fields)
+            if len(missing_fields):
+                raise NoSuchElementException("Form fields not found: %s" % ', '.join(missing_fields))
+            table = {field: value for field, value in table.items() if field in keystroke_fields}
+
         for field, value in table.items():
             element = self.browser.find_element_by_id(field)
             element.clear()
             element.send_keys(value)
 
-    def fill_selects(self, table):
-        for field_name, field_value in table.items():
-            self.wait_for_element(field_value, By.XPATH).click()
+    def fill_selects(self, table, batched=False, timeout=DEFAULT_WAIT_TIMEOUT):
+        """Picks the options located by the XPaths in table, in order
+
+        :param table: dictionary mapping each select name into the XPath of the desired option
+        :param batched: picks every available option in a single script call per poll, options loaded
+            after a previous pick (dependent selects) are picked on the following polls
+        :param timeout: maximum amount of seconds to wait for each option
+        :return: void
+        """
+        if not batched:
+            for field_name, field_value in table.items():
+                self.wait_for_element(field_value, By.XPATH, timeout).click()
+            return
+
+        pending_options = list(table.values())
+
+        def pick_available_options(browser):
+            picked = browser.execute_script(FILL_SELECTS_SCRIPT, pending_options)
+            del pending_options[:picked]
+            return len(pending_options) == 0
+
+        self.wait_until('selects', pick_available_options, timeout)
 
     def click(self, value, by=By.ID):
-        element = self.browser.find_element(by, value)
-        element.click()
+        self.find_cached(value, by).click()
 
     def get_element(self, value, by=By.ID):
-        return self.browser.find_element(by, value)
+        return self.find_cached(value, by)
 
     def get_elements(self, value, by=By.ID):
         return self.browser.find_elements(by, value)
 
     def assert_presence(self, value, by=By.ID):
         try:
-            self.browser.find_element(by, value)
+            self.element_cache[(by, value)] = self.browser.find_element(by, value)
             return True
         except NoSuchElementException:
+            self.element_cache.pop((by, value), None)
             return False
 
     def back(self):
+        self.invalidate_cache()
         self.browser.back()
 
     def forward(self):
+        self.invalidate_cache()
         self.browser.forward()
 
     def refresh(self):
+        self.invalidate_cache()
         self.browser.refresh()
 
     def current_title(self):
@@ -80,15 +564,113 @@ class SeleniumRuntime:
     def current_url(self):
         return self.browser.current_url
 
-    def wait_for_element(self, value, by=By.ID, timeout=30):
-        return WebDriverWait(self.browser, timeout).until(
-            expected_conditions.presence_of_element_located((by, value))
-        )
+    def wait_until(self, name, condition, timeout=DEFAULT_WAIT_TIMEOUT, poll_frequency=DEFAULT_POLL_FREQUENCY):
+        """Polls condition until it returns a truthy value, recording how long the wait took
+
+        :param name: name of the wait, used as key in wait_timings
+        :param condition: callable receiving the WebDriver
+        :param timeout: maximum amount of seconds to wait
+        :param poll_frequency: seconds between two polls
+        :raise TimeoutException: condition did not hold within timeout
+        :return: last value returned by condition
+        """
+        browser = self.browser
+        wait_start = time.perf_counter_ns()
+        command_start = self.session.command_ns
+        try:
+            return WebDriverWait(browser, timeout, poll_frequency).until(condition)
+        finally:
+            elapsed = time.perf_counter_ns() - wait_start
+            self.wait_ns += elapsed
+            self.wait_command_ns += self.session.command_ns - command_start
+            self.wait_timings.append((name, elapsed / 1e9))
+
+    def phase_counters(self):
+        """Returns the accumulated time of each phase, subtract two readings to time a block of code
+
+        :return: tuple (nanoseconds waiting, nanoseconds on WebDriver commands outside waits)
+        """
+        return self.wait_ns, self.session.command_ns - self.wait_command_ns
+
+    def wait_report(self):
+        """Summarizes wait_timings by wait name
+
+        :return: dictionary mapping each wait name into its count, total and maximum seconds
+        """
+        return summarize_timings(self.wait_timings)
 
-    def wait_for_redirect(self, target_url, timeout=30):
-        return WebDriverWait(self.browser, timeout).until(
-            expected_conditions.url_to_be(target_url)
-        )
+    def wait_for_element(self, value, by=By.ID, timeout=DEFAULT_WAIT_TIMEOUT):
+        key = (by, value)
+        if key in self.element_cache:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            self.element_cache[key] = self.wait_until('element', expected_conditions.presence_of_element_located(key),
+                                                      timeout)
+        return CachedElement(self, key)
+
+    def wait_for_redirect(self, target_url, timeout=DEFAULT_WAIT_TIMEOUT):
+        return self.wait_until('redirect', expected_conditions.url_to_be(target_url), timeout)
+
+    def wait_for_url_change(self, current_url, timeout=DEFAULT_WAIT_TIMEOUT):
+        return self.wait_until('url_change', expected_conditions.url_changes(current_url), timeout)
+
+    def wait_for_dom_quiet(self, quiet_time=0.3, timeout=DEFAULT_WAIT_TIMEOUT):
+        """Waits until the DOM does not change for quiet_time seconds
+
+        :param quiet_time: seconds without mutations
+        :param timeout: maximum amount of seconds to wait
+        :return: True
+        """
+        return self.wait_until('dom_quiet', lambda browser: browser.execute_script(DOM_QUIET_SCRIPT, quiet_time * 1000),
+                               timeout)
+
+    def wait_for_network_idle(self, timeout=DEFAULT_WAIT_TIMEOUT):
+        """Waits until the page is loaded and there are no pending XHR/fetch requests
+        Requests are counted from the first call on each page (and through jQuery.active, when available)
+
+        :param timeout: maximum amount of seconds to wait
+        :return: True
+        """
+        return self.wait_until('network_idle', lambda browser: browser.execute_script(NETWORK_IDLE_SCRIPT), timeout)
+
+    def wait_for_animations(self, timeout=DEFAULT_WAIT_TIMEOUT):
+        """Waits until no finite CSS animation, transition or jQuery animation is running
+
+        :param timeout: maximum amount of seconds to wait
+        :return: True
+        """
+        return self.wait_until('animations', lambda browser: browser.execute_script(ANIMATIONS_SCRIPT), timeout)
+
+    def wait_for_clickable(self, value, by=By.ID, stable_time=0.1, timeout=DEFAULT_WAIT_TIMEOUT):
+        """Waits until an element is visible, enabled and did not move or resize for stable_time seconds
+
+        :param value: locator value
+        :param by: locator strategy
+        :param stable_time: seconds the element position and size must stay the same
+        :param timeout: maximum amount of seconds to wait
+        :return: WebElement
+        """
+        clickable = expected_conditions.element_to_be_clickable((by, value))
+        last_seen = {'rect': None, 'since': 0.0}
+
+        def stable_and_clickable(browser):
+            element = clickable(browser)
+            if not element:
+                return False
+            try:
+                rect = element.rect
+            except StaleElementReferenceException:
+                return False
+            now = time.perf_counter()
+            if rect != last_seen['rect']:
+                last_seen['rect'] = rect
+                last_seen['since'] = now
+                return False
+            return element if now - last_seen['since'] >= stable_time else False
+
+        self.element_cache[(by, value)] = self.wait_until('clickable', stable_and_clickable, timeout)
+        return CachedElement(self, (by, value))
 
     @staticmethod
     def assert_class(element, class_name):
@@ -101,4 +683,84 @@ class SeleniumRuntime:
         return attr_value.find(attribute_value) >= 0
 
 
-selenium_runtime = SeleniumRuntime()
+class RuntimeProxy:
+    """
+    This class forwards every attribute access to the SeleniumRuntime bound to the calling thread
+    Step and factory modules import a single name (selenium_runtime), so this proxy allows several
+    browser sessions to coexist, each one owned by a different worker thread (or asyncio task)
+
+    Attributes:
+        runtime_factory: callable creating default_runtime
+        default_runtime: runtime used by threads without a bound runtime, created on first use
+        local: thread local storage holding the bound runtime of each thread
+        context: context variable holding the runtime bound to the current asyncio task, takes precedence
+        lock: lock guarding the creation of default_runtime
+    """
+
+    def __init__(self, runtime_factory):
+        self.runtime_factory = runtime_factory
+        self.default_runtime = None
+        self.local = threading.local()
+        self.context = contextvars.ContextVar('selenium_runtime', default=None)
+        self.lock = threading.Lock()
+
+    def bind(self, runtime):
+        """Binds a runtime to the calling thread
+
+        :param runtime: SeleniumRuntime instance owned by the calling thread
+        :return: void
+        """
+        self.local.runtime = runtime
+
+    def bind_context(self, runtime):
+        """Binds a runtime to the current context (asyncio task or thread started by asyncio.to_thread)
+
+        :param runtime: runtime owned by the current context
+        :return: void
+        """
+        self.context.set(runtime)
+
+    def unbind(self):
+        """Removes the runtime bound to the calling thread, falling back to default_runtime
+
+        :return: void
+        """
+        self.local.runtime = None
+
+    def bound(self):
+        """Returns the runtime bound to the current context or to the calling thread
+
+        :return: bound runtime, None if there is none
+        """
+        runtime = self.context.get()
+        return getattr(self.local, 'runtime', None) if runtime is None else runtime
+
+    def current(self):
+        """Returns the runtime bound to the current context or to the calling thread
+
+        :return: bound runtime, default_runtime otherwise
+        """
+        runtime = self.bound()
+        if runtime is not None:
+            return runtime
+        if self.default_runtime is None:
+            with self.lock:
+                if self.default_runtime is None:
+                    self.default_runtime = self.runtime_factory()
+        return self.default_runtime
+
+    def quit(self):
+        """Closes the browser of the current runtime, a default runtime that was never used is not created
+
+        :return: void
+        """
+        runtime = self.bound()
+        runtime = self.default_runtime if runtime is None else runtime
+        if runtime is not None:
+            runtime.quit()
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+
+selenium_runtime = RuntimeProxy(SeleniumRuntime)
@@ -0,0 +1,107 @@
+"""BDD-Selenium - snapshots.py
+This file contains the cache of authenticated sessions produced by factories
+A factory opts in by declaring the class attribute cacheable = True (and optionally snapshot_ttl, validate and
+capture_after)
+"""
+
+import logging
+import threading
+
+from selenium.common.exceptions import WebDriverException
+
+from selenium_runtime import selenium_runtime
+from definitions import *
+
+""" Default time to live of a snapshot (seconds), used when the factory does not declare snapshot_ttl """
+DEFAULT_SNAPSHOT_TTL = 900
+
+
+class SnapshotStore:
+    """
+    This class keeps the latest SessionSnapshot of each cacheable factory, shared by every browser session
+
+    Attributes:
+        snapshots: dictionary mapping each factory key into its SessionSnapshot
+        lock: mutex guarding snapshots against concurrent workers
+    """
+
+    def __init__(self):
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, ttl):
+        """Returns the snapshot stored for key, unless it expired
+
+        :param key: factory key
+        :param ttl: time to live in seconds
+        :return: SessionSnapshot, None if missing or expired
+        """
+        with self.lock:
+            snapshot = self.snapshots.get(key)
+            if snapshot is not None and snapshot.expired(ttl):
+                del self.snapshots[key]
+                return None
+            return snapshot
+
+    def put(self, key, snapshot):
+        with self.lock:
+            self.snapshots[key] = snapshot
+
+    def discard(self, key):
+        with self.lock:
+            self.snapshots.pop(key, None)
+
+
+class CachedFactory:
+    """
+    This class wraps the run method of a cacheable factory
+    The first call runs the factory and captures the session, later calls restore the captured session instead
+    The factory runs again when the snapshot expires, when restoring redirects away from the captured page or fails
+    (e.g. a cookie refused by the browser), or when the optional validate staticmethod of the factory returns False
+    The session is captured once the optional capture_after staticmethod of the factory returns (e.g. waiting for the
+    redirect that follows a login), or once the network is idle when the factory does not declare it
+
+    Attributes:
+        logger: logger instance gathered from logging module, acts like a singleton
+        key: qualified name of the factory class (module.Class)
+        run_method: run staticmethod of the factory
+        validate_method: validate staticmethod of the factory, None if not declared
+        capture_after_method: capture_after staticmethod of the factory, None if not declared
+        ttl: time to live of the snapshots, in seconds
+        store: SnapshotStore holding the snapshots
+    """
+
+    def __init__(self, factory_class, store):
+        self.logger = logging.getLogger(LOGGER_INSTANCE)
+        self.key = '{module}.{name}'.format(module=factory_class.__module__, name=factory_class.__name__)
+        self.run_method = factory_class.run
+        self.validate_method = getattr(factory_class, 'validate', None)
+        self.capture_after_method = getattr(factory_class, 'capture_after', None)
+        self.ttl = getattr(factory_class, 'snapshot_ttl', DEFAULT_SNAPSHOT_TTL)
+        self.store = store
+
+    def __call__(self):
+        snapshot = self.store.get(self.key, self.ttl)
+        if snapshot is not None:
+            try:
+                accepted = selenium_runtime.restore_snapshot(snapshot) and \
+                    (self.validate_method is None or self.validate_method())
+            except WebDriverException as error:
+                self.logger.info("Session snapshot of %s could not be restored: %s" % (self.key, error.msg))
+                accepted = False
+            if accepted:
+                return
+            self.logger.info("Session snapshot of %s was rejected. Running factory again..." % self.key)
+            self.store.discard(self.key)
+            selenium_runtime.session.reset()
+
+        self.run_method()
+        if self.capture_after_method is None:
+            selenium_runtime.wait_for_network_idle()
+        else:
+            self.capture_after_method()
+        self.store.put(self.key, selenium_runtime.capture_snapshot())
+
+
+""" Snapshots shared by every cacheable factory """
+snapshot_store = SnapshotStore()
@@ -1,6 +1,5 @@
 from selenium_runtime import selenium_runtime as browser
 from selenium.webdriver.common.by import By
-from time import sleep
 
 base_url = "https://orionconnect.azurewebsites.net"
 
@@ -25,12 +24,12 @@ class Then:
 class When:
     @staticmethod
     def i_fill_the_form_with(table):
-        browser.fill_form(table)
+        browser.fill_form(table, batched=True)
 
     @staticmethod
     def i_fill_selects_with(table):
-        sleep(5)
-        browser.fill_selects(table)
+        browser.wait_for_network_idle()
+        browser.fill_selects(table, batched=True)
 
 
 class And:
@@ -0,0 +1,149 @@
+"""BDD-Selenium - tests/test_async_webdriver.py
+Drives AsyncSeleniumRuntime through AsyncHTTPPool against a stub W3C WebDriver server listening on localhost
+"""
+
+import asyncio
+import json
+import threading
+import time
+import unittest
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from async_runtime import AsyncSeleniumRuntime, AsyncSession
+from async_webdriver import AsyncHTTPPool, ELEMENT_KEY
+
+
+class StubWebDriverHandler(BaseHTTPRequestHandler):
+    """
+    This class answers the W3C WebDriver commands used by AsyncSeleniumRuntime, with keep-alive connections
+    Submitting a form on /Auth/Login moves the session to /Dashboard. GET /slow never answers in time and
+    GET /malformed answers with an invalid status line
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, value, status=200):
+        body = json.dumps({'value': value}).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_command(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length)) if length else None
+        path = self.path.split('/')[1:]
+        if path == ['slow']:
+            time.sleep(2)
+            return self.reply(None)
+        if path == ['malformed']:
+            self.wfile.write(b'HTTP/1.1 OK\r\n\r\n')
+            self.close_connection = True
+            return
+        if path == ['session'] and method == 'POST':
+            session_id = uuid.uuid4().hex
+            server.sessions[session_id] = {'url': 'about:blank'}
+            return self.reply({'sessionId': session_id, 'capabilities': {}})
+
+        session_id, command = path[1], path[2:]
+        session = server.sessions[session_id]
+        if not command:
+            del server.sessions[session_id]
+            return self.reply(None)
+        server.commands.append((method, '/'.join(command)))
+        if command == ['url']:
+            if method == 'POST':
+                session['url'] = payload['url']
+                return self.reply(None)
+            return self.reply(session['url'])
+        if command == ['element']:
+            if payload['value'] == '[id="missing"]':
+                return self.reply({'error': 'no such element', 'message': payload['value']}, 404)
+            return self.reply({ELEMENT_KEY: payload['value']})
+        if command[0] == 'element' and command[2] == 'text':
+            return self.reply('Text of %s' % command[1])
+        if command == ['execute', 'sync'] and 'submit' in payload['script']:
+            session['url'] = session['url'].replace('/Auth/Login', '/Dashboard')
+        return self.reply(None)
+
+    def do_GET(self):
+        self.handle_command('GET')
+
+    def do_POST(self):
+        self.handle_command('POST')
+
+    def do_DELETE(self):
+        self.handle_command('DELETE')
+
+
+class AsyncWebDriverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebDriverHandler)
+        self.server.daemon_threads = True
+        self.server.sessions = {}
+        self.server.commands = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_runtime_drives_a_session_over_keep_alive_connections(self):
+        async def scenario():
+            pool = AsyncHTTPPool(self.url)
+            runtime = AsyncSeleniumRuntime(AsyncSession(pool))
+            await runtime.prepare('Login')
+            await runtime.go_to_page(self.url + '/Auth/Login')
+            await runtime.click('submit-button')
+            text = await (await runtime.get_element('alert')).text()
+            missing = await runtime.assert_presence('missing')
+            await runtime.submit_form()
+            await runtime.wait_for_redirect(self.url + '/Dashboard', timeout=2)
+            await runtime.quit()
+            await pool.close()
+            return pool, text, missing
+
+        pool, text, missing = asyncio.run(scenario())
+        self.assertEqual(text, 'Text of [id="alert"]')
+        self.assertFalse(missing)
+        self.assertIn(('POST', 'element/[id="submit-button"]/click'), self.server.commands)
+        self.assertEqual(self.server.sessions, {})
+        self.assertEqual(pool.opened, 1)
+
+    def test_cancelled_and_malformed_exchanges_close_their_connection(self):
+        async def scenario():
+            pool = AsyncHTTPPool(self.url)
+            writers = []
+            connect = pool.connect
+
+            async def recording_connect():
+                reader, writer = await connect()
+                writers.append(writer)
+                return reader, writer
+            pool.connect = recording_connect
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.request('GET', '/slow'), 0.2)
+            with self.assertRaises(ValueError):
+                await pool.request('GET', '/malformed')
+            status, response = await pool.request('POST', '/session', {'capabilities': {}})
+            await pool.close()
+            return pool, writers, status
+
+        pool, writers, status = asyncio.run(scenario())
+        self.assertEqual(status, 200)
+        self.assertEqual(pool.opened, 3)
+        self.assertTrue(all(writer.is_closing() for writer in writers))
+        self.assertEqual(pool.idle, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""BDD-Selenium - tests/test_distributed.py
+Runs a Coordinator on localhost with two Workers, one of them killed while it holds a lease
+"""
+
+import multiprocessing
+import threading
+import time
+import unittest
+
+from distributed import Coordinator, Worker
+from runtime_model import dump_runtime
+
+""" Scenarios leased by the coordinator of the test """
+SCENARIOS = [('Login', 'Correct Password'), ('Login', 'Wrong Password'), ('Login', 'Pending Activation')]
+
+
+def hang_on_first_lease(url):
+    """Worker process target: takes a lease and never finishes it, until the process is killed
+
+    :param url: base URL of the coordinator
+    :return: void
+    """
+    Worker(url).serve(lambda feature, scenario: time.sleep(3600))
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition did not hold within %s seconds" % timeout)
+        time.sleep(0.05)
+
+
+class DistributedTest(unittest.TestCase):
+
+    def test_scenario_of_a_killed_worker_is_requeued_and_finished_once(self):
+        outcomes = []
+        coordinator = Coordinator(('127.0.0.1', 0), dump_runtime({}), SCENARIOS,
+                                  lambda feature, scenario, outcome: outcomes.append((scenario, outcome)),
+                                  lease_timeout=1.0)
+        url = 'http://127.0.0.1:%d' % coordinator.server.server_address[1]
+        serving = threading.Thread(target=coordinator.serve, daemon=True)
+        serving.start()
+
+        doomed = multiprocessing.Process(target=hang_on_first_lease, args=(url,), daemon=True)
+        doomed.start()
+        wait_for(lambda: len(coordinator.leases) == 1)
+        lost_scenario = next(iter(coordinator.leases.values()))['scenario']
+
+        survivor = Worker(url)
+        working = threading.Thread(target=survivor.serve,
+                                   args=(lambda feature, scenario: {'status': 'PASSED', 'worker': 'survivor'},),
+                                   daemon=True)
+        working.start()
+        wait_for(lambda: len(outcomes) == len(SCENARIOS) - 1)
+
+        doomed.kill()
+        doomed.join()
+        serving.join(timeout=15)
+        working.join(timeout=15)
+
+        self.assertFalse(serving.is_alive())
+        self.assertEqual(sorted(scenario for scenario, outcome in outcomes),
+                         sorted(scenario for feature, scenario in SCENARIOS))
+        self.assertIn((lost_scenario[1], {'status': 'PASSED', 'worker': 'survivor'}), outcomes)
+        self.assertEqual(coordinator.attempts[lost_scenario], 2)
+
+    def test_expired_lease_is_withdrawn_once_no_longer_admitted(self):
+        admitted = {'Login': True}
+        withdrawn = []
+        coordinator = Coordinator(('127.0.0.1', 0), dump_runtime({}), SCENARIOS[:2],
+                                  lambda feature, scenario, outcome: None, lease_timeout=1.0,
+                                  admits=lambda item: admitted[item[0]],
+                                  on_withdrawn=lambda feature, scenario: withdrawn.append(scenario))
+        try:
+            lease = coordinator.lease('lost-worker')
+            admitted['Login'] = False
+            coordinator.leases[lease['lease']]['deadline'] = 0
+
+            self.assertEqual(coordinator.lease('other-worker'), {'done': True})
+            self.assertEqual(sorted(withdrawn), sorted(scenario for feature, scenario in SCENARIOS[:2]))
+            self.assertEqual(coordinator.unfinished, 0)
+            self.assertEqual(coordinator.complete(lease['lease'], {'status': 'PASSED'}), {'accepted': False})
+        finally:
+            coordinator.server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
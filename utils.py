@@ -51,8 +51,8 @@ def verify_directory(full_path, create=False):
     """
     directory_path = extract_path(full_path)[0]
     exists = os.path.exists(directory_path)
-    if create and (not exists):
-        os.mkdir(directory_path)
+    if create and (not exists) and len(directory_path):
+        os.makedirs(directory_path)
     return exists
 
 
@@ -90,6 +90,33 @@ def get_value_or_default(dictionary, key, default_value):
         return default_value
 
 
+def summarize_timings(timings):
+    """Groups a list of timings by name
+
+    :param timings: iterable of tuples (name, elapsed seconds)
+    :return: dictionary mapping each name into its count, total and maximum seconds
+    """
+    summary = {}
+    for name, elapsed in timings:
+        entry = summary.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        entry['count'] += 1
+        entry['total'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+    return summary
+
+
+def phases_display(timings):
+    """Formats the phases of an execution time for display
+
+    :param timings: dictionary mapping wait, webdriver and python into milliseconds (may be None)
+    :return: formatted string
+    """
+    if not timings:
+        return 'no timings'
+    return 'wait {wait:.2f} ms, webdriver {webdriver:.2f} ms, python {python:.2f} ms'.format(
+        wait=timings.get('wait', 0.0), webdriver=timings.get('webdriver', 0.0), python=timings.get('python', 0.0))
+
+
 def description_display(text):
     return sub(RegularExpressions.regexps['line_break'], ', ', text)
 
@@ -103,13 +130,16 @@ def pre_process_file(file_path):
     :param file_path: address of the file to be processed
     :return: list of processed lines
     """
+    comment_regexp = RegularExpressions.compiled['comment']
+    blank_line_regexp = RegularExpressions.compiled['blank_line']
+    line_break_regexp = RegularExpressions.compiled['line_break']
+
+    lines = []
     with open(file_path, 'r', encoding='utf8') as fp:
-        lines = fp.readlines()
-
-        # Removing comments
-        lines = list(map(lambda x: sub(RegularExpressions.regexps['comment'], '', x), lines))
-        # Removing blank lines
-        lines = list(filter(lambda x: not match(RegularExpressions.regexps['blank_line'], x), lines))
-        # Removing line breaks
-        lines = list(map(lambda x: sub(RegularExpressions.regexps['line_break'], '', x), lines))
-        return lines
+        for line in fp:
+            # Removing comments
+            line = comment_regexp.sub('', line)
+            # Removing blank lines and line breaks
+            if not blank_line_regexp.match(line):
+                lines.append(line_break_regexp.sub('', line))
+    return lines